@@ -3,15 +3,27 @@ from .logging_config import setup_logger
 setup_logger()
 logger = logging.getLogger(__name__)
 
+import asyncio
+import threading
+import time
 from fastapi import BackgroundTasks, Request
-from fastapi.responses import HTMLResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
 
-from .models import SimulationInput, SimulationResult
-from .store import InMemoryStore
+from typing import List, Optional
+from .models import SearchInput, SimulationInput, SimulationResult
+from .store import OWNER_TIMEOUT, BaseStore, JobStore
 from .runner import SimulationRunner
 from .scoring import Scoring
+from .progress import ProgressBroadcaster, format_event
+from .ingest import JSON, UnsupportedEncoding, decode_results
+from .ensemble import replicate_limit
+from .timings import summarize_timings
+
+# Seconds between progress snapshots on an idle stream; also catches failed tasks and search completion
+PROGRESS_KEEPALIVE = 2.0
 
 
 class TrafficSimController:
@@ -19,6 +31,25 @@ class TrafficSimController:
         base_dir = Path(__file__).resolve().parent.parent
         self.templates = Jinja2Templates(directory=base_dir / "templates")
         self.runner = SimulationRunner()
+        self.runner.on_result = self._receive_local_result
+        self.progress = ProgressBroadcaster()
+        # Set on shutdown; stops watch_jobs
+        self._stopped = threading.Event()
+
+    def shutdown(self):
+        """
+        Stop the runner's executor, e.g. the local simulation processes, when the app stops.
+        Its jobs are released, so a restarted master resumes them without waiting for their claims to expire.
+        """
+        self._stopped.set()
+        try:
+            self.runner.release_jobs()
+        except Exception as e:
+            logger.error(f"Failed to release jobs: {e}")
+        try:
+            self.runner.executor.shutdown()
+        except Exception as e:
+            logger.error(f"Failed to shut down executor: {e}")
 
     def ping(self):
         logger.info("Ping endpoint called")
@@ -32,59 +63,277 @@ class TrafficSimController:
             logger.error(f"Failed to render index.html: {e}")
             return HTMLResponse(content="Internal Server Error", status_code=500)
 
-    async def submit(self, input_data: SimulationInput, background_tasks: BackgroundTasks, store: InMemoryStore):
+    async def submit(self, input_data: SimulationInput, background_tasks: BackgroundTasks, store: BaseStore):
         try:
-            store.clear()
-            logger.info(f"Store values before submit: input_data={store.get_input_data()}, results={store.get_results()}, worker_count={store.get_worker_count()}")
-
             logger.info(f"Received input data: {input_data}")
-            store.save_input_data(input_data)
+            job = store.create_job(input_data)
 
-            background_tasks.add_task(self.runner.launch, input_data)
-            num_workers = (
-                len(input_data.accel_values) *
-                len(input_data.tau_values) *
-                len(input_data.startup_delay_values)
-            )
-            store.set_worker_count(num_workers)
-            logger.info(f"Submitted simulation job with {num_workers} combinations.")
-            return {"status": "processing_started", "total_combinations": num_workers}
+            background_tasks.add_task(self.runner.launch, input_data, job)
+            num_workers = input_data.combination_count()
+            job.set_worker_count(num_workers)
+            logger.info(f"Submitted simulation job {job.job_id} with {num_workers} combinations.")
+            return {"status": "processing_started", "job_id": job.job_id, "total_combinations": num_workers}
         except Exception as e:
             logger.error(f"Failed to submit simulation: {e}")
             return {"status": "error", "message": str(e)}
 
-    async def receive_result(self, result: SimulationResult, store: InMemoryStore):
+    async def submit_search(self, search_input: SearchInput, background_tasks: BackgroundTasks, store: BaseStore):
         try:
-            logger.info(f"Received result: {result}")
-            store.save_result(result)
+            logger.info(f"Received search input: {search_input}")
+            job = store.create_job(search_input)
+
+            background_tasks.add_task(self.runner.run_search, search_input, job)
+            # Upper bound until the search finishes and reports the actual count
+            job.set_worker_count(search_input.budget * replicate_limit(search_input))
+            logger.info(f"Submitted adaptive search {job.job_id} with a budget of {search_input.budget} simulations.")
+            return {"status": "processing_started", "job_id": job.job_id, "budget": search_input.budget}
+        except Exception as e:
+            logger.error(f"Failed to submit search: {e}")
+            return {"status": "error", "message": str(e)}
 
-            logger.info(f"Total results stored: {len(store.get_results())}")
+    async def receive_result(self, result: SimulationResult, store: BaseStore):
+        try:
+            logger.debug(f"Received result: {result}")
+            job = self._job_for_result(result, store)
+            if job is None:
+                return {"status": "unknown_job"}
+            if not self._accept_result(result, job):
+                return {"status": "duplicate_ignored"}
+
+            logger.info(f"Total results stored for job {job.job_id}: {job.get_result_count()}")
             return {"status": "result_received"}
         except Exception as e:
             logger.error(f"Failed to process result: {e}")
+            # A 5xx makes the worker retry; its task_id keeps the retry from being stored twice
+            return JSONResponse(status_code=503, content={"status": "error", "message": str(e)})
+
+    async def receive_results(self, results: List[SimulationResult], store: BaseStore):
+        try:
+            logger.info(f"Received batch of {len(results)} results")
+            accepted = 0
+            for result in results:
+                job = self._job_for_result(result, store)
+                if job is not None and self._accept_result(result, job):
+                    accepted += 1
+
+            logger.info(f"Accepted {accepted} of {len(results)} results")
+            return {"status": "results_received", "accepted": accepted, "ignored": len(results) - accepted}
+        except Exception as e:
+            logger.error(f"Failed to process results: {e}")
+            # The worker retries the whole batch; results stored before the failure are ignored by task_id
+            return JSONResponse(status_code=503, content={"status": "error", "message": str(e)})
+
+    async def receive_encoded_results(self, request: Request, store: BaseStore):
+        """
+        Decode a batch posted as JSON, NDJSON or msgpack, optionally gzipped, and store it.
+        """
+        try:
+            results = decode_results(
+                await request.body(),
+                request.headers.get("content-type", JSON),
+                request.headers.get("content-encoding", "")
+            )
+        except UnsupportedEncoding as e:
+            logger.warning(f"Rejected result batch: {e}")
+            return JSONResponse(status_code=415, content={"status": "error", "message": str(e)})
+        except ValueError as e:
+            logger.warning(f"Rejected malformed result batch: {e}")
+            return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+        return await self.receive_results(results, store)
+
+    def _receive_local_result(self, result: SimulationResult):
+        """
+        Results of simulations run in-process by the local executor, handled like reported ones.
+        """
+        job = self._job_for_result(result, self.runner.store)
+        if job is not None:
+            self._accept_result(result, job)
+
+    def _job_for_result(self, result: SimulationResult, store: BaseStore) -> Optional[JobStore]:
+        if result.job_id is None:
+            return store.current_job()
+        job = store.get_job(result.job_id)
+        if job is None:
+            logger.warning(f"Ignoring result for unknown job {result.job_id}")
+        return job
+
+    def _accept_result(self, result: SimulationResult, job: JobStore) -> bool:
+        if result.timings is not None and result.timings.finished_at is not None:
+            # From the result being ready on the worker to its arrival, including any batching
+            result.timings.spans["report"] = max(time.time() - result.timings.finished_at, 0.0)
+
+        accepted, score = job.save_task_result(result)
+        if not accepted:
+            logger.warning(f"Ignoring result for unknown or already completed task {result.task_id}")
+            return False
+        if not result.pruned:
+            self.runner.cache.put(result)
+
+        if self.progress.subscriber_count():
+            event = self._progress(job)
+            event.update(result=result, score=score)
+            self.progress.publish("progress", jsonable_encoder(event))
+        return True
+
+    def next_job(self, store: BaseStore):
+        try:
+            task = store.next_task()
+            if task is None:
+                return {"status": "no_jobs"}
+
+            logger.info(f"Handing out task {task['task_id']}: {task}")
+            return task
+        except Exception as e:
+            logger.error(f"Failed to hand out job: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def prune_bound(self, store: BaseStore, job_id: Optional[str] = None):
+        try:
+            job = store.get_job(job_id)
+            input_data = job.get_input_data() if job else None
+            if input_data is None:
+                return {"best_score": None}
+
+            best = job.get_best()
+            return {
+                "expected_delays": input_data.expected_delays,
+                "weights": input_data.weights,
+                "metric": input_data.metric,
+                "best_score": best[1] if best else None
+            }
+        except Exception as e:
+            logger.error(f"Failed to compute pruning bound: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def watch_jobs(self, store: BaseStore, interval: float = OWNER_TIMEOUT):
+        """
+        Resume unfinished jobs now and whenever the process running one stops renewing its claim.
+        """
+        def watch():
+            while True:
+                self.resume_jobs(store)
+                if self._stopped.wait(interval):
+                    return
+        threading.Thread(target=watch, daemon=True).start()
+
+    def resume_jobs(self, store: BaseStore) -> List[str]:
+        """
+        Relaunch the missing simulations of every unfinished job that no live process owns.
+        """
+        resumed = []
+        try:
+            for job in store.get_jobs():
+                unfinished = job.get_input_data() is not None and not job.is_finished()
+                if unfinished and not self.runner.is_running(job.job_id) and store.claim_job(job.job_id):
+                    threading.Thread(target=self.runner.resume, args=(job,), daemon=True).start()
+                    resumed.append(job.job_id)
+            if resumed:
+                logger.info(f"Resuming {len(resumed)} unfinished jobs: {resumed}")
+        except Exception as e:
+            logger.error(f"Failed to resume jobs: {e}")
+        return resumed
+
+    def get_timings(self, store: BaseStore, job_id: Optional[str] = None):
+        """
+        Where the workers of a job spent their time, aggregated over its results.
+        """
+        try:
+            job = store.get_job(job_id)
+            if job is None:
+                return {"status": "unknown_job"} if job_id else {"status": "no_results_yet"}
+            return {"job_id": job.job_id, **summarize_timings(job.get_results())}
+        except Exception as e:
+            logger.error(f"Failed to summarize timings: {e}")
             return {"status": "error", "message": str(e)}
 
-    def get_best_result(self, store: InMemoryStore):
+    def list_jobs(self, store: BaseStore):
         try:
-            results = store.get_results()
-            input_data = store.get_input_data()
-            expected_total = store.get_worker_count()
+            return [self._progress(job) for job in store.get_jobs()]
+        except Exception as e:
+            logger.error(f"Failed to list jobs: {e}")
+            return {"status": "error", "message": str(e)}
+
+    def _progress(self, job: JobStore) -> dict:
+        """
+        Snapshot of a job, built from running counters without rescoring.
+        """
+        received = job.get_result_count()
+        expected_total = job.get_worker_count()
+        queue_stats = job.get_queue_stats()
+        failed = queue_stats["failed"]
+
+        if not received:
+            status = "failed" if failed and failed >= expected_total else "no_results_yet"
+        elif received + failed < expected_total:
+            status = "in_progress"
+        else:
+            status = "complete"
+
+        # Scored once on arrival by the store; pruned runs never become best
+        best = job.get_best()
+        return {
+            "job_id": job.job_id,
+            "status": status,
+            "received": received,
+            "expected": expected_total,
+            "failed": failed,
+            "pending": queue_stats["pending"],
+            "in_flight": queue_stats["in_flight"],
+            "best": best[0] if best else None,
+            "best_score": best[1] if best else None
+        }
 
-            logger.info(f"Restored input data: {input_data}")
-            logger.debug(f"Stored {len(results)} of {expected_total} expected results.")
+    async def stream_progress(self, request: Request, store: BaseStore, job_id: Optional[str] = None):
+        job = store.get_job(job_id)
+        if job is None:
+            return {"status": "unknown_job"}
+        queue = self.progress.subscribe()
+
+        async def events():
+            try:
+                yield format_event("progress", jsonable_encoder(self._progress(job)))
+                while not await request.is_disconnected():
+                    try:
+                        event_type, data = await asyncio.wait_for(queue.get(), timeout=PROGRESS_KEEPALIVE)
+                    except asyncio.TimeoutError:
+                        event_type, data = "progress", jsonable_encoder(self._progress(job))
+                    if data.get("job_id") == job.job_id:
+                        yield format_event(event_type, data)
+            finally:
+                self.progress.unsubscribe(queue)
+
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    def get_best_result(self, store: BaseStore, job_id: Optional[str] = None):
+        try:
+            job = store.get_job(job_id)
+            if job is None:
+                return {"status": "unknown_job"} if job_id else {"status": "no_results_yet"}
+
+            progress = self._progress(job)
+            logger.debug(
+                f"Stored {progress['received']} of {progress['expected']} expected results "
+                f"for job {job.job_id} ({progress['failed']} failed)."
+            )
 
-            if not results:
-                return {"status": "no_results_yet"}
+            if progress["status"] != "complete":
+                return progress
 
-            if len(results) < expected_total:
-                return {
-                    "status": "in_progress",
-                    "received": len(results),
-                    "expected": expected_total
-                }
+            if progress["failed"]:
+                logger.warning(
+                    f"{progress['failed']} permutations failed after retries; "
+                    f"choosing best of {progress['received']} results"
+                )
 
-            scorer = Scoring(input_data)
-            best_result, best_score = scorer.best_result(results)
+            if progress["best"] is None:
+                # Every result was pruned; fall back to scoring the partial delays
+                best_result, best_score = Scoring(job.get_input_data()).best_result(job.get_results())
+            else:
+                best_result, best_score = progress["best"], progress["best_score"]
 
             logger.info(f"Best result found: {best_result}")
             logger.info(f"Minimum score: {best_score:.4f}")
@@ -0,0 +1,91 @@
+import logging
+from .logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+import math
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Sequence, Union
+import numpy as np
+from .models import SearchInput, SimulationInput, SimulationResult, replicate_limit
+# Two-sided 95% Student t quantiles by degrees of freedom; larger samples use the normal quantile
+T_975 = (
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042
+)
+Z_975 = 1.960
+
+InputData = Union[SimulationInput, SearchInput]
+
+
+def is_ensemble(input_data) -> bool:
+    """
+    Whether a job scores the mean of several seeds per parameter set rather than single runs.
+    """
+    return input_data is not None and (input_data.replicates > 1 or input_data.target_ci is not None)
+
+
+def initial_replicates(input_data: InputData) -> int:
+    # A confidence interval needs at least two seeds
+    return max(input_data.replicates, 2) if input_data.target_ci is not None else input_data.replicates
+
+
+def aggregate_results(results: Iterable[SimulationResult]) -> List[SimulationResult]:
+    """
+    Combine the seeds of each parameter set into one result with the mean delay
+    and sample standard deviation per intersection.
+    """
+    groups: Dict[tuple, List[SimulationResult]] = OrderedDict()
+    for result in results:
+        groups.setdefault(result.parameter_key(), []).append(result)
+    return [aggregate_group(group) for group in groups.values()]
+
+
+def aggregate_group(group: Sequence[SimulationResult]) -> SimulationResult:
+    """
+    The mean over the seeds that ran to the end. If any seed was pruned, the aggregate is marked
+    pruned too: its mean would only cover the seeds that were going well, so the set is not ranked.
+    """
+    pruned = any(result.pruned for result in group)
+    group = [result for result in group if not result.pruned] or group
+    first = group[0]
+    intersections = list(OrderedDict.fromkeys(key for result in group for key in result.intersection_avg_delays))
+    delays = np.array(
+        [[result.intersection_avg_delays.get(key, 0.0) for key in intersections] for result in group],
+        dtype=float
+    ).reshape(len(group), len(intersections))
+    std = delays.std(axis=0, ddof=1) if len(group) > 1 else np.zeros(len(intersections))
+    return SimulationResult(
+        accel=first.accel,
+        tau=first.tau,
+        startup_delay=first.startup_delay,
+        params=first.params,
+        intersection_avg_delays=dict(zip(intersections, delays.mean(axis=0).tolist())),
+        replicates=len(group),
+        delay_std=dict(zip(intersections, std.tolist())),
+        pruned=pruned,
+        job_id=first.job_id
+    )
+
+
+def t_quantile(degrees_of_freedom: int) -> float:
+    if degrees_of_freedom < 1:
+        return math.inf
+    if degrees_of_freedom <= len(T_975):
+        return T_975[degrees_of_freedom - 1]
+    return Z_975
+
+
+def ci_half_width(result: SimulationResult, intersections: Iterable[str]) -> float:
+    """
+    Widest 95% confidence half-width of the mean delay over the given intersections.
+    Infinite until at least two seeds are in.
+    """
+    if result.replicates < 2 or result.delay_std is None:
+        return math.inf
+    quantile = t_quantile(result.replicates - 1)
+    return max(
+        (quantile * result.delay_std.get(key, 0.0) / math.sqrt(result.replicates) for key in intersections),
+        default=0.0
+    )
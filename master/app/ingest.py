@@ -0,0 +1,61 @@
+import logging
+from .logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+import gzip
+import zlib
+from typing import List
+from pydantic import TypeAdapter
+from .models import SimulationResult
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+MSGPACK = "application/msgpack"
+
+_results_adapter = TypeAdapter(List[SimulationResult])
+
+
+class UnsupportedEncoding(ValueError):
+    """
+    The batch uses a content type or encoding the master cannot read.
+    """
+
+
+def decode_results(body: bytes, content_type: str = JSON, content_encoding: str = "") -> List[SimulationResult]:
+    """
+    Parse a batch of results posted to /report_results.
+
+    The body is a JSON list, newline-delimited JSON (one result per line) or a
+    msgpack list, optionally gzip-compressed as announced by Content-Encoding.
+    Raises UnsupportedEncoding for unknown formats and ValueError for bodies
+    that do not decode to valid results.
+    """
+    encoding = (content_encoding or "").strip().lower()
+    if encoding == "gzip":
+        try:
+            body = gzip.decompress(body)
+        except (OSError, EOFError, zlib.error) as e:
+            raise ValueError(f"Invalid gzip body: {e}")
+    elif encoding not in ("", "identity"):
+        raise UnsupportedEncoding(f"Unsupported content encoding '{content_encoding}'")
+
+    media_type = (content_type or JSON).split(";")[0].strip().lower()
+    if media_type == JSON:
+        return _results_adapter.validate_json(body)
+    if media_type in (NDJSON, "application/jsonl"):
+        return [SimulationResult.model_validate_json(line) for line in body.splitlines() if line.strip()]
+    if media_type in (MSGPACK, "application/x-msgpack"):
+        if msgpack is None:
+            raise UnsupportedEncoding("msgpack is not installed on the master")
+        try:
+            payload = msgpack.unpackb(body)
+        except Exception as e:
+            raise ValueError(f"Invalid msgpack body: {e}")
+        return _results_adapter.validate_python(payload)
+    raise UnsupportedEncoding(f"Unsupported content type '{content_type}'")
@@ -0,0 +1,194 @@
+import logging
+from .logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional, Set
+from .models import Combination, combination_key, split_combination
+
+VISIBILITY_TIMEOUT = float(os.getenv("TASK_VISIBILITY_TIMEOUT", "900"))  # seconds
+MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+
+
+class JobQueue:
+    """
+    Thread-safe task queue with leases.
+
+    A task handed out by next_task() is leased for visibility_timeout seconds.
+    If it is not completed in time it goes back to the queue, until it has been
+    attempted max_attempts times, after which it is marked as failed.
+    """
+    def __init__(
+        self,
+        visibility_timeout: float = VISIBILITY_TIMEOUT,
+        max_attempts: int = MAX_ATTEMPTS,
+        clock: Callable[[], float] = time.monotonic,
+        job_id: Optional[str] = None
+    ):
+        self.job_id = job_id
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._clock = clock
+        self._tasks: Dict[str, dict] = {}
+        self._attempts: Dict[str, int] = {}
+        self._pending = deque()
+        self._leases: Dict[str, float] = {}
+        self._done = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def put_many(self, combinations: Iterable[Combination]) -> int:
+        with self._lock:
+            count = 0
+            for combination in combinations:
+                accel, tau, startup_delay, params, seed = split_combination(combination)
+                task_id = uuid.uuid4().hex
+                self._tasks[task_id] = {
+                    "task_id": task_id,
+                    "accel": accel,
+                    "tau": tau,
+                    "startup_delay": startup_delay
+                }
+                if params:
+                    self._tasks[task_id]["params"] = params
+                if seed is not None:
+                    self._tasks[task_id]["seed"] = seed
+                if self.job_id:
+                    self._tasks[task_id]["job_id"] = self.job_id
+                self._attempts[task_id] = 0
+                self._pending.append(task_id)
+                count += 1
+            logger.info(f"Queued {count} tasks ({len(self._pending)} pending)")
+            return count
+
+    def next_task(self, visibility_timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        Lease the next pending task, for visibility_timeout seconds when given instead of the queue's default.
+        """
+        with self._lock:
+            self._requeue_expired()
+            if not self._pending:
+                return None
+
+            task_id = self._pending.popleft()
+            self._attempts[task_id] += 1
+            self._leases[task_id] = self._clock() + (visibility_timeout or self.visibility_timeout)
+            return {**self._tasks[task_id], "attempt": self._attempts[task_id]}
+
+    def complete(self, task_id: str) -> bool:
+        """
+        Acknowledge a finished task. Returns False for unknown or already completed tasks.
+        """
+        with self._lock:
+            if task_id not in self._tasks or task_id in self._done:
+                return False
+
+            self._leases.pop(task_id, None)
+            if task_id in self._pending:
+                # The lease expired but the original worker still delivered
+                self._pending.remove(task_id)
+            self._failed.discard(task_id)
+            self._done.add(task_id)
+            return True
+
+    def reopen(self, task_id: str) -> bool:
+        """
+        Undo complete() for a task whose result could not be stored. The task is leased
+        again, so the worker's retry is accepted and a worker that gives up is replaced.
+        """
+        with self._lock:
+            if task_id not in self._done:
+                return False
+            self._done.remove(task_id)
+            self._leases[task_id] = self._clock() + self.visibility_timeout
+            return True
+
+    def complete_combination(self, key: tuple) -> Optional[str]:
+        """
+        Acknowledge the unfinished task for a combination, e.g. because its result came from a
+        worker launched before a restart. Returns its task ID, or None if there is none.
+        """
+        with self._lock:
+            for task_id, task in self._tasks.items():
+                if task_id not in self._done and self._key(task) == key:
+                    self._leases.pop(task_id, None)
+                    if task_id in self._pending:
+                        self._pending.remove(task_id)
+                    self._failed.discard(task_id)
+                    self._done.add(task_id)
+                    return task_id
+            return None
+
+    def has_task(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def open_keys(self) -> Set[tuple]:
+        """
+        Combination keys of the tasks that are pending, leased or failed.
+        """
+        with self._lock:
+            return {self._key(task) for task_id, task in self._tasks.items() if task_id not in self._done}
+
+    def release(self, task_id: str) -> bool:
+        """
+        Hand a leased task back right away, e.g. because its worker died, instead of
+        waiting for the lease to expire. Returns False if the task is not leased.
+        """
+        with self._lock:
+            if task_id not in self._leases:
+                return False
+            del self._leases[task_id]
+            self._retry_or_fail(task_id)
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._requeue_expired()
+            return {
+                "total": len(self._tasks),
+                "pending": len(self._pending),
+                "in_flight": len(self._leases),
+                "done": len(self._done),
+                "failed": len(self._failed)
+            }
+
+    def pending_count(self) -> int:
+        return self.stats()["pending"]
+
+    def is_finished(self) -> bool:
+        stats = self.stats()
+        return stats["done"] + stats["failed"] == stats["total"]
+
+    def clear(self):
+        with self._lock:
+            self._tasks.clear()
+            self._attempts.clear()
+            self._pending.clear()
+            self._leases.clear()
+            self._done.clear()
+            self._failed.clear()
+
+    def _requeue_expired(self):
+        now = self._clock()
+        expired = [task_id for task_id, deadline in self._leases.items() if deadline <= now]
+        for task_id in expired:
+            del self._leases[task_id]
+            logger.warning(f"Lease on task {task_id} expired")
+            self._retry_or_fail(task_id)
+
+    def _retry_or_fail(self, task_id: str):
+        if self._attempts[task_id] >= self.max_attempts:
+            logger.warning(f"Task {task_id} failed after {self._attempts[task_id]} attempts")
+            self._failed.add(task_id)
+        else:
+            logger.warning(f"Re-queueing task {task_id} (attempt {self._attempts[task_id]})")
+            self._pending.append(task_id)
+
+    @staticmethod
+    def _key(task: dict) -> tuple:
+        return combination_key(task["accel"], task["tau"], task["startup_delay"], task.get("params"), task.get("seed"))
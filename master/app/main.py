@@ -3,18 +3,26 @@ from .logging_config import setup_logger
 setup_logger()
 logger = logging.getLogger(__name__)
 
+from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import FastAPI, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 
-from .models import SimulationInput, SimulationResult
-from .store import InMemoryStore
+from .models import SearchInput, SimulationInput, SimulationResult
+from .store import get_store
 from .controller import TrafficSimController
 
-store = InMemoryStore()
+store = get_store()
 controller = TrafficSimController()
 
-app = FastAPI(title="TrafficSimTuner")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    controller.watch_jobs(store)
+    yield
+    controller.shutdown()
+
+app = FastAPI(title="TrafficSimTuner", lifespan=lifespan)
 app.state.store = store
 
 # CORS
@@ -38,10 +46,38 @@ def index(request: Request):
 async def submit(input_data: SimulationInput, background_tasks: BackgroundTasks, request: Request):
     return await controller.submit(input_data, background_tasks, store)
 
+@app.post("/submit_search")
+async def submit_search(search_input: SearchInput, background_tasks: BackgroundTasks, request: Request):
+    return await controller.submit_search(search_input, background_tasks, store)
+
 @app.post("/report_result")
 async def receive_result(result: SimulationResult, request: Request):
     return await controller.receive_result(result, store)
 
+@app.post("/report_results")
+async def receive_results(request: Request):
+    return await controller.receive_encoded_results(request, store)
+
+@app.get("/next_job")
+def next_job(request: Request):
+    return controller.next_job(store)
+
+@app.get("/prune_bound")
+def prune_bound(request: Request, job_id: Optional[str] = None):
+    return controller.prune_bound(store, job_id)
+
+@app.get("/jobs")
+def list_jobs(request: Request):
+    return controller.list_jobs(store)
+
+@app.get("/timings")
+def get_timings(request: Request, job_id: Optional[str] = None):
+    return controller.get_timings(store, job_id)
+
+@app.get("/progress")
+async def stream_progress(request: Request, job_id: Optional[str] = None):
+    return await controller.stream_progress(request, store, job_id)
+
 @app.get("/results")
-def get_best_result(request: Request):
-    return controller.get_best_result(store)
+def get_best_result(request: Request, job_id: Optional[str] = None):
+    return controller.get_best_result(store, job_id)
@@ -1,5 +1,87 @@
-from pydantic import BaseModel, Field
-from typing import List, Dict
+import json
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, List, Dict, Literal, Optional, Tuple
+
+# Per-intersection error summed into a result's score
+ScoreMetric = Literal["squared", "absolute", "relative"]
+
+# Set on every vType by accel/tau/startup_delay; extra parameters may only override them per vType
+TUNED_ATTRIBUTES = ("accel", "tau", "startupDelay")
+# Grid values are rounded to this many decimals so stepped ranges hit exact values
+PRECISION = 6
+# Seeds per parameter set when target_ci is set without max_replicates
+DEFAULT_MAX_REPLICATES = 10
+
+
+class ParameterRange(BaseModel):
+    min: float
+    max: float
+    step: Optional[float] = Field(None, gt=0)  # grid spacing for sweeps; searches only use the bounds
+
+    @model_validator(mode="after")
+    def check_bounds(self):
+        if self.max < self.min:
+            raise ValueError(f"range max {self.max} is below min {self.min}")
+        return self
+
+    def values(self) -> List[float]:
+        count = int((self.max - self.min) / self.step + 1e-9) + 1
+        return [round(self.min + i * self.step, PRECISION) for i in range(count)]
+
+
+class VTypeParameter(BaseModel):
+    """
+    One extra dimension of the parameter space: any vType attribute, for one vType id or all of them.
+
+    Sweeps take explicit values or a range with a step; searches take a range.
+    """
+    attribute: str = Field(pattern=r"^[A-Za-z][A-Za-z0-9_]*$")  # e.g. "decel", "sigma", "minGap"
+    vtype: Optional[str] = Field(None, pattern=r"^[^.\s]+$")  # e.g. "truck"; None sets every vType
+    values: Optional[List[float]] = Field(None, min_length=1)
+    range: Optional[ParameterRange] = None
+
+    @model_validator(mode="after")
+    def check_attribute(self):
+        if self.vtype is None and self.attribute in TUNED_ATTRIBUTES:
+            raise ValueError(f"'{self.attribute}' is swept for every vType already; set vtype to override it per vType")
+        if self.values is None and self.range is None:
+            raise ValueError(f"parameter '{self.name}' needs values or a range")
+        return self
+
+    @property
+    def name(self) -> str:
+        """
+        Key of this parameter in task and result params: "vtype.attribute", or just the attribute for every vType.
+        """
+        return f"{self.vtype}.{self.attribute}" if self.vtype else self.attribute
+
+    def grid_values(self) -> List[float]:
+        if self.values is not None:
+            return self.values
+        if self.range.step is None:
+            raise ValueError(f"parameter '{self.name}' needs values or a range with a step for a sweep")
+        return self.range.values()
+
+
+def check_unique_parameters(parameters: List[VTypeParameter]):
+    names = [parameter.name for parameter in parameters]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"parameters given more than once: {', '.join(duplicates)}")
+
+
+def check_replicates(input_data):
+    if input_data.max_replicates is not None and input_data.max_replicates < input_data.replicates:
+        raise ValueError(f"max_replicates {input_data.max_replicates} is below replicates {input_data.replicates}")
+
+
+def replicate_limit(input_data) -> int:
+    """
+    Most seeds a parameter set can get. With target_ci seeds are added up to this limit.
+    """
+    if input_data.target_ci is None:
+        return input_data.replicates
+    return input_data.max_replicates or max(DEFAULT_MAX_REPLICATES, input_data.replicates)
 
 
 class SimulationInput(BaseModel):
@@ -7,6 +89,83 @@ class SimulationInput(BaseModel):
     accel_values: List[float]
     tau_values: List[float]
     startup_delay_values: List[float]
+    parameters: List[VTypeParameter] = []  # swept together with the three lists above
+    weights: Optional[Dict[str, float]] = None  # per intersection, default 1.0
+    metric: ScoreMetric = "squared"
+    replicates: int = Field(1, ge=1)  # SUMO seeds per parameter set; scored on the mean
+    target_ci: Optional[float] = Field(None, gt=0)  # add seeds until every 95% CI half-width is this small
+    max_replicates: Optional[int] = Field(None, ge=1)  # seed limit when target_ci is set, default 10
+
+    @model_validator(mode="after")
+    def check_parameters(self):
+        check_unique_parameters(self.parameters)
+        for parameter in self.parameters:
+            parameter.grid_values()
+        check_replicates(self)
+        return self
+
+    def parameter_grid(self) -> Dict[str, List[float]]:
+        """
+        Values swept per parameter: accel, tau and startup_delay first, then the extra parameters by name.
+        """
+        grid = {
+            "accel": self.accel_values,
+            "tau": self.tau_values,
+            "startup_delay": self.startup_delay_values
+        }
+        for parameter in self.parameters:
+            grid[parameter.name] = parameter.grid_values()
+        return grid
+
+    def parameter_set_count(self) -> int:
+        count = 1
+        for values in self.parameter_grid().values():
+            count *= len(values)
+        return count
+
+    def combination_count(self) -> int:
+        """
+        Simulations the grid takes, seeds included. With target_ci every set starts with at least
+        two seeds and may grow to the replicate limit, so this is the upper bound.
+        """
+        return self.parameter_set_count() * replicate_limit(self)
+
+
+class SearchInput(BaseModel):
+    """
+    Adaptive search over parameter ranges instead of an explicit grid.
+    """
+    expected_delays: Dict[str, float]
+    accel_range: ParameterRange
+    tau_range: ParameterRange
+    startup_delay_range: ParameterRange
+    parameters: List[VTypeParameter] = []  # extra dimensions, each with a range
+    budget: int = Field(30, gt=0)  # maximum number of simulations
+    points_per_axis: int = Field(3, ge=2)
+    weights: Optional[Dict[str, float]] = None
+    metric: ScoreMetric = "squared"
+    replicates: int = Field(1, ge=1)  # seeds per parameter set; budget counts parameter sets
+    target_ci: Optional[float] = Field(None, gt=0)
+    max_replicates: Optional[int] = Field(None, ge=1)
+
+    @model_validator(mode="after")
+    def check_parameters(self):
+        check_unique_parameters(self.parameters)
+        for parameter in self.parameters:
+            if parameter.range is None:
+                raise ValueError(f"parameter '{parameter.name}' needs a range for a search")
+        check_replicates(self)
+        return self
+
+
+class RunTimings(BaseModel):
+    """
+    Where a worker's time went for one result, as measured by the worker.
+    """
+    spans: Dict[str, float] = {}  # seconds per phase, e.g. ping_master, vtypes, sumo_step
+    counts: Dict[str, int] = {}  # e.g. steps, traci_calls, vehicles_departed
+    samples: List[Dict[str, float]] = []  # every PROFILE_SAMPLE_INTERVAL-th step of the TraCI loop
+    finished_at: Optional[float] = None  # worker clock when the result was ready
 
 
 class SimulationResult(BaseModel):
@@ -14,3 +173,64 @@ class SimulationResult(BaseModel):
     tau: float
     startup_delay: float
     intersection_avg_delays: Dict[str, float]
+    params: Dict[str, float] = {}  # extra parameters by VTypeParameter.name
+    seed: Optional[int] = None  # SUMO random seed; None is SUMO's default seed
+    replicates: int = 1  # seeds averaged into intersection_avg_delays
+    delay_std: Optional[Dict[str, float]] = None  # sample standard deviation across the seeds
+    # Per-vehicle stopped-time percentiles, e.g. {"I2": {"p50": 12.0, "p90": 41.0, "p95": 55.0}}
+    intersection_delay_percentiles: Optional[Dict[str, Dict[str, float]]] = None
+    timings: Optional[RunTimings] = None
+    task_id: Optional[str] = None
+    job_id: Optional[str] = None  # None reports to the most recent job
+    pruned: bool = False  # stopped early; delays cover only the first pruned_at_step steps
+    pruned_at_step: Optional[int] = None
+
+    def combination_key(self) -> tuple:
+        return combination_key(self.accel, self.tau, self.startup_delay, self.params, self.seed)
+
+    def parameter_key(self) -> tuple:
+        """
+        Identity of the parameter set, shared by all of its seeds.
+        """
+        return combination_key(self.accel, self.tau, self.startup_delay, self.params)
+
+
+# A point of the parameter space: (accel, tau, startup_delay), optionally followed by params and a seed
+Combination = Tuple[Any, ...]
+
+
+def split_combination(combination: Combination) -> Tuple[float, float, float, Dict[str, float], Optional[int]]:
+    accel, tau, startup_delay, *rest = combination
+    params = dict(rest[0]) if rest and rest[0] else {}
+    seed = rest[1] if len(rest) > 1 else None
+    return accel, tau, startup_delay, params, seed
+
+
+def with_seed(combination: Combination, seed: int) -> Combination:
+    accel, tau, startup_delay, params, _ = split_combination(combination)
+    return (accel, tau, startup_delay, params, seed)
+
+
+def combination_key(
+    accel: float, tau: float, startup_delay: float, params: Optional[Dict[str, float]] = None, seed: Optional[int] = None
+) -> tuple:
+    """
+    Hashable identity of a combination, independent of the order of its params.
+    """
+    key = (accel, tau, startup_delay, tuple(sorted((params or {}).items())))
+    return key if seed is None else key + (seed,)
+
+
+def params_json(params: Optional[Dict[str, float]]) -> str:
+    """
+    Canonical text form of params, for storage columns and cache keys.
+    """
+    return json.dumps(params or {}, sort_keys=True)
+
+
+# Submission types by the name they are persisted under
+INPUT_MODELS = {"grid": SimulationInput, "search": SearchInput}
+
+
+def input_kind(input_data) -> str:
+    return "search" if isinstance(input_data, SearchInput) else "grid"
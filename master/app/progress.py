@@ -0,0 +1,64 @@
+import logging
+from .logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+import asyncio
+import json
+import threading
+from typing import Dict
+
+# Events kept per slow subscriber; older ones are dropped since every event carries the full progress
+MAX_QUEUED_EVENTS = 100
+
+
+def format_event(event_type: str, data: dict) -> str:
+    """
+    Encode one server-sent event.
+    """
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+class ProgressBroadcaster:
+    """
+    Fans progress events out to every connected /progress stream.
+
+    Each subscriber gets its own bounded asyncio queue bound to the event loop
+    it subscribed from, so events can be published from request handlers as
+    well as from the runner's background threads.
+    """
+    def __init__(self, max_queued: int = MAX_QUEUED_EVENTS):
+        self.max_queued = max_queued
+        self._subscribers: Dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_queued)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        logger.info(f"Progress subscriber connected ({len(self._subscribers)} total)")
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+        logger.info(f"Progress subscriber disconnected ({len(self._subscribers)} total)")
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, data: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, (event_type, data))
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
@@ -0,0 +1,160 @@
+import logging
+from .logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+from .models import SimulationResult, params_json
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_PATH = BASE_DIR / "data" / "result_cache.sqlite3"
+DEFAULT_SCENARIO_DIR = BASE_DIR.parent / "worker"
+# Everything that changes what a run computes; the sumocfg sets step length, teleporting and waiting-time memory,
+# run_simulation.py the duration, stop-speed threshold and intersections, delay_stats.py how delays are summarized
+SCENARIO_FILES = (
+    "hw_model.sumocfg.xml", "hw_model.net.xml", "hw_model.routes.xml", "hw_model.vtypes.xml", "scenario.json",
+    "run_simulation.py", "delay_stats.py"
+)
+# Stored for results run with SUMO's default seed, so the column can be part of the key
+DEFAULT_SEED = -1
+
+
+def scenario_fingerprint(scenario_dir: Path, sumo_version: str) -> Optional[str]:
+    """
+    Hash the files that determine a simulation's outcome together with the SUMO version.
+    Returns None when any scenario file is missing.
+    """
+    digest = hashlib.sha256(sumo_version.encode())
+    for name in SCENARIO_FILES:
+        path = Path(scenario_dir) / name
+        if not path.is_file():
+            logger.warning(f"Scenario file '{path}' not found")
+            return None
+        digest.update(name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent SQLite cache of simulation results keyed by
+    (accel, tau, startup_delay, extra params, seed, scenario fingerprint).
+
+    Caching is disabled when the fingerprint cannot be computed, i.e. the SUMO
+    version is not configured or the scenario files are not available.
+    """
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        scenario_dir: Optional[str] = None,
+        sumo_version: Optional[str] = None
+    ):
+        path = path if path is not None else os.getenv("RESULT_CACHE_PATH", str(DEFAULT_CACHE_PATH))
+        scenario_dir = scenario_dir or os.getenv("SCENARIO_DIR", str(DEFAULT_SCENARIO_DIR))
+        sumo_version = sumo_version or os.getenv("SUMO_VERSION")
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self.fingerprint = scenario_fingerprint(scenario_dir, sumo_version) if sumo_version else None
+
+        if not path or not self.fingerprint:
+            logger.info("Result cache disabled (set RESULT_CACHE_PATH, SCENARIO_DIR and SUMO_VERSION to enable)")
+            return
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._create_table()
+        logger.info(f"Result cache at '{path}' for scenario {self.fingerprint[:12]}")
+
+    def _create_table(self):
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+        outdated = columns and not {"params", "seed"} <= columns
+        if outdated:
+            # Caches written before results carried extra vType parameters or seeds
+            self._conn.execute("ALTER TABLE results RENAME TO results_outdated")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                fingerprint TEXT NOT NULL,
+                accel REAL NOT NULL,
+                tau REAL NOT NULL,
+                startup_delay REAL NOT NULL,
+                params TEXT NOT NULL,
+                seed INTEGER NOT NULL,
+                intersection_avg_delays TEXT NOT NULL,
+                delay_percentiles TEXT,
+                PRIMARY KEY (fingerprint, accel, tau, startup_delay, params, seed)
+            )
+        """)
+        if outdated:
+            params = "params" if "params" in columns else "'{}'"
+            self._conn.execute(
+                "INSERT INTO results (fingerprint, accel, tau, startup_delay, params, seed, intersection_avg_delays) "
+                f"SELECT fingerprint, accel, tau, startup_delay, {params}, {DEFAULT_SEED}, "
+                "intersection_avg_delays FROM results_outdated"
+            )
+            self._conn.execute("DROP TABLE results_outdated")
+        elif columns and "delay_percentiles" not in columns:
+            # Caches written before results carried per-vehicle stopped-time percentiles
+            self._conn.execute("ALTER TABLE results ADD COLUMN delay_percentiles TEXT")
+        self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def get(
+        self, accel: float, tau: float, startup_delay: float, params: Optional[dict] = None, seed: Optional[int] = None
+    ) -> Optional[SimulationResult]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT intersection_avg_delays, delay_percentiles FROM results "
+                "WHERE fingerprint = ? AND accel = ? AND tau = ? AND startup_delay = ? AND params = ? AND seed = ?",
+                (self.fingerprint, accel, tau, startup_delay, params_json(params), DEFAULT_SEED if seed is None else seed)
+            ).fetchone()
+        if row is None:
+            return None
+        return SimulationResult(
+            accel=accel,
+            tau=tau,
+            startup_delay=startup_delay,
+            params=params or {},
+            seed=seed,
+            intersection_avg_delays=json.loads(row[0]),
+            # None for entries cached before percentiles were reported
+            intersection_delay_percentiles=json.loads(row[1]) if row[1] else None
+        )
+
+    def put(self, result: SimulationResult):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.fingerprint,
+                    result.accel,
+                    result.tau,
+                    result.startup_delay,
+                    params_json(result.params),
+                    DEFAULT_SEED if result.seed is None else result.seed,
+                    json.dumps(result.intersection_avg_delays),
+                    json.dumps(result.intersection_delay_percentiles) if result.intersection_delay_percentiles else None
+                )
+            )
+            self._conn.commit()
+
+    def count(self) -> int:
+        if not self.enabled:
+            return 0
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM results WHERE fingerprint = ?", (self.fingerprint,)
+            ).fetchone()[0]
@@ -0,0 +1,99 @@
+import logging
+from .logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+from .models import SimulationResult, input_kind
+
+
+class ResultLog:
+    """
+    Append-only JSONL log of job events for the in-memory store.
+
+    Every job creation, input, expected count and result is written and fsynced
+    as it happens, so the store can be rebuilt after the master restarts.
+    Replaying ignores a torn last line left by a crash mid-write.
+    """
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def append(self, event: str, job_id: str, **fields):
+        line = json.dumps({"event": event, "job_id": job_id, **fields})
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def job_created(self, job_id: str):
+        self.append("job", job_id)
+
+    def input_saved(self, job_id: str, input_data):
+        self.append("input", job_id, kind=input_kind(input_data), input_data=input_data.model_dump())
+
+    def worker_count_set(self, job_id: str, count: int):
+        self.append("worker_count", job_id, count=count)
+
+    def result_saved(self, job_id: str, result: SimulationResult):
+        self.append("result", job_id, result=result.model_dump())
+
+    def job_removed(self, job_id: str):
+        self.append("evict", job_id)
+
+    def events(self) -> Iterator[dict]:
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as log_file:
+            for number, line in enumerate(log_file, start=1):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable line {number} of result log '{self.path}'")
+
+    def compact(self, jobs):
+        """
+        Rewrite the log with only the current state of the given jobs.
+        """
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as temp_file:
+            for job in jobs:
+                temp_file.write(json.dumps({"event": "job", "job_id": job.job_id}) + "\n")
+                input_data = job.get_input_data()
+                if input_data is not None:
+                    temp_file.write(json.dumps({
+                        "event": "input",
+                        "job_id": job.job_id,
+                        "kind": input_kind(input_data),
+                        "input_data": input_data.model_dump()
+                    }) + "\n")
+                temp_file.write(json.dumps({
+                    "event": "worker_count", "job_id": job.job_id, "count": job.get_worker_count()
+                }) + "\n")
+                for result in job.get_results():
+                    temp_file.write(json.dumps({
+                        "event": "result", "job_id": job.job_id, "result": result.model_dump()
+                    }) + "\n")
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(temp_path, self.path)
+
+
+def open_result_log() -> Optional[ResultLog]:
+    """
+    The log at RESULT_LOG_PATH, or None when durable logging is not configured.
+    """
+    path = os.getenv("RESULT_LOG_PATH")
+    return ResultLog(path) if path else None
@@ -3,47 +3,601 @@ from .logging_config import setup_logger
 setup_logger()
 logger = logging.getLogger(__name__)
 
+import os
+import sys
+import json
+import math
+import time
 import uuid
 import docker
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from itertools import product
-from .models import SimulationInput
+from typing import Callable, List, Optional
+from .models import SearchInput, SimulationInput, SimulationResult, combination_key, split_combination, with_seed
+from .ensemble import aggregate_results, ci_half_width, initial_replicates, is_ensemble, replicate_limit
+from .job_queue import VISIBILITY_TIMEOUT
+from .store import OWNER_TIMEOUT, BaseStore, JobStore, get_store
+from .result_cache import DEFAULT_SCENARIO_DIR, ResultCache
+from .search import GridRefinementSearch
+
+WORKER_IMAGE = "traffic-sim-worker"
+WORKER_NETWORK = "simnet"
+MASTER_URL = "http://host.docker.internal:8000/report_result"
+POOL_LABEL = "traffic-sim-pool"
+# Worker code run in-process by LocalProcessExecutor
+WORKER_DIR = os.getenv("WORKER_DIR", str(DEFAULT_SCENARIO_DIR))
+
+
+class DockerExecutor:
+    """
+    Runs simulations in worker containers that report back over HTTP.
+    The Docker client is created on first use, so a runner without Docker can still be built.
+    """
+    supports_pool = True
 
-class SimulationRunner:
     def __init__(self):
-        self.client = docker.from_env()
+        self._client = None
 
-    def launch(self, input_data: SimulationInput):
-        combinations = self._generate_combinations(input_data)
-        logger.info(f"Launching {len(combinations)} workers...")
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = docker.from_env()
+        return self._client
 
-        for params in combinations:
-            self._start_worker(*params)
+    def shutdown(self):
+        # Running containers keep going and report to the next master, which accepts results
+        # of tasks leased before the restart
+        if self._client is not None:
+            self._client.close()
+            self._client = None
 
-        logger.info("All workers launched. Waiting before exit...")
+    def start(self, tasks: List[dict]):
+        if len(tasks) == 1:
+            task = tasks[0]
+            self._start_worker(
+                task["accel"], task["tau"], task["startup_delay"],
+                task_id=task["task_id"], job_id=task.get("job_id"), params=task.get("params"), seed=task.get("seed")
+            )
+        else:
+            self._start_batch_worker(tasks)
 
-    def _generate_combinations(self, input_data: SimulationInput):
-        return list(product(
-            input_data.accel_values,
-            input_data.tau_values,
-            input_data.startup_delay_values
-        ))
+    def running_pool_workers(self) -> int:
+        return len(self.client.containers.list(filters={"label": POOL_LABEL}))
 
-    def _start_worker(self, accel, tau, startup_delay):
-        container_name = f"worker_{uuid.uuid4().hex[:8]}"
-        logger.info(f"Launching worker: {container_name} with accel={accel}, tau={tau}, startup_delay={startup_delay}")
+    def start_pool_worker(self):
+        container_name = f"pool_worker_{uuid.uuid4().hex[:8]}"
+        logger.info(f"Launching pool worker: {container_name}")
 
         self.client.containers.run(
-            "traffic-sim-worker",
+            WORKER_IMAGE,
             detach=True,
-            network="simnet",
+            network=WORKER_NETWORK,
             name=container_name,
+            labels=[POOL_LABEL],
             environment={
-                "ACCEL": accel,
-                "TAU": tau,
-                "STARTUP_DELAY": startup_delay,
-                "MASTER_URL": "http://host.docker.internal:8000/report_result"
+                "WORKER_MODE": "pool",
+                "MASTER_URL": MASTER_URL,
+                # Lets the worker report its start-up time
+                "LAUNCHED_AT": time.time()
             },
             working_dir="/app",
             command=["python3", "entrypoint.py"],
             auto_remove=True
-        )
\ No newline at end of file
+        )
+
+    def _start_batch_worker(self, tasks):
+        container_name = f"batch_worker_{uuid.uuid4().hex[:8]}"
+        logger.info(f"Launching batch worker: {container_name} with {len(tasks)} permutations")
+
+        self.client.containers.run(
+            WORKER_IMAGE,
+            detach=True,
+            network=WORKER_NETWORK,
+            name=container_name,
+            environment={
+                "BATCH": json.dumps([
+                    {key: task[key] for key in ("task_id", "job_id", "accel", "tau", "startup_delay", "params", "seed") if key in task}
+                    for task in tasks
+                ]),
+                "MASTER_URL": MASTER_URL,
+                "LAUNCHED_AT": time.time()
+            },
+            working_dir="/app",
+            command=["python3", "entrypoint.py"],
+            auto_remove=True
+        )
+
+    def _start_worker(
+        self, accel, tau, startup_delay,
+        task_id: Optional[str] = None, job_id: Optional[str] = None, params: Optional[dict] = None,
+        seed: Optional[int] = None
+    ):
+        container_name = f"worker_{uuid.uuid4().hex[:8]}"
+        logger.info(f"Launching worker: {container_name} with accel={accel}, tau={tau}, startup_delay={startup_delay}, params={params or {}}")
+
+        environment = {
+            "ACCEL": accel,
+            "TAU": tau,
+            "STARTUP_DELAY": startup_delay,
+            "MASTER_URL": MASTER_URL,
+            "LAUNCHED_AT": time.time()
+        }
+        if task_id:
+            environment["TASK_ID"] = task_id
+        if job_id:
+            environment["JOB_ID"] = job_id
+        if params:
+            environment["PARAMS"] = json.dumps(params)
+        if seed is not None:
+            environment["SEED"] = seed
+
+        self.client.containers.run(
+            WORKER_IMAGE,
+            detach=True,
+            network=WORKER_NETWORK,
+            name=container_name,
+            environment=environment,
+            working_dir="/app",
+            command=["python3", "entrypoint.py"],
+            auto_remove=True
+        )
+
+
+class LocalProcessExecutor:
+    """
+    Runs simulations in a pool of local processes, for single-node deployments without Docker.
+
+    Each process imports SimulationWorker from worker_dir and keeps one SUMO
+    session for all the tasks it runs. Results are handed to on_result in the
+    master process instead of being posted over HTTP. A failed task is handed
+    to on_failure so it can be retried at once. If a process dies (e.g. SUMO
+    crashed inside it) the pool is broken for good, so it is replaced.
+    """
+    supports_pool = False
+
+    def __init__(
+        self,
+        max_workers: int,
+        on_result: Callable[[SimulationResult], None],
+        on_failure: Optional[Callable[[dict], None]] = None,
+        worker_dir: str = WORKER_DIR
+    ):
+        self.max_workers = max_workers
+        self.on_result = on_result
+        self.on_failure = on_failure or (lambda task: None)
+        self.worker_dir = worker_dir
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                logger.info(f"Starting {self.max_workers} local simulation processes with worker code from '{self.worker_dir}'")
+                # spawn rather than fork: the master process runs threads (server, launch loops)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_local_worker,
+                    initargs=(self.worker_dir,)
+                )
+            return self._pool
+
+    def start(self, tasks: List[dict]):
+        for task in tasks:
+            pool = self.pool
+            try:
+                future = pool.submit(_run_local_task, task)
+            except BrokenProcessPool as e:
+                logger.error(f"Local simulation pool is broken, restarting it: {e}")
+                self._discard_pool(pool)
+                self._failed(task)
+                continue
+            future.add_done_callback(lambda done, task=task, pool=pool: self._finished(task, pool, done))
+
+    def _finished(self, task: dict, pool: ProcessPoolExecutor, future: Future):
+        try:
+            result = SimulationResult.model_validate(future.result())
+        except BrokenProcessPool as e:
+            logger.error(f"A local simulation process died running task {task['task_id']}, restarting the pool: {e}")
+            self._discard_pool(pool)
+            self._failed(task)
+            return
+        except Exception as e:
+            logger.error(f"Local simulation of task {task['task_id']} failed: {e}")
+            self._failed(task)
+            return
+        try:
+            self.on_result(result)
+        except Exception as e:
+            logger.error(f"Failed to store result of task {task['task_id']}: {e}")
+
+    def _failed(self, task: dict):
+        try:
+            self.on_failure(task)
+        except Exception as e:
+            logger.error(f"Failed to re-queue task {task['task_id']}: {e}")
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            # Every task of a broken pool fails; only the first one replaces it
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# The SimulationWorker of a LocalProcessExecutor process, reused for every task it runs
+_local_worker = None
+
+
+def _init_local_worker(worker_dir: str):
+    global _local_worker
+    # Worker modules import each other by bare name, as inside the worker container
+    sys.path.insert(0, worker_dir)
+    from simulation_worker import SimulationWorker
+    _local_worker = SimulationWorker(0.0, 0.0, 0.0, vtypes_path=os.path.join(worker_dir, "hw_model.vtypes.xml"))
+
+
+def _run_local_task(task: dict) -> dict:
+    _local_worker.apply_job(task)
+    return _local_worker.simulate()
+
+
+def create_executor(
+    name: Optional[str],
+    max_workers: int,
+    on_result: Callable[[SimulationResult], None],
+    on_failure: Optional[Callable[[dict], None]] = None
+):
+    """
+    The executor named by EXECUTOR: "docker" (default) or "local".
+    """
+    name = name or os.getenv("EXECUTOR", "docker")
+    if name == "local":
+        return LocalProcessExecutor(max_workers, on_result, on_failure)
+    if name != "docker":
+        raise ValueError(f"Unknown executor '{name}'")
+    return DockerExecutor()
+
+
+class SimulationRunner:
+    def __init__(
+        self,
+        store: Optional[BaseStore] = None,
+        pool_size: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: float = 1.0,
+        cache: Optional[ResultCache] = None,
+        executor: Optional[str] = None
+    ):
+        self.store = store or get_store()
+        self.cache = cache or ResultCache()
+        # 0 keeps the one-container-per-permutation mode; >0 runs a warm pool of that size
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv("WORKER_POOL_SIZE", "0"))
+        self.max_in_flight = max_in_flight or int(os.getenv("MAX_IN_FLIGHT", "0")) or os.cpu_count() or 1
+        # Number of permutations each per-permutation container runs back to back
+        self.batch_size = batch_size or int(os.getenv("WORKER_BATCH_SIZE", "1"))
+        self.poll_interval = poll_interval
+        # Receives results of in-process executors; the controller replaces it to also publish progress
+        self.on_result: Callable[[SimulationResult], None] = self._store_result
+        self.executor = create_executor(
+            executor, self.max_in_flight, lambda result: self.on_result(result), self._release_task
+        )
+        if not self.executor.supports_pool:
+            # Local processes take one task at a time and never poll /next_job
+            self.pool_size = 0
+            self.batch_size = 1
+        # Jobs whose launch loop runs in this process
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    def launch(self, input_data: SimulationInput, job: Optional[JobStore] = None):
+        job = job or self.store.current_job()
+        self._run_owned(job, lambda: self._launch(input_data, job))
+
+    def _launch(self, input_data: SimulationInput, job: JobStore):
+        combinations = self._generate_combinations(input_data)
+        if input_data.target_ci is not None:
+            # Upper bound until the replicates stop and the actual count is known
+            job.set_worker_count(input_data.combination_count())
+        self._simulate(job, input_data, combinations)
+        if input_data.target_ci is not None:
+            job.set_worker_count(job.get_result_count() + job.get_queue_stats()["failed"])
+
+    def run_search(self, search_input: SearchInput, job: Optional[JobStore] = None):
+        """
+        Adaptive search: simulate one round of proposed points, score everything
+        received so far and let the search pick the next round around the best.
+        """
+        job = job or self.store.current_job()
+        self._run_owned(job, lambda: self._run_search(search_input, job))
+
+    def _run_search(self, search_input: SearchInput, job: JobStore):
+        search = GridRefinementSearch(search_input)
+
+        while True:
+            points = search.propose()
+            if not points:
+                break
+            self._simulate(job, search_input, points, wait=True)
+
+            best = job.get_best()
+            if best:
+                best_result, best_score = best
+                logger.info(f"Search round done for job {job.job_id}, best score so far {best_score:.4f} at {best_result}")
+                search.observe(best_result)
+
+        # The budget was an upper bound; report the run as complete with what was simulated
+        evaluated = job.get_result_count() + job.get_queue_stats()["failed"]
+        job.set_worker_count(evaluated)
+        logger.info(f"Search for job {job.job_id} finished after {evaluated} simulations.")
+
+    def resume(self, job: JobStore):
+        """
+        Continue a job left by a process that stopped, e.g. in a master restart, simulating only what has no result yet.
+        """
+        input_data = job.get_input_data()
+        if input_data is None:
+            return
+        # Tasks from before the restart are kept: the launch loop below waits for leased ones,
+        # whose containers may still report, and relaunches them only once their leases expire
+        logger.info(f"Resuming job {job.job_id} with {job.get_result_count()} of {job.get_worker_count()} results")
+        if isinstance(input_data, SearchInput):
+            self.run_search(input_data, job)
+        else:
+            self.launch(input_data, job)
+
+    def is_running(self, job_id: str) -> bool:
+        with self._running_lock:
+            return job_id in self._running
+
+    def release_jobs(self):
+        """
+        Give up the jobs running in this process, e.g. when it stops, so a restarted master resumes them right away.
+        """
+        with self._running_lock:
+            running = list(self._running)
+        for job_id in running:
+            self.store.release_job(job_id)
+
+    def _run_owned(self, job: JobStore, run: Callable[[], None]):
+        """
+        Run a job while this process owns it. The claim is renewed every quarter of OWNER_TIMEOUT,
+        so other processes resume the job only once this one stops renewing it.
+        """
+        with self._running_lock:
+            if job.job_id in self._running:
+                logger.warning(f"Job {job.job_id} is already running")
+                return
+            self._running.add(job.job_id)
+        stop = threading.Event()
+        try:
+            if not self.store.claim_job(job.job_id):
+                logger.warning(f"Job {job.job_id} is owned by another process")
+                return
+            threading.Thread(target=self._renew_claim, args=(job.job_id, stop), daemon=True).start()
+            run()
+        finally:
+            stop.set()
+            with self._running_lock:
+                self._running.discard(job.job_id)
+            self.store.release_job(job.job_id)
+
+    def _renew_claim(self, job_id: str, stop: threading.Event):
+        while not stop.wait(OWNER_TIMEOUT / 4):
+            try:
+                if not self.store.renew_claim(job_id):
+                    logger.warning(f"Job {job_id} was taken over by another process")
+                    return
+            except Exception as e:
+                logger.error(f"Failed to renew the claim on job {job_id}: {e}")
+
+    def _simulate(self, job: JobStore, input_data, combinations, wait: bool = False):
+        """
+        Simulate parameter sets, each with as many seeds as the input asks for.
+        """
+        if not is_ensemble(input_data):
+            self._execute(job, combinations, wait=wait)
+            return
+        seeds = initial_replicates(input_data)
+        sequential = input_data.target_ci is not None
+        self._execute(job, [with_seed(c, seed) for c in combinations for seed in range(seeds)], wait=wait or sequential)
+        if sequential:
+            self._add_replicates(job, input_data, combinations, seeds)
+
+    def _add_replicates(self, job: JobStore, input_data, combinations, seeds: int):
+        """
+        Sequential stopping: keep adding one seed to every parameter set whose
+        confidence interval is still wider than target_ci, up to the replicate limit.
+        """
+        limit = replicate_limit(input_data)
+        intersections = list(input_data.expected_delays)
+        next_seed = {combination_key(*split_combination(c)[:4]): seeds for c in combinations}
+        parameter_sets = {combination_key(*split_combination(c)[:4]): c for c in combinations}
+
+        while True:
+            aggregates = {result.parameter_key(): result for result in aggregate_results(job.get_results())}
+            extra = []
+            for key, combination in parameter_sets.items():
+                aggregate = aggregates.get(key)
+                # Sets that failed or had a seed pruned are out of the ranking; more seeds will not help
+                if aggregate is None or aggregate.pruned or next_seed[key] >= limit:
+                    continue
+                if ci_half_width(aggregate, intersections) > input_data.target_ci:
+                    extra.append(with_seed(combination, next_seed[key]))
+                    next_seed[key] += 1
+            if not extra:
+                break
+            logger.info(f"Adding a replicate to {len(extra)} parameter sets of job {job.job_id} above the target CI")
+            self._execute(job, extra, wait=True)
+
+    def _execute(self, job: JobStore, combinations, wait: bool = False):
+        combinations = self._skip_done(job, combinations)
+        combinations = self._skip_queued(job, combinations)
+        combinations = self._skip_cached(job, combinations)
+        if not combinations and job.is_queue_finished():
+            logger.info("All combinations served from stored results or the result cache.")
+            return
+
+        if self.pool_size > 0:
+            self._launch_pool(job, combinations)
+            while not job.is_queue_finished():
+                time.sleep(self.poll_interval)
+                # Pool workers exit when idle or die; replace them while the job still has work
+                self._top_up_pool(job)
+            logger.info("All pool tasks finished.")
+            return
+
+        job.enqueue_tasks(combinations)
+        logger.info(f"Launching {len(combinations)} workers for job {job.job_id}, at most {self.max_in_flight} at a time...")
+
+        while not job.is_queue_finished():
+            # The limit is shared by every job's launcher
+            in_flight = self.store.get_in_flight_count()
+            running = math.ceil(in_flight / self.batch_size)
+            if job.get_pending_count() and running < self.max_in_flight and self._has_cpu_headroom(running):
+                tasks = self._lease_tasks(job)
+                if tasks:
+                    try:
+                        self._start_tasks(tasks)
+                    except Exception as e:
+                        # The leases expire and the tasks are retried like any lost worker
+                        logger.error(f"Failed to start worker for {len(tasks)} tasks: {e}")
+                    continue
+            time.sleep(self.poll_interval)
+
+        logger.info("All workers finished.")
+
+    def _generate_combinations(self, input_data: SimulationInput):
+        # One entry per parameter set; seeds are added by _simulate
+        grid = input_data.parameter_grid()
+        names = list(grid)[3:]
+        return [
+            (accel, tau, startup_delay, dict(zip(names, extra)))
+            for accel, tau, startup_delay, *extra in product(*grid.values())
+        ]
+
+    def _skip_done(self, job: JobStore, combinations):
+        """
+        Drop combinations the job already has a result for, e.g. after it was restored from the result log.
+        """
+        done = {result.combination_key() for result in job.get_results()}
+        if not done:
+            return combinations
+        missing = [
+            combination for combination in combinations
+            if combination_key(*split_combination(combination)) not in done
+        ]
+        if len(missing) < len(combinations):
+            logger.info(f"Job {job.job_id} already has results for {len(combinations) - len(missing)} combinations")
+        return missing
+
+    def _skip_queued(self, job: JobStore, combinations):
+        """
+        Drop combinations that already have an unfinished task, e.g. one leased before a restart.
+        """
+        queued = job.get_open_task_keys()
+        if not queued:
+            return combinations
+        missing = [
+            combination for combination in combinations
+            if combination_key(*split_combination(combination)) not in queued
+        ]
+        if len(missing) < len(combinations):
+            logger.info(f"Job {job.job_id} already has tasks for {len(combinations) - len(missing)} combinations")
+        return missing
+
+    def _skip_cached(self, job: JobStore, combinations):
+        """
+        Store cached results for known combinations and return the ones that still need a simulation.
+        """
+        missing = []
+        for combination in combinations:
+            cached = self.cache.get(*split_combination(combination))
+            if cached is None:
+                missing.append(combination)
+            else:
+                job.save_result(cached.model_copy(update={"job_id": job.job_id}))
+
+        if len(missing) < len(combinations):
+            logger.info(f"Result cache hit for {len(combinations) - len(missing)} of {len(combinations)} combinations")
+        return missing
+
+    def _lease_tasks(self, job: JobStore):
+        """
+        Lease up to batch_size tasks for one container. It runs them one after another and
+        reports them together at the end, so the n-th task is leased for n visibility timeouts.
+        """
+        tasks = []
+        while len(tasks) < self.batch_size:
+            task = job.next_task(VISIBILITY_TIMEOUT * (len(tasks) + 1))
+            if task is None:
+                break
+            tasks.append(task)
+        return tasks
+
+    def _start_tasks(self, tasks):
+        self.executor.start(tasks)
+
+    def _store_result(self, result: SimulationResult):
+        job = self.store.get_job(result.job_id)
+        if job is None:
+            logger.warning(f"Ignoring result for unknown job {result.job_id}")
+            return
+        accepted, _ = job.save_task_result(result)
+        if accepted and not result.pruned:
+            self.cache.put(result)
+
+    def _release_task(self, task: dict):
+        """
+        Put a task whose in-process run failed back on its queue without waiting for the lease.
+        """
+        job = self.store.get_job(task.get("job_id"))
+        if job is not None:
+            job.release_task(task["task_id"])
+
+    def _has_cpu_headroom(self, in_flight: int) -> bool:
+        """
+        Hold back new workers while the host is already saturated.
+        At least one worker is always admitted so a busy host cannot stall the sweep.
+        """
+        if in_flight == 0:
+            return True
+        try:
+            load = os.getloadavg()[0]
+        except (AttributeError, OSError):
+            return True
+        return load < self.max_in_flight
+
+    def _launch_pool(self, job: JobStore, combinations):
+        queued = job.enqueue_tasks(combinations)
+        logger.info(f"Queued {queued} tasks for the worker pool")
+        self._top_up_pool(job)
+
+    def _top_up_pool(self, job: JobStore):
+        """
+        Keep up to pool_size workers alive while the job has pending or leased tasks.
+        """
+        stats = job.get_queue_stats()
+        outstanding = stats["pending"] + stats["in_flight"]
+        if not outstanding:
+            return
+        try:
+            running = self.executor.running_pool_workers()
+            missing = min(self.pool_size, outstanding) - running
+            if missing > 0:
+                logger.info(f"{running} pool workers running for {outstanding} tasks of job {job.job_id}, starting {missing} more")
+            for _ in range(missing):
+                self.executor.start_pool_worker()
+        except Exception as e:
+            logger.error(f"Failed to start pool workers: {e}")
@@ -3,27 +3,129 @@ from .logging_config import setup_logger
 setup_logger()
 logger = logging.getLogger(__name__)
 
-from typing import List, Tuple
-from .models import SimulationInput, SimulationResult
+from typing import List, Sequence, Tuple, Union
+import numpy as np
+from .models import SearchInput, SimulationInput, SimulationResult
+
+# Results compared against each other at once when building a Pareto front
+PARETO_BLOCK = 256
+
 
 class Scoring:
-    def __init__(self, input_data: SimulationInput):
+    """
+    Scores simulation results against the expected delays of any set of intersections.
+
+    Results are packed into an (n_results, n_intersections) array with one column
+    per key of expected_delays, so a whole result set is scored in a single
+    vectorized pass. The score is the weighted sum of per-intersection errors,
+    where the error is squared, absolute or relative (absolute error divided by
+    the expected delay). Missing delays count as 0.0.
+    """
+    def __init__(self, input_data: Union[SimulationInput, SearchInput]):
         self.expected_delays = input_data.expected_delays
+        self.intersections = list(self.expected_delays)
+        self.expected = np.array([self.expected_delays[key] for key in self.intersections], dtype=float)
+
+        weights = input_data.weights or {}
+        self.weights = np.array([weights.get(key, 1.0) for key in self.intersections], dtype=float)
+        self.metric = input_data.metric
+
+    def to_matrix(self, results: Sequence[SimulationResult]) -> np.ndarray:
+        """
+        Average delays of each result, one column per expected intersection.
+        """
+        keys = self.intersections
+        rows = [[result.intersection_avg_delays.get(key, 0.0) for key in keys] for result in results]
+        return np.array(rows, dtype=float).reshape(len(results), len(keys))
+
+    def errors(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        Weighted per-intersection errors for a delay matrix from to_matrix.
+        """
+        diff = matrix - self.expected
+        if self.metric == "absolute":
+            errors = np.abs(diff)
+        elif self.metric == "relative":
+            # Intersections expected to have no delay fall back to the absolute error
+            scale = np.where(self.expected != 0, np.abs(self.expected), 1.0)
+            errors = np.abs(diff) / scale
+        else:
+            errors = diff ** 2
+        return errors * self.weights
+
+    def scores(self, results: Sequence[SimulationResult]) -> np.ndarray:
+        return self.errors(self.to_matrix(results)).sum(axis=1)
 
     def _calculate_score(self, result: SimulationResult) -> float:
         """
-        Calculate the total squared error between actual and expected delays.
+        Calculate the total weighted error between actual and expected delays.
         """
-        i2_error = (result.intersection_avg_delays.get("I2", 0.0) - self.expected_delays["I2"]) ** 2
-        i3_error = (result.intersection_avg_delays.get("I3", 0.0) - self.expected_delays["I3"]) ** 2
-        total_error = i2_error + i3_error
+        total_error = float(self.scores([result])[0])
         logger.debug(f"Score for {result}: {total_error:.4f}")
         return total_error
 
+    def score(self, result: SimulationResult) -> float:
+        return self._calculate_score(result)
+
     def best_result(self, results: List[SimulationResult]) -> Tuple[SimulationResult, float]:
         """
         Find the result with the lowest score.
         """
-        best_result = min(results, key=self._calculate_score)
-        best_score = self._calculate_score(best_result)
-        return best_result, best_score
+        if not results:
+            raise ValueError("No results to score")
+        scores = self.scores(results)
+        index = int(np.argmin(scores))
+        return results[index], float(scores[index])
+
+    def rank(self, results: List[SimulationResult]) -> List[Tuple[SimulationResult, float]]:
+        """
+        All results with their scores, best first. Ties keep their original order.
+        """
+        scores = self.scores(results)
+        order = np.argsort(scores, kind="stable")
+        return [(results[i], float(scores[i])) for i in order]
+
+    def top_k(self, results: List[SimulationResult], k: int) -> List[Tuple[SimulationResult, float]]:
+        """
+        The k best results with their scores, best first.
+        """
+        if k >= len(results):
+            return self.rank(results)
+        if k <= 0:
+            return []
+        scores = self.scores(results)
+        candidates = np.argpartition(scores, k - 1)[:k]
+        order = candidates[np.lexsort((candidates, scores[candidates]))]
+        return [(results[i], float(scores[i])) for i in order]
+
+    def pareto_front(self, results: List[SimulationResult]) -> List[SimulationResult]:
+        """
+        Results that no other result beats at every intersection, ordered by score.
+
+        A result can only be dominated by one with a lower total error, so results
+        are visited in score order, a block at a time, and compared against the
+        front found so far and against each other.
+        """
+        if not results:
+            return []
+        errors = self.errors(self.to_matrix(results))
+        order = np.argsort(errors.sum(axis=1), kind="stable")
+
+        front = np.empty(0, dtype=int)
+        for start in range(0, len(order), PARETO_BLOCK):
+            block = order[start:start + PARETO_BLOCK]
+            if front.size:
+                block = block[~_dominated_by(errors[front], errors[block])]
+            # Dominance is transitive, so any dominated point in the block has an undominated dominator
+            block = block[~_dominated_by(errors[block], errors[block])]
+            front = np.concatenate([front, block])
+        return [results[i] for i in front]
+
+
+def _dominated_by(candidates: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """
+    For each point, whether some candidate is at least as good everywhere and better somewhere.
+    """
+    at_least_as_good = np.all(candidates[:, None, :] <= points[None, :, :], axis=2)
+    better = np.any(candidates[:, None, :] < points[None, :, :], axis=2)
+    return (at_least_as_good & better).any(axis=0)
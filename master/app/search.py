@@ -0,0 +1,83 @@
+import logging
+from .logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+from itertools import product
+from typing import List, Set, Tuple
+from .models import PRECISION, Combination, SearchInput, SimulationResult
+
+# (accel, tau, startup_delay, *extra parameters); points closer than PRECISION decimals are the same simulation
+Point = Tuple[float, ...]
+
+
+class GridRefinementSearch:
+    """
+    Coarse-to-fine grid search over (accel, tau, startup_delay) and any extra vType parameters.
+
+    Each round evaluates a small grid inside the current search box. The box is
+    then re-centred on the best result so far and shrunk to half a grid step in
+    every direction, so the grid gets finer around promising regions while the
+    total number of simulations stays within the budget.
+    """
+    def __init__(self, search_input: SearchInput):
+        self.bounds = [
+            (search_input.accel_range.min, search_input.accel_range.max),
+            (search_input.tau_range.min, search_input.tau_range.max),
+            (search_input.startup_delay_range.min, search_input.startup_delay_range.max),
+        ] + [(parameter.range.min, parameter.range.max) for parameter in search_input.parameters]
+        self.names = [parameter.name for parameter in search_input.parameters]
+        self.box = list(self.bounds)
+        self.points_per_axis = search_input.points_per_axis
+        self.remaining = search_input.budget
+        self.evaluated: Set[Point] = set()
+        self.best: Point = tuple((lo + hi) / 2 for lo, hi in self.bounds)
+
+    def propose(self) -> List[Combination]:
+        """
+        Next round of combinations, nearest to the current best first. Empty when the search is over.
+        """
+        if self.remaining <= 0:
+            return []
+
+        axes = [self._axis_values(lo, hi) for lo, hi in self.box]
+        points = [point for point in product(*axes) if point not in self.evaluated]
+        points.sort(key=self._distance_to_best)
+        points = points[:self.remaining]
+
+        self.evaluated.update(points)
+        self.remaining -= len(points)
+        logger.info(f"Proposing {len(points)} points in box {self.box} ({self.remaining} simulations left)")
+        return [self._combination(point) for point in points]
+
+    def observe(self, best_result: SimulationResult):
+        """
+        Re-centre the search box on the best result and shrink it to half a grid step around it.
+        """
+        self.best = (best_result.accel, best_result.tau, best_result.startup_delay) + tuple(
+            best_result.params.get(name, (lo + hi) / 2) for name, (lo, hi) in zip(self.names, self.bounds[3:])
+        )
+        new_box = []
+        for (lo, hi), (min_bound, max_bound), center in zip(self.box, self.bounds, self.best):
+            half_step = (hi - lo) / (self.points_per_axis - 1) / 2
+            new_box.append((max(min_bound, center - half_step), min(max_bound, center + half_step)))
+        self.box = new_box
+
+    def _combination(self, point: Point) -> Combination:
+        if not self.names:
+            return point
+        return point[:3] + (dict(zip(self.names, point[3:])),)
+
+    def _axis_values(self, lo: float, hi: float) -> List[float]:
+        if hi <= lo:
+            return [round(lo, PRECISION)]
+        step = (hi - lo) / (self.points_per_axis - 1)
+        return [round(lo + i * step, PRECISION) for i in range(self.points_per_axis)]
+
+    def _distance_to_best(self, point: Point) -> float:
+        distance = 0.0
+        for value, best, (lo, hi) in zip(point, self.best, self.bounds):
+            span = hi - lo
+            if span > 0:
+                distance += ((value - best) / span) ** 2
+        return distance
@@ -0,0 +1,581 @@
+import logging
+from .logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+from .models import (
+    INPUT_MODELS, Combination, SearchInput, SimulationInput, SimulationResult, combination_key, input_kind, params_json,
+    split_combination
+)
+from .job_queue import MAX_ATTEMPTS, VISIBILITY_TIMEOUT
+from .scoring import Scoring
+from .ensemble import aggregate_group, is_ensemble
+from .store import OWNER_TIMEOUT, TOP_K, BaseStore, JobStore
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_STORE_PATH = BASE_DIR / "data" / "store.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    input_kind TEXT,
+    input_data TEXT,
+    worker_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS results (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    score REAL,
+    parameter_key TEXT
+);
+CREATE INDEX IF NOT EXISTS results_by_score ON results (job_id, score);
+CREATE TABLE IF NOT EXISTS aggregates (
+    job_id TEXT NOT NULL,
+    parameter_key TEXT NOT NULL,
+    first_seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    score REAL,
+    PRIMARY KEY (job_id, parameter_key)
+);
+CREATE INDEX IF NOT EXISTS aggregates_by_score ON aggregates (job_id, score);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    accel REAL NOT NULL,
+    tau REAL NOT NULL,
+    startup_delay REAL NOT NULL,
+    params TEXT,
+    seed INTEGER,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    deadline REAL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_by_state ON tasks (job_id, state, position);
+CREATE TABLE IF NOT EXISTS job_owners (
+    job_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+def parameter_key_json(result: SimulationResult) -> str:
+    """
+    Text form of a result's parameter set, shared by all of its seeds.
+    """
+    return json.dumps(result.parameter_key())
+
+
+class SqliteDatabase:
+    """
+    One SQLite file in WAL mode shared by every server process.
+    Each thread gets its own connection; writes go through transaction().
+    """
+    def __init__(self, path: str):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self.connection()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        # Databases created before tasks carried extra vType parameters and seeds
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        for column, column_type in (("params", "TEXT"), ("seed", "INTEGER")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {column_type}")
+        # Databases created before results carried their parameter set; SqliteStore rescores those jobs
+        if "parameter_key" not in {row[1] for row in conn.execute("PRAGMA table_info(results)")}:
+            conn.execute("ALTER TABLE results ADD COLUMN parameter_key TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS results_by_parameter_set ON results (job_id, parameter_key)")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Write transaction that takes the database lock up front, so read-modify-write is atomic across processes.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+class SqliteTaskQueue:
+    """
+    JobQueue with its tasks and leases kept in SQLite, so any process can lease and acknowledge them.
+    """
+    def __init__(
+        self,
+        db: SqliteDatabase,
+        job_id: str,
+        visibility_timeout: float = VISIBILITY_TIMEOUT,
+        max_attempts: int = MAX_ATTEMPTS,
+        clock: Callable[[], float] = time.time
+    ):
+        self.db = db
+        self.job_id = job_id
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._clock = clock
+
+    def put_many(self, combinations: Iterable[Combination]) -> int:
+        with self.db.transaction() as conn:
+            position = self._next_position(conn)
+            rows = []
+            for i, combination in enumerate(combinations):
+                accel, tau, startup_delay, params, seed = split_combination(combination)
+                rows.append((
+                    uuid.uuid4().hex, self.job_id, accel, tau, startup_delay,
+                    params_json(params) if params else None, seed, position + i
+                ))
+            conn.executemany(
+                "INSERT INTO tasks (task_id, job_id, accel, tau, startup_delay, params, seed, state, position) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)",
+                rows
+            )
+        logger.info(f"Queued {len(rows)} tasks for job {self.job_id}")
+        return len(rows)
+
+    def next_task(self, visibility_timeout: Optional[float] = None) -> Optional[dict]:
+        with self.db.transaction() as conn:
+            self._requeue_expired(conn)
+            row = conn.execute(
+                "SELECT task_id, accel, tau, startup_delay, params, seed, attempts FROM tasks "
+                "WHERE job_id = ? AND state = 'pending' ORDER BY position LIMIT 1",
+                (self.job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            task_id, accel, tau, startup_delay, params, seed, attempts = row
+            conn.execute(
+                "UPDATE tasks SET state = 'leased', attempts = ?, deadline = ? WHERE task_id = ?",
+                (attempts + 1, self._clock() + (visibility_timeout or self.visibility_timeout), task_id)
+            )
+        task = {
+            "task_id": task_id,
+            "accel": accel,
+            "tau": tau,
+            "startup_delay": startup_delay,
+            "job_id": self.job_id,
+            "attempt": attempts + 1
+        }
+        if params:
+            task["params"] = json.loads(params)
+        if seed is not None:
+            task["seed"] = seed
+        return task
+
+    def complete(self, task_id: str) -> bool:
+        """
+        Acknowledge a finished task. Returns False for unknown or already completed tasks.
+        """
+        with self.db.transaction() as conn:
+            return self._complete(conn, task_id)
+
+    def _complete(self, conn: sqlite3.Connection, task_id: str) -> bool:
+        updated = conn.execute(
+            "UPDATE tasks SET state = 'done', deadline = NULL "
+            "WHERE task_id = ? AND job_id = ? AND state != 'done'",
+            (task_id, self.job_id)
+        ).rowcount
+        return updated == 1
+
+    def release(self, task_id: str) -> bool:
+        """
+        Hand a leased task back right away instead of waiting for the lease to expire.
+        """
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM tasks WHERE task_id = ? AND job_id = ? AND state = 'leased'",
+                (task_id, self.job_id)
+            ).fetchone()
+            if row is None:
+                return False
+            self._retry_or_fail(conn, task_id, row[0])
+        return True
+
+    def open_keys(self) -> Set[tuple]:
+        """
+        Combination keys of the tasks that are pending, leased or failed.
+        """
+        rows = self.db.connection().execute(
+            "SELECT accel, tau, startup_delay, params, seed FROM tasks WHERE job_id = ? AND state != 'done'",
+            (self.job_id,)
+        ).fetchall()
+        return {
+            combination_key(accel, tau, startup_delay, json.loads(params) if params else None, seed)
+            for accel, tau, startup_delay, params, seed in rows
+        }
+
+    def stats(self) -> Dict[str, int]:
+        conn = self.db.connection()
+        # Progress and launcher polls are reads; only take the write lock when a lease has expired
+        if self._has_expired(conn):
+            with self.db.transaction() as conn:
+                self._requeue_expired(conn)
+        counts = dict(conn.execute(
+            "SELECT state, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY state", (self.job_id,)
+        ).fetchall())
+        return {
+            "total": sum(counts.values()),
+            "pending": counts.get("pending", 0),
+            "in_flight": counts.get("leased", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0)
+        }
+
+    def pending_count(self) -> int:
+        return self.stats()["pending"]
+
+    def is_finished(self) -> bool:
+        stats = self.stats()
+        return stats["done"] + stats["failed"] == stats["total"]
+
+    def clear(self):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM tasks WHERE job_id = ?", (self.job_id,))
+
+    def _next_position(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(MAX(position), 0) + 1 FROM tasks").fetchone()[0]
+
+    def _has_expired(self, conn: sqlite3.Connection) -> bool:
+        return conn.execute(
+            "SELECT 1 FROM tasks WHERE job_id = ? AND state = 'leased' AND deadline <= ? LIMIT 1",
+            (self.job_id, self._clock())
+        ).fetchone() is not None
+
+    def _requeue_expired(self, conn: sqlite3.Connection):
+        expired = conn.execute(
+            "SELECT task_id, attempts FROM tasks WHERE job_id = ? AND state = 'leased' AND deadline <= ?",
+            (self.job_id, self._clock())
+        ).fetchall()
+        for task_id, attempts in expired:
+            logger.warning(f"Lease on task {task_id} expired")
+            self._retry_or_fail(conn, task_id, attempts)
+
+    def _retry_or_fail(self, conn: sqlite3.Connection, task_id: str, attempts: int):
+        if attempts >= self.max_attempts:
+            logger.warning(f"Task {task_id} failed after {attempts} attempts")
+            conn.execute("UPDATE tasks SET state = 'failed', deadline = NULL WHERE task_id = ?", (task_id,))
+        else:
+            logger.warning(f"Re-queueing task {task_id} (attempt {attempts})")
+            conn.execute(
+                "UPDATE tasks SET state = 'pending', deadline = NULL, position = ? WHERE task_id = ?",
+                (self._next_position(conn), task_id)
+            )
+
+
+class SqliteJobStore(JobStore):
+    """
+    JobStore whose results, expected count and input data live in SQLite.
+
+    Each result is scored once on arrival and the score is stored with it, so
+    the best results are an indexed query instead of an in-memory heap. Ensemble
+    jobs also keep one scored aggregate per parameter set, updated as its seeds arrive.
+    """
+    def __init__(self, db: SqliteDatabase, job_id: str, clock: Callable[[], float] = time.time):
+        self.job_id = job_id
+        self.db = db
+        self._queue = SqliteTaskQueue(db, job_id, clock=clock)
+        self._scorer: Optional[Scoring] = None
+        self._ensemble = False
+
+    # --- Simulation Results ---
+    def save_result(self, result: SimulationResult) -> Optional[float]:
+        logger.debug(f"Saving simulation result for job {self.job_id}: {result}")
+        score = self._score(result)
+        with self.db.transaction() as conn:
+            self._insert_result(conn, result, score)
+        return score
+
+    def save_task_result(self, result: SimulationResult) -> Tuple[bool, Optional[float]]:
+        """
+        Acknowledge the result's task and store the result in one transaction, so neither happens without the other.
+        """
+        score = self._score(result)
+        with self.db.transaction() as conn:
+            if result.task_id and not self._queue._complete(conn, result.task_id):
+                return False, None
+            self._insert_result(conn, result, score)
+        return True, score
+
+    def _insert_result(self, conn: sqlite3.Connection, result: SimulationResult, score: Optional[float]):
+        key = parameter_key_json(result)
+        conn.execute(
+            "INSERT INTO results (job_id, data, score, parameter_key) VALUES (?, ?, ?, ?)",
+            (self.job_id, result.model_dump_json(), score, key)
+        )
+        if self._ensemble:
+            self._update_aggregate(conn, key)
+
+    def save_results(self, results: List[SimulationResult]):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM results WHERE job_id = ?", (self.job_id,))
+            self._insert_scored(conn, results)
+            self._rebuild_aggregates(conn)
+
+    def get_results(self) -> List[SimulationResult]:
+        rows = self.db.connection().execute(
+            "SELECT data FROM results WHERE job_id = ? ORDER BY seq", (self.job_id,)
+        ).fetchall()
+        return [SimulationResult.model_validate_json(data) for data, in rows]
+
+    def get_result_count(self) -> int:
+        return self.db.connection().execute(
+            "SELECT COUNT(*) FROM results WHERE job_id = ?", (self.job_id,)
+        ).fetchone()[0]
+
+    # --- Best Results ---
+    def get_best(self) -> Optional[Tuple[SimulationResult, float]]:
+        top = self.get_top_results(1)
+        return top[0] if top else None
+
+    def get_top_results(self, k: int = TOP_K) -> List[Tuple[SimulationResult, float]]:
+        self._get_scorer()
+        if self._ensemble:
+            # Parameter sets are ranked on the score of their mean over seeds
+            query = (
+                "SELECT data, score FROM aggregates WHERE job_id = ? AND score IS NOT NULL "
+                "ORDER BY score, first_seq LIMIT ?"
+            )
+        else:
+            query = "SELECT data, score FROM results WHERE job_id = ? AND score IS NOT NULL ORDER BY score, seq LIMIT ?"
+        rows = self.db.connection().execute(query, (self.job_id, k)).fetchall()
+        return [(SimulationResult.model_validate_json(data), score) for data, score in rows]
+
+    def _score(self, result: SimulationResult) -> Optional[float]:
+        scorer = self._get_scorer()
+        if scorer is None or result.pruned:
+            return None
+        return scorer.score(result)
+
+    def _get_scorer(self) -> Optional[Scoring]:
+        if self._scorer is None:
+            input_data = self.get_input_data()
+            if input_data is not None:
+                self._scorer = Scoring(input_data)
+                self._ensemble = is_ensemble(input_data)
+        return self._scorer
+
+    def _insert_scored(self, conn: sqlite3.Connection, results: List[SimulationResult]):
+        scorer = self._get_scorer()
+        scores = scorer.scores(results) if scorer is not None and results else [None] * len(results)
+        conn.executemany(
+            "INSERT INTO results (job_id, data, score, parameter_key) VALUES (?, ?, ?, ?)",
+            [
+                (
+                    self.job_id, result.model_dump_json(), None if result.pruned or score is None else float(score),
+                    parameter_key_json(result)
+                )
+                for result, score in zip(results, scores)
+            ]
+        )
+
+    def _rescore(self, conn: sqlite3.Connection):
+        """
+        Score everything that has arrived again, e.g. against new expected delays.
+        """
+        results = [
+            SimulationResult.model_validate_json(data) for data, in conn.execute(
+                "SELECT data FROM results WHERE job_id = ? ORDER BY seq", (self.job_id,)
+            ).fetchall()
+        ]
+        conn.execute("DELETE FROM results WHERE job_id = ?", (self.job_id,))
+        self._insert_scored(conn, results)
+        self._rebuild_aggregates(conn)
+
+    def _update_aggregate(self, conn: sqlite3.Connection, key: str):
+        """
+        Re-aggregate one parameter set from its seeds. A set with a pruned seed is kept unscored.
+        """
+        rows = conn.execute(
+            "SELECT seq, data FROM results WHERE job_id = ? AND parameter_key = ? ORDER BY seq", (self.job_id, key)
+        ).fetchall()
+        aggregate = aggregate_group([SimulationResult.model_validate_json(data) for _, data in rows])
+        score = None if aggregate.pruned else float(self._scorer.score(aggregate))
+        conn.execute(
+            "INSERT OR REPLACE INTO aggregates (job_id, parameter_key, first_seq, data, score) VALUES (?, ?, ?, ?, ?)",
+            (self.job_id, key, rows[0][0], aggregate.model_dump_json(), score)
+        )
+
+    def _rebuild_aggregates(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM aggregates WHERE job_id = ?", (self.job_id,))
+        if self._get_scorer() is None or not self._ensemble:
+            return
+        keys = conn.execute(
+            "SELECT DISTINCT parameter_key FROM results WHERE job_id = ?", (self.job_id,)
+        ).fetchall()
+        for key, in keys:
+            self._update_aggregate(conn, key)
+
+    # --- Worker Count ---
+    def set_worker_count(self, count: int):
+        with self.db.transaction() as conn:
+            conn.execute("UPDATE jobs SET worker_count = ? WHERE job_id = ?", (count, self.job_id))
+
+    def get_worker_count(self) -> int:
+        row = self.db.connection().execute(
+            "SELECT worker_count FROM jobs WHERE job_id = ?", (self.job_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    # --- Simulation Input Data ---
+    def save_input_data(self, input_data: Union[SimulationInput, SearchInput]):
+        kind = input_kind(input_data)
+        self._scorer = Scoring(input_data)
+        self._ensemble = is_ensemble(input_data)
+        with self.db.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET input_kind = ?, input_data = ? WHERE job_id = ?",
+                (kind, input_data.model_dump_json(), self.job_id)
+            )
+            self._rescore(conn)
+
+    def get_input_data(self) -> Optional[Union[SimulationInput, SearchInput]]:
+        row = self.db.connection().execute(
+            "SELECT input_kind, input_data FROM jobs WHERE job_id = ?", (self.job_id,)
+        ).fetchone()
+        if row is None or row[1] is None:
+            return None
+        kind, data = row
+        return INPUT_MODELS[kind].model_validate_json(data)
+
+    def clear(self):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM results WHERE job_id = ?", (self.job_id,))
+            conn.execute("DELETE FROM aggregates WHERE job_id = ?", (self.job_id,))
+            conn.execute(
+                "UPDATE jobs SET worker_count = 0, input_kind = NULL, input_data = NULL WHERE job_id = ?",
+                (self.job_id,)
+            )
+        self._scorer = None
+        self._ensemble = False
+        self._queue.clear()
+
+
+class SqliteStore(BaseStore):
+    """
+    Job registry in a SQLite database, for masters running several server processes.
+
+    Results, expected counts, input data and task leases are all in the database,
+    so a result posted to any process is seen by every other one.
+    """
+    _shared: Dict[str, "SqliteStore"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: Optional[str] = None, clock: Callable[[], float] = time.time):
+        path = path or os.getenv("STORE_PATH", str(DEFAULT_STORE_PATH))
+        self.db = SqliteDatabase(path)
+        self._clock = clock
+        # Identifies this process in job_owners
+        self.owner = uuid.uuid4().hex
+        self._add_parameter_keys()
+        logger.info(f"SQLite store at '{path}'")
+
+    def _add_parameter_keys(self):
+        """
+        Rescore jobs with results stored before results carried their parameter set, which builds their aggregates.
+        """
+        rows = self.db.connection().execute(
+            "SELECT DISTINCT job_id FROM results WHERE parameter_key IS NULL"
+        ).fetchall()
+        for job_id, in rows:
+            logger.info(f"Rescoring job {job_id} to aggregate its results per parameter set")
+            with self.db.transaction() as conn:
+                self._job(job_id)._rescore(conn)
+
+    @classmethod
+    def shared(cls, path: Optional[str] = None) -> "SqliteStore":
+        """
+        One store per database file in this process.
+        """
+        path = path or os.getenv("STORE_PATH", str(DEFAULT_STORE_PATH))
+        with cls._shared_lock:
+            if path not in cls._shared:
+                cls._shared[path] = cls(path)
+            return cls._shared[path]
+
+    def _new_job(self, job_id: str, input_data: Optional[Union[SimulationInput, SearchInput]]) -> SqliteJobStore:
+        with self.db.transaction() as conn:
+            conn.execute("INSERT INTO jobs (job_id, created) VALUES (?, ?)", (job_id, time.time()))
+            # Owned from the start, so no other process resumes it before its launch begins
+            conn.execute("INSERT INTO job_owners VALUES (?, ?, ?)", (job_id, self.owner, self._clock()))
+        job = self._job(job_id)
+        if input_data is not None:
+            job.save_input_data(input_data)
+        return job
+
+    def claim_job(self, job_id: str) -> bool:
+        """
+        Atomically take ownership of the job, unless another process has renewed its claim within OWNER_TIMEOUT.
+        """
+        now = self._clock()
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT owner, heartbeat FROM job_owners WHERE job_id = ?", (job_id,)).fetchone()
+            if row is not None and row[0] != self.owner and now - row[1] < OWNER_TIMEOUT:
+                return False
+            conn.execute("INSERT OR REPLACE INTO job_owners VALUES (?, ?, ?)", (job_id, self.owner, now))
+        return True
+
+    def renew_claim(self, job_id: str) -> bool:
+        with self.db.transaction() as conn:
+            return conn.execute(
+                "UPDATE job_owners SET heartbeat = ? WHERE job_id = ? AND owner = ?",
+                (self._clock(), job_id, self.owner)
+            ).rowcount == 1
+
+    def release_job(self, job_id: str):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM job_owners WHERE job_id = ? AND owner = ?", (job_id, self.owner))
+
+    def _remove_job(self, job_id: str):
+        with self.db.transaction() as conn:
+            for table in ("results", "aggregates", "tasks", "job_owners", "jobs"):
+                conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+
+    def _job(self, job_id: str) -> SqliteJobStore:
+        return SqliteJobStore(self.db, job_id, clock=self._clock)
+
+    def get_job(self, job_id: Optional[str] = None) -> Optional[SqliteJobStore]:
+        conn = self.db.connection()
+        if job_id is not None:
+            row = conn.execute("SELECT job_id FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        else:
+            row = conn.execute("SELECT job_id FROM jobs ORDER BY created DESC, rowid DESC LIMIT 1").fetchone()
+        return self._job(row[0]) if row else None
+
+    def get_jobs(self) -> List[SqliteJobStore]:
+        rows = self.db.connection().execute("SELECT job_id FROM jobs ORDER BY created, rowid").fetchall()
+        return [self._job(job_id) for job_id, in rows]
+
+    def clear(self):
+        with self.db.transaction() as conn:
+            for table in ("results", "aggregates", "tasks", "job_owners", "jobs"):
+                conn.execute(f"DELETE FROM {table}")
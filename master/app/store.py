@@ -3,55 +3,480 @@ from .logging_config import setup_logger
 setup_logger()
 logger = logging.getLogger(__name__)
 
-from typing import List, Optional
-from .models import SimulationResult, SimulationInput
-import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from .models import INPUT_MODELS, Combination, SearchInput, SimulationResult, SimulationInput
+from .job_queue import JobQueue
+from .result_log import ResultLog, open_result_log
+from .scoring import Scoring
+from .ensemble import aggregate_group, aggregate_results, is_ensemble
+import heapq
+import itertools
+import os
 import threading
+import uuid
 
-class InMemoryStore:
-    _instance = None
+TOP_K = 10
+# Finished jobs kept for /results once newer jobs are submitted
+MAX_JOBS = int(os.getenv("MAX_JOBS", "20"))
+# A job whose owner has not renewed its claim for this many seconds is resumed by another process
+OWNER_TIMEOUT = float(os.getenv("JOB_OWNER_TIMEOUT", "60"))
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(InMemoryStore, cls).__new__(cls)
-            cls._instance._results: List[SimulationResult] = []
-            cls._instance._worker_count: int = 0
-            cls._instance._input_data: Optional[SimulationInput] = None
-            cls._instance._lock = threading.Lock()
-        return cls._instance
+
+class JobStore:
+    """
+    Results, expected count, input data and task queue of one submitted job.
+    """
+    def __init__(
+        self,
+        job_id: str,
+        input_data: Optional[Union[SimulationInput, SearchInput]] = None,
+        log: Optional[ResultLog] = None
+    ):
+        self.job_id = job_id
+        self._log = log
+        self._results: List[SimulationResult] = []
+        self._worker_count: int = 0
+        self._input_data: Optional[Union[SimulationInput, SearchInput]] = None
+        self._lock = threading.Lock()
+        self._queue = JobQueue(job_id=job_id)
+        self._scorer: Optional[Scoring] = None
+        self._top: List[Tuple[float, int, SimulationResult]] = []
+        self._sequence = itertools.count()
+        # Ensemble jobs rank parameter sets by the score of their mean over seeds
+        self._ensemble = False
+        self._groups: Dict[tuple, List[SimulationResult]] = {}
+        self._aggregates: Dict[tuple, Tuple[float, int, SimulationResult]] = {}
+        if input_data is not None:
+            self.save_input_data(input_data)
 
     # --- Simulation Results ---
-    def save_result(self, result: SimulationResult):
+    def save_result(self, result: SimulationResult) -> Optional[float]:
+        """
+        Store a result and return its own score, or None if it is pruned or no input is set.
+        """
         with self._lock:
-            logger.info(f"Saving simulation result: {result}")
+            logger.debug(f"Saving simulation result for job {self.job_id}: {result}")
             self._results.append(result)
+            if self._log:
+                self._log.result_saved(self.job_id, result)
+            return self._track(result)
 
     def save_results(self, results: List[SimulationResult]):
         with self._lock:
             self._results = results
+            self._rescore()
 
     def get_results(self) -> List[SimulationResult]:
         with self._lock:
             return list(self._results)
 
+    def get_result_count(self) -> int:
+        return len(self._results)
+
+    # --- Best Results ---
+    def get_best(self) -> Optional[Tuple[SimulationResult, float]]:
+        """
+        Best scored result so far and its score, or None before the first scored result.
+        For ensemble jobs this is the best parameter set, aggregated over its seeds.
+        """
+        with self._lock:
+            if self._ensemble:
+                if not self._aggregates:
+                    return None
+                score, _, result = min(self._aggregates.values(), key=lambda entry: entry[:2])
+                return result, score
+            if not self._top:
+                return None
+            # Min-heap on negated scores: the worst kept result is on top, the best is the max
+            neg_score, _, result = max(self._top)
+            return result, -neg_score
+
+    def get_top_results(self, k: int = TOP_K) -> List[Tuple[SimulationResult, float]]:
+        with self._lock:
+            if self._ensemble:
+                ranked = heapq.nsmallest(k, self._aggregates.values(), key=lambda entry: entry[:2])
+                return [(result, score) for score, _, result in ranked]
+            ranked = sorted(self._top, reverse=True)[:k]
+        return [(result, -neg_score) for neg_score, _, result in ranked]
+
+    def _track(self, result: SimulationResult) -> Optional[float]:
+        """
+        Score a new result once and keep it if it is among the TOP_K best.
+        Pruned results never compete, and in ensemble jobs a pruned seed takes
+        its whole parameter set out of the ranking. Must be called with the lock held.
+        """
+        if self._scorer is None:
+            return None
+        if self._ensemble:
+            self._track_aggregate(result)
+            return None if result.pruned else self._scorer.score(result)
+        if result.pruned:
+            return None
+        score = self._scorer.score(result)
+        # Negated sequence keeps the earliest result first among equal scores
+        entry = (-score, -next(self._sequence), result)
+        if len(self._top) < TOP_K:
+            heapq.heappush(self._top, entry)
+        elif entry[0] > self._top[0][0]:
+            heapq.heapreplace(self._top, entry)
+        return score
+
+    def _track_aggregate(self, result: SimulationResult):
+        key = result.parameter_key()
+        group = self._groups.setdefault(key, [])
+        group.append(result)
+        aggregate = aggregate_group(group)
+        if aggregate.pruned:
+            self._aggregates.pop(key, None)
+            return
+        sequence = self._aggregates[key][1] if key in self._aggregates else next(self._sequence)
+        self._aggregates[key] = (self._scorer.score(aggregate), sequence, aggregate)
+
+    def _rescore(self):
+        """
+        Rebuild the top-k from scratch, scoring all results in one vectorized pass.
+        """
+        self._top = []
+        self._groups = {}
+        self._aggregates = {}
+        if self._scorer is None:
+            return
+        if self._ensemble:
+            for result in self._results:
+                self._groups.setdefault(result.parameter_key(), []).append(result)
+            aggregates = [aggregate for aggregate in aggregate_results(self._results) if not aggregate.pruned]
+            for aggregate, score in zip(aggregates, self._scorer.scores(aggregates)):
+                self._aggregates[aggregate.parameter_key()] = (float(score), next(self._sequence), aggregate)
+            return
+        candidates = [result for result in self._results if not result.pruned]
+        for result, score in self._scorer.top_k(candidates, TOP_K):
+            heapq.heappush(self._top, (-score, -next(self._sequence), result))
+
     # --- Worker Count ---
     def set_worker_count(self, count: int):
 
         self._worker_count = count
+        if self._log:
+            self._log.worker_count_set(self.job_id, count)
 
     def get_worker_count(self) -> int:
         return self._worker_count
 
     # --- Simulation Input Data ---
-    def save_input_data(self, input_data: SimulationInput):
-        self._input_data = input_data
+    def save_input_data(self, input_data: Union[SimulationInput, SearchInput]):
+        with self._lock:
+            self._input_data = input_data
+            self._scorer = Scoring(input_data)
+            self._ensemble = is_ensemble(input_data)
+            self._rescore()
+            if self._log:
+                self._log.input_saved(self.job_id, input_data)
 
-    def get_input_data(self) -> Optional[SimulationInput]:
+    def get_input_data(self) -> Optional[Union[SimulationInput, SearchInput]]:
         return self._input_data
 
-    # --- Store Management ---
+    # --- Task Queue ---
+    def enqueue_tasks(self, combinations: Iterable[Combination]) -> int:
+        return self._queue.put_many(combinations)
+
+    def next_task(self, visibility_timeout: Optional[float] = None) -> Optional[dict]:
+        return self._queue.next_task(visibility_timeout)
+
+    def complete_task(self, task_id: str) -> bool:
+        return self._queue.complete(task_id)
+
+    def save_task_result(self, result: SimulationResult) -> Tuple[bool, Optional[float]]:
+        """
+        Acknowledge the result's task and store the result as one step. Returns (False, None)
+        for unknown or already completed tasks, else True and the result's score.
+        """
+        task_id = result.task_id
+        if task_id and not self.complete_task(task_id):
+            if self._queue.has_task(task_id) or self._has_result_for(result):
+                return False, None
+            # Tasks are not kept across a restart; a worker launched before it still reports under
+            # its old task ID. Take its result and drop the task queued since for the same combination.
+            logger.info(f"Accepting result of task {task_id} from before a restart for job {self.job_id}")
+            task_id = self._queue.complete_combination(result.combination_key())
+        try:
+            return True, self.save_result(result)
+        except Exception:
+            if task_id:
+                # Not stored, so the worker's retry must not be dropped as a duplicate
+                self._queue.reopen(task_id)
+            raise
+
+    def _has_result_for(self, result: SimulationResult) -> bool:
+        key = result.combination_key()
+        return any(stored.combination_key() == key for stored in self.get_results())
+
+    def get_open_task_keys(self) -> Set[tuple]:
+        """
+        Combination keys of the job's tasks that are pending, leased or failed.
+        """
+        return self._queue.open_keys()
+
+    def release_task(self, task_id: str) -> bool:
+        return self._queue.release(task_id)
+
+    def get_pending_count(self) -> int:
+        return self._queue.pending_count()
+
+    def get_queue_stats(self) -> Dict[str, int]:
+        return self._queue.stats()
+
+    def is_queue_finished(self) -> bool:
+        return self._queue.is_finished()
+
+    def is_finished(self) -> bool:
+        """
+        Every expected result has arrived or failed. A job that expects nothing yet has only just been created.
+        """
+        expected = self.get_worker_count()
+        if expected == 0:
+            return False
+        failed = self._queue.stats()["failed"]
+        return self.is_queue_finished() and self.get_result_count() + failed >= expected
+
     def clear(self):
         with self._lock:
             self._results = []
+            self._top = []
+            self._scorer = None
         self._worker_count = 0
         self._input_data = None
+        self._queue.clear()
+
+
+class BaseStore:
+    """
+    Job registry API shared by the store backends.
+
+    Every submission gets its own job, so concurrent sweeps never see each
+    other's results. The per-job methods on the registry itself act on the most
+    recently created job, for callers that do not pass a job ID.
+    """
+    # --- Jobs ---
+    def create_job(self, input_data: Optional[Union[SimulationInput, SearchInput]] = None) -> JobStore:
+        job = self._new_job(uuid.uuid4().hex[:12], input_data)
+        self._evict_finished_jobs(keep=job.job_id)
+        logger.info(f"Created job {job.job_id}")
+        return job
+
+    def get_job(self, job_id: Optional[str] = None) -> Optional[JobStore]:
+        """
+        The job with this ID, or the most recent job when job_id is None.
+        """
+        raise NotImplementedError
+
+    def get_jobs(self) -> List[JobStore]:
+        raise NotImplementedError
+
+    def claim_job(self, job_id: str) -> bool:
+        """
+        Take ownership of running the job. False while another live process owns it.
+        """
+        return True
+
+    def renew_claim(self, job_id: str) -> bool:
+        """
+        Refresh this process's ownership of the job. False if another process has taken it over.
+        """
+        return True
+
+    def release_job(self, job_id: str):
+        """
+        Give up ownership of the job, so any process may resume it right away.
+        """
+
+    def current_job(self) -> JobStore:
+        """
+        The most recent job, created empty if there is none yet.
+        """
+        return self.get_job() or self.create_job()
+
+    def _new_job(self, job_id: str, input_data: Optional[Union[SimulationInput, SearchInput]]) -> JobStore:
+        raise NotImplementedError
+
+    def _remove_job(self, job_id: str):
+        raise NotImplementedError
+
+    def _evict_finished_jobs(self, keep: Optional[str] = None):
+        jobs = self.get_jobs()
+        finished = [job.job_id for job in jobs if job.job_id != keep and job.is_finished()]
+        for job_id in finished[:max(len(jobs) - MAX_JOBS, 0)]:
+            logger.info(f"Evicting finished job {job_id}")
+            self._remove_job(job_id)
+
+    # --- Tasks across jobs ---
+    def next_task(self) -> Optional[dict]:
+        """
+        Lease a task from the job with the fewest tasks in flight, so concurrent jobs share pool workers.
+        """
+        candidates = []
+        for job in self.get_jobs():
+            stats = job.get_queue_stats()
+            if stats["pending"]:
+                candidates.append((stats["in_flight"], job))
+        for _, job in sorted(candidates, key=lambda candidate: candidate[0]):
+            task = job.next_task()
+            if task is not None:
+                return task
+        return None
+
+    def get_in_flight_count(self) -> int:
+        return sum(job.get_queue_stats()["in_flight"] for job in self.get_jobs())
+
+    # --- Most recent job ---
+    def save_result(self, result: SimulationResult) -> Optional[float]:
+        return self.current_job().save_result(result)
+
+    def save_results(self, results: List[SimulationResult]):
+        self.current_job().save_results(results)
+
+    def get_results(self) -> List[SimulationResult]:
+        return self.current_job().get_results()
+
+    def get_result_count(self) -> int:
+        return self.current_job().get_result_count()
+
+    def get_best(self) -> Optional[Tuple[SimulationResult, float]]:
+        return self.current_job().get_best()
+
+    def get_top_results(self, k: int = TOP_K) -> List[Tuple[SimulationResult, float]]:
+        return self.current_job().get_top_results(k)
+
+    def set_worker_count(self, count: int):
+        self.current_job().set_worker_count(count)
+
+    def get_worker_count(self) -> int:
+        return self.current_job().get_worker_count()
+
+    def save_input_data(self, input_data: Union[SimulationInput, SearchInput]):
+        self.current_job().save_input_data(input_data)
+
+    def get_input_data(self) -> Optional[Union[SimulationInput, SearchInput]]:
+        return self.current_job().get_input_data()
+
+    def enqueue_tasks(self, combinations: Iterable[Combination]) -> int:
+        return self.current_job().enqueue_tasks(combinations)
+
+    def complete_task(self, task_id: str) -> bool:
+        return self.current_job().complete_task(task_id)
+
+    def get_pending_count(self) -> int:
+        return self.current_job().get_pending_count()
+
+    def get_queue_stats(self) -> Dict[str, int]:
+        return self.current_job().get_queue_stats()
+
+    def is_queue_finished(self) -> bool:
+        return self.current_job().is_queue_finished()
+
+    # --- Store Management ---
+    def clear(self):
+        raise NotImplementedError
+
+
+class InMemoryStore(BaseStore):
+    """
+    Jobs held in this process's memory. Only correct with a single server process.
+    With a ResultLog attached, every change is also appended to the log.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(InMemoryStore, cls).__new__(cls)
+            cls._instance._jobs: "OrderedDict[str, JobStore]" = OrderedDict()
+            cls._instance._jobs_lock = threading.Lock()
+            cls._instance._log: Optional[ResultLog] = None
+        return cls._instance
+
+    def attach_log(self, log: ResultLog):
+        """
+        Rebuild the jobs recorded in the log, then record every further change in it.
+        """
+        jobs: "OrderedDict[str, JobStore]" = OrderedDict()
+        results: Dict[str, List[SimulationResult]] = {}
+        for event in log.events():
+            job_id = event["job_id"]
+            if event["event"] == "job":
+                jobs[job_id] = JobStore(job_id)
+                results[job_id] = []
+            elif job_id not in jobs:
+                continue
+            elif event["event"] == "input":
+                jobs[job_id].save_input_data(INPUT_MODELS[event["kind"]].model_validate(event["input_data"]))
+            elif event["event"] == "worker_count":
+                jobs[job_id].set_worker_count(event["count"])
+            elif event["event"] == "result":
+                results[job_id].append(SimulationResult.model_validate(event["result"]))
+            elif event["event"] == "evict":
+                del jobs[job_id]
+
+        for job_id, job in jobs.items():
+            # One vectorized rescoring per job instead of one per result
+            job.save_results(results[job_id])
+            job._log = log
+
+        with self._jobs_lock:
+            self._jobs.update(jobs)
+            self._log = log
+        log.compact(self.get_jobs())
+        logger.info(f"Restored {len(jobs)} jobs from result log '{log.path}'")
+
+    def _new_job(self, job_id: str, input_data: Optional[Union[SimulationInput, SearchInput]]) -> JobStore:
+        if self._log:
+            self._log.job_created(job_id)
+        job = JobStore(job_id, input_data, self._log)
+        with self._jobs_lock:
+            self._jobs[job_id] = job
+        return job
+
+    def _remove_job(self, job_id: str):
+        with self._jobs_lock:
+            self._jobs.pop(job_id, None)
+        if self._log:
+            self._log.job_removed(job_id)
+
+    def get_job(self, job_id: Optional[str] = None) -> Optional[JobStore]:
+        with self._jobs_lock:
+            if job_id is not None:
+                return self._jobs.get(job_id)
+            if not self._jobs:
+                return None
+            return next(reversed(self._jobs.values()))
+
+    def get_jobs(self) -> List[JobStore]:
+        with self._jobs_lock:
+            return list(self._jobs.values())
+
+    def clear(self):
+        """
+        Forget all jobs and detach the result log; the log file itself is left untouched.
+        """
+        with self._jobs_lock:
+            self._jobs.clear()
+            self._log = None
+
+
+def get_store() -> BaseStore:
+    """
+    The store backend selected by STORE_BACKEND: "memory" (default) or "sqlite".
+    Use "sqlite" when the master runs several server processes.
+    """
+    backend = os.getenv("STORE_BACKEND", "memory")
+    if backend == "sqlite":
+        from .sqlite_store import SqliteStore
+        return SqliteStore.shared()
+    if backend != "memory":
+        raise ValueError(f"Unknown STORE_BACKEND '{backend}'")
+
+    store = InMemoryStore()
+    if store._log is None:
+        log = open_result_log()
+        if log is not None:
+            store.attach_log(log)
+    return store
@@ -0,0 +1,52 @@
+import logging
+from .logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+from collections import defaultdict
+from typing import Dict, Iterable, List
+import numpy as np
+from .models import SimulationResult
+
+
+def summarize_timings(results: Iterable[SimulationResult]) -> dict:
+    """
+    Per-phase statistics over the timings workers reported with a job's results.
+    Results without timings (cache hits, older workers) are left out.
+    """
+    spans: Dict[str, List[float]] = defaultdict(list)
+    counts: Dict[str, List[int]] = defaultdict(list)
+    samples: Dict[str, List[float]] = defaultdict(list)
+    runs = 0
+
+    for result in results:
+        if result.timings is None:
+            continue
+        runs += 1
+        for name, seconds in result.timings.spans.items():
+            spans[name].append(seconds)
+        for name, value in result.timings.counts.items():
+            counts[name].append(value)
+        for sample in result.timings.samples:
+            for name, value in sample.items():
+                if name != "step":
+                    samples[name].append(value)
+
+    return {
+        "runs": runs,
+        "spans": {name: describe(values) for name, values in spans.items()},
+        "counts": {name: {"total": int(sum(values)), "mean": float(np.mean(values))} for name, values in counts.items()},
+        "step_samples": {name: describe(values) for name, values in samples.items()}
+    }
+
+
+def describe(values: List[float]) -> dict:
+    array = np.asarray(values, dtype=float)
+    return {
+        "count": int(array.size),
+        "total": float(array.sum()),
+        "mean": float(array.mean()),
+        "p50": float(np.percentile(array, 50)),
+        "p95": float(np.percentile(array, 95)),
+        "max": float(array.max())
+    }
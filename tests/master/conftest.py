@@ -0,0 +1,30 @@
+import pytest
+from master.app.models import SimulationInput, SimulationResult
+
+
+@pytest.fixture
+def make_input():
+    """Factory for a SimulationInput over a small grid; keyword arguments override any field."""
+    def make(accel_values=(1.0, 2.0), expected_delays=None, **kwargs):
+        return SimulationInput(
+            accel_values=list(accel_values),
+            tau_values=[1.0],
+            startup_delay_values=[0.0],
+            expected_delays=expected_delays if expected_delays is not None else {"I2": 50.0, "I3": 20.0},
+            **kwargs
+        )
+    return make
+
+
+@pytest.fixture
+def make_result():
+    """Factory for a SimulationResult with delays at I2 and I3 (or the given delays); keyword arguments set any other field."""
+    def make(accel=1.0, i2=50.0, i3=20.0, delays=None, **kwargs):
+        return SimulationResult(
+            accel=accel,
+            tau=1.0,
+            startup_delay=0.0,
+            intersection_avg_delays=delays if delays is not None else {"I2": i2, "I3": i3},
+            **kwargs
+        )
+    return make
@@ -1,9 +1,14 @@
-from fastapi.responses import HTMLResponse
+import asyncio
+import gzip
+import json
+import sqlite3
+from fastapi.responses import HTMLResponse, JSONResponse
 import pytest
 from unittest.mock import Mock, AsyncMock
 from master.app.controller import TrafficSimController
-from master.app.models import SimulationInput, SimulationResult
+from master.app.models import ParameterRange, SearchInput, SimulationInput, SimulationResult
 from master.app.store import InMemoryStore
+from worker.result_client import ResultClient
 from fastapi import BackgroundTasks
 
 
@@ -42,6 +47,21 @@ async def test_submit_success(controller, cleared_store):
     assert result["total_combinations"] == 4
 
 
+@pytest.mark.asyncio
+async def test_submit_reports_replicate_upper_bound(controller, cleared_store):
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0},
+        target_ci=0.5,
+        max_replicates=4
+    )
+    result = await controller.submit(input_data, BackgroundTasks(), cleared_store)
+    assert result["total_combinations"] == 8
+    assert cleared_store.get_job(result["job_id"]).get_worker_count() == 8
+
+
 @pytest.mark.asyncio
 async def test_receive_result(controller, cleared_store):
     result = SimulationResult(
@@ -75,6 +95,26 @@ def test_get_best_result_in_progress(controller, cleared_store):
     assert response["expected"] == 3
 
 
+def test_get_best_result_in_progress_reports_partial_best(controller, cleared_store):
+    cleared_store.set_worker_count(3)
+    cleared_store.save_input_data(SimulationInput(
+        accel_values=[1.0, 2.0, 3.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 48.0, "I3": 18.0}
+    ))
+    cleared_store.save_result(SimulationResult(
+        accel=1.0,
+        tau=1.0,
+        startup_delay=0.0,
+        intersection_avg_delays={"I2": 48.0, "I3": 18.0}
+    ))
+    response = controller.get_best_result(cleared_store)
+    assert response["status"] == "in_progress"
+    assert response["best"].accel == 1.0
+    assert response["best_score"] == 0.0
+
+
 def test_get_best_result_complete(controller, cleared_store):
     cleared_store.set_worker_count(2)
     cleared_store.save_input_data(SimulationInput(
@@ -97,3 +137,244 @@ def test_get_best_result_complete(controller, cleared_store):
         intersection_avg_delays={"I2": 51.0, "I3": 19.0}))
     result = controller.get_best_result(cleared_store)
     assert isinstance(result, SimulationResult)
+
+
+def test_next_job_hands_out_queued_task(controller, cleared_store):
+    cleared_store.enqueue_tasks([(1.0, 1.5, 0.0)])
+    task = controller.next_job(cleared_store)
+    assert task["accel"] == 1.0
+    assert task["tau"] == 1.5
+    assert controller.next_job(cleared_store) == {"status": "no_jobs"}
+
+
+@pytest.mark.asyncio
+async def test_receive_result_acknowledges_task_once(controller, cleared_store):
+    cleared_store.enqueue_tasks([(2.0, 1.0, 0.5)])
+    task = controller.next_job(cleared_store)
+    result = SimulationResult(
+        accel=2.0,
+        tau=1.0,
+        startup_delay=0.5,
+        intersection_avg_delays={"I2": 49.0, "I3": 22.0},
+        task_id=task["task_id"]
+    )
+
+    assert (await controller.receive_result(result, cleared_store))["status"] == "result_received"
+    assert (await controller.receive_result(result, cleared_store))["status"] == "duplicate_ignored"
+    assert len(cleared_store.get_results()) == 1
+
+
+@pytest.mark.asyncio
+async def test_receive_results_batch(controller, cleared_store):
+    cleared_store.enqueue_tasks([(1.0, 1.0, 0.0), (2.0, 1.0, 0.0)])
+    tasks = [controller.next_job(cleared_store), controller.next_job(cleared_store)]
+    results = [
+        SimulationResult(
+            accel=task["accel"],
+            tau=task["tau"],
+            startup_delay=task["startup_delay"],
+            intersection_avg_delays={"I2": 40.0, "I3": 20.0},
+            task_id=task["task_id"]
+        )
+        for task in tasks
+    ]
+
+    response = await controller.receive_results(results + results[:1], cleared_store)
+    assert response["accepted"] == 2
+    assert response["ignored"] == 1
+    assert len(cleared_store.get_results()) == 2
+
+
+def test_worker_retries_result_the_master_failed_to_store(controller, cleared_store, mocker):
+    cleared_store.enqueue_tasks([(2.0, 1.0, 0.5)])
+    task = controller.next_job(cleared_store)
+    job = cleared_store.current_job()
+    save_result = job.save_result
+    failures = [sqlite3.OperationalError("database is locked")]
+
+    def flaky_save(result):
+        if failures:
+            raise failures.pop()
+        return save_result(result)
+
+    mocker.patch.object(job, "save_result", side_effect=flaky_save)
+
+    def post(url, json=None, **kwargs):
+        response = asyncio.run(controller.receive_result(SimulationResult(**json), cleared_store))
+        if isinstance(response, JSONResponse):
+            return Mock(status_code=response.status_code, text=response.body.decode())
+        return Mock(status_code=200, text=str(response))
+
+    client = ResultClient("http://master/report_result", max_retries=2, backoff=0)
+    mocker.patch.object(client.session, "post", side_effect=post)
+    result = {
+        "accel": 2.0, "tau": 1.0, "startup_delay": 0.5, "intersection_avg_delays": {"I2": 49.0, "I3": 22.0},
+        "task_id": task["task_id"]
+    }
+
+    assert client.send([result]) is True
+    assert client.session.post.call_count == 2
+    assert len(cleared_store.get_results()) == 1
+    assert cleared_store.get_queue_stats()["done"] == 1
+
+
+@pytest.mark.asyncio
+async def test_receive_encoded_results_gzip_ndjson(controller, cleared_store):
+    cleared_store.create_job()
+    lines = [
+        json.dumps({"accel": accel, "tau": 1.0, "startup_delay": 0.0, "intersection_avg_delays": {"I2": 40.0}})
+        for accel in (1.0, 2.0, 3.0)
+    ]
+    request = Mock()
+    request.body = AsyncMock(return_value=gzip.compress("\n".join(lines).encode()))
+    request.headers = {"content-type": "application/x-ndjson", "content-encoding": "gzip"}
+
+    response = await controller.receive_encoded_results(request, cleared_store)
+    assert response["accepted"] == 3
+    assert len(cleared_store.get_results()) == 3
+
+
+@pytest.mark.asyncio
+async def test_receive_encoded_results_rejects_bad_payloads(controller, cleared_store):
+    request = Mock()
+    request.body = AsyncMock(return_value=b"plain text")
+    request.headers = {"content-type": "text/plain"}
+    assert (await controller.receive_encoded_results(request, cleared_store)).status_code == 415
+
+    request.headers = {"content-type": "application/json"}
+    assert (await controller.receive_encoded_results(request, cleared_store)).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_submit_search(controller, cleared_store):
+    search_input = SearchInput(
+        expected_delays={"I2": 50.0, "I3": 20.0},
+        accel_range=ParameterRange(min=1.0, max=3.0),
+        tau_range=ParameterRange(min=1.0, max=2.0),
+        startup_delay_range=ParameterRange(min=0.0, max=1.0),
+        budget=20
+    )
+    background_tasks = BackgroundTasks()
+    result = await controller.submit_search(search_input, background_tasks, cleared_store)
+    assert result == {"status": "processing_started", "job_id": cleared_store.get_job().job_id, "budget": 20}
+    assert cleared_store.get_worker_count() == 20
+    assert cleared_store.get_input_data() == search_input
+
+
+def test_prune_bound_ignores_pruned_results(controller, cleared_store):
+    cleared_store.save_input_data(SimulationInput(
+        accel_values=[1.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0, 1.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    ))
+    assert controller.prune_bound(cleared_store)["best_score"] is None
+
+    cleared_store.save_result(SimulationResult(
+        accel=1.0, tau=1.0, startup_delay=0.0,
+        intersection_avg_delays={"I2": 50.0, "I3": 20.0},
+        pruned=True, pruned_at_step=1000
+    ))
+    cleared_store.save_result(SimulationResult(
+        accel=1.0, tau=1.0, startup_delay=1.0,
+        intersection_avg_delays={"I2": 52.0, "I3": 20.0}
+    ))
+
+    bound = controller.prune_bound(cleared_store)
+    assert bound["expected_delays"] == {"I2": 50.0, "I3": 20.0}
+    assert bound["best_score"] == 4.0
+
+
+@pytest.mark.asyncio
+async def test_receive_result_publishes_progress(controller, cleared_store):
+    cleared_store.set_worker_count(2)
+    cleared_store.save_input_data(SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 48.0, "I3": 18.0}
+    ))
+    queue = controller.progress.subscribe()
+
+    await controller.receive_result(SimulationResult(
+        accel=1.0,
+        tau=1.0,
+        startup_delay=0.0,
+        intersection_avg_delays={"I2": 50.0, "I3": 18.0}
+    ), cleared_store)
+
+    event_type, event = await asyncio.wait_for(queue.get(), 1)
+    assert event_type == "progress"
+    assert event["status"] == "in_progress"
+    assert event["received"] == 1
+    assert event["score"] == 4.0
+    assert event["best"]["accel"] == 1.0
+    controller.progress.unsubscribe(queue)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_jobs_keep_separate_results(controller, cleared_store):
+    def make_input(expected):
+        return SimulationInput(
+            accel_values=[1.0],
+            tau_values=[1.0],
+            startup_delay_values=[0.0],
+            expected_delays={"I2": expected, "I3": 20.0}
+        )
+
+    first = await controller.submit(make_input(50.0), BackgroundTasks(), cleared_store)
+    second = await controller.submit(make_input(60.0), BackgroundTasks(), cleared_store)
+    assert first["job_id"] != second["job_id"]
+
+    late = SimulationResult(
+        accel=1.0, tau=1.0, startup_delay=0.0,
+        intersection_avg_delays={"I2": 50.0, "I3": 20.0},
+        job_id=first["job_id"]
+    )
+    assert (await controller.receive_result(late, cleared_store))["status"] == "result_received"
+
+    assert controller.get_best_result(cleared_store, first["job_id"]).job_id == first["job_id"]
+    assert controller.get_best_result(cleared_store, second["job_id"])["status"] == "no_results_yet"
+    assert controller.get_best_result(cleared_store, "missing") == {"status": "unknown_job"}
+
+    stray = late.model_copy(update={"job_id": "missing"})
+    assert (await controller.receive_result(stray, cleared_store))["status"] == "unknown_job"
+    assert [job["job_id"] for job in controller.list_jobs(cleared_store)] == [first["job_id"], second["job_id"]]
+
+
+def test_resume_jobs_relaunches_unfinished_jobs(controller, cleared_store, mocker):
+    resume = mocker.patch.object(controller.runner, "resume")
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+    finished = cleared_store.create_job(input_data)
+    finished.set_worker_count(1)
+    finished.save_result(SimulationResult(accel=1.0, tau=1.0, startup_delay=0.0, intersection_avg_delays={"I2": 50.0}))
+    unfinished = cleared_store.create_job(input_data)
+    unfinished.set_worker_count(2)
+    running = cleared_store.create_job(input_data)
+    running.set_worker_count(2)
+    mocker.patch.object(controller.runner, "is_running", side_effect=lambda job_id: job_id == running.job_id)
+
+    assert controller.resume_jobs(cleared_store) == [unfinished.job_id]
+    resume.assert_called_once_with(unfinished)
+
+
+@pytest.mark.asyncio
+async def test_timings_are_aggregated_per_job_with_report_latency(controller, cleared_store):
+    job = cleared_store.create_job()
+    result = SimulationResult(
+        accel=1.0, tau=1.0, startup_delay=0.0, intersection_avg_delays={"I2": 40.0}, job_id=job.job_id,
+        timings={"spans": {"sumo_step": 2.5}, "counts": {"steps": 2000}, "finished_at": 1.0}
+    )
+    await controller.receive_result(result, cleared_store)
+
+    summary = controller.get_timings(cleared_store, job.job_id)
+    assert summary["job_id"] == job.job_id
+    assert summary["runs"] == 1
+    assert summary["spans"]["sumo_step"]["total"] == 2.5
+    assert summary["spans"]["report"]["max"] > 0
+    assert controller.get_timings(cleared_store, "missing") == {"status": "unknown_job"}
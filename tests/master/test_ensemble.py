@@ -0,0 +1,45 @@
+import math
+import pytest
+from master.app.ensemble import aggregate_results, ci_half_width, initial_replicates, is_ensemble, replicate_limit
+
+
+def test_replicate_settings(make_input):
+    assert not is_ensemble(make_input())
+    assert make_input(replicates=3).combination_count() == 6
+
+    sequential = make_input(target_ci=0.5)
+    assert is_ensemble(sequential)
+    assert initial_replicates(sequential) == 2
+    assert replicate_limit(sequential) == 10
+    # Two parameter sets that may each grow to ten seeds
+    assert sequential.combination_count() == 20
+    assert replicate_limit(make_input(replicates=4, target_ci=0.5, max_replicates=6)) == 6
+
+
+def test_aggregate_results_groups_seeds_per_parameter_set(make_result):
+    results = [
+        make_result(1.0, 48.0, seed=0),
+        make_result(2.0, 60.0, seed=0),
+        make_result(1.0, 52.0, seed=1),
+        make_result(1.0, 99.0, seed=2, pruned=True),
+    ]
+
+    first, second = aggregate_results(results)
+    assert (first.accel, first.replicates) == (1.0, 2)
+    assert first.intersection_avg_delays == {"I2": 50.0, "I3": 20.0}
+    assert first.delay_std["I2"] == pytest.approx(math.sqrt(8.0))
+    assert first.seed is None
+    # Its mean leaves out the pruned seed, so the set is not ranked
+    assert first.pruned
+    assert (second.accel, second.replicates, second.delay_std) == (2.0, 1, {"I2": 0.0, "I3": 0.0})
+    assert not second.pruned
+
+
+def test_ci_half_width_uses_student_t(make_result):
+    aggregate, = aggregate_results([make_result(1.0, 48.0, seed=0), make_result(1.0, 52.0, seed=1)])
+    # t(0.975, 1) * s / sqrt(2) with s = sqrt(8)
+    assert ci_half_width(aggregate, ["I2"]) == pytest.approx(12.706 * 2.0)
+    assert ci_half_width(aggregate, ["I3"]) == 0.0
+
+    single, = aggregate_results([make_result(1.0, 48.0, seed=0)])
+    assert ci_half_width(single, ["I2"]) == math.inf
@@ -0,0 +1,42 @@
+import gzip
+import json
+import msgpack
+import pytest
+from master.app.ingest import UnsupportedEncoding, decode_results
+
+RESULTS = [
+    {"accel": 1.0, "tau": 1.0, "startup_delay": 0.0, "intersection_avg_delays": {"I2": 40.0}, "task_id": "t1"},
+    {"accel": 2.0, "tau": 1.5, "startup_delay": 0.5, "intersection_avg_delays": {"I2": 45.0}, "job_id": "j1"},
+]
+
+
+def test_decode_json_list():
+    results = decode_results(json.dumps(RESULTS).encode(), "application/json")
+    assert [result.accel for result in results] == [1.0, 2.0]
+    assert results[0].task_id == "t1"
+
+
+def test_decode_gzipped_ndjson():
+    body = gzip.compress("\n".join(json.dumps(result) for result in RESULTS).encode() + b"\n")
+    results = decode_results(body, "application/x-ndjson", "gzip")
+    assert len(results) == 2
+    assert results[1].job_id == "j1"
+
+
+def test_decode_msgpack():
+    results = decode_results(msgpack.packb(RESULTS), "application/msgpack")
+    assert results[1].intersection_avg_delays == {"I2": 45.0}
+
+
+def test_decode_rejects_unknown_formats():
+    with pytest.raises(UnsupportedEncoding):
+        decode_results(b"", "text/csv")
+    with pytest.raises(UnsupportedEncoding):
+        decode_results(b"", "application/json", "br")
+
+
+def test_decode_rejects_invalid_bodies():
+    with pytest.raises(ValueError):
+        decode_results(b"not gzip", "application/x-ndjson", "gzip")
+    with pytest.raises(ValueError):
+        decode_results(b'{"accel": 1.0}', "application/x-ndjson")
@@ -0,0 +1,133 @@
+from master.app.job_queue import JobQueue
+
+
+def test_put_many_and_next_task_fifo():
+    queue = JobQueue()
+    assert queue.put_many([(1.0, 1.0, 0.0), (2.0, 1.5, 0.5)]) == 2
+    assert queue.pending_count() == 2
+
+    first = queue.next_task()
+    assert (first["accel"], first["tau"], first["startup_delay"]) == (1.0, 1.0, 0.0)
+    assert first["task_id"]
+
+    second = queue.next_task()
+    assert second["accel"] == 2.0
+    assert queue.next_task() is None
+
+
+def test_tasks_carry_extra_params():
+    queue = JobQueue()
+    queue.put_many([(1.0, 1.0, 0.0, {"truck.decel": 3.5}), (2.0, 1.0, 0.0, {})])
+
+    assert queue.next_task()["params"] == {"truck.decel": 3.5}
+    assert "params" not in queue.next_task()
+
+
+def test_clear_drops_pending_tasks():
+    queue = JobQueue()
+    queue.put_many([(1.0, 1.0, 0.0)])
+    queue.clear()
+    assert queue.pending_count() == 0
+    assert queue.next_task() is None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_complete_acknowledges_lease_once():
+    queue = JobQueue()
+    queue.put_many([(1.0, 1.0, 0.0)])
+    task = queue.next_task()
+
+    assert queue.stats()["in_flight"] == 1
+    assert queue.complete(task["task_id"]) is True
+    assert queue.complete(task["task_id"]) is False
+    assert queue.complete("unknown") is False
+    assert queue.is_finished()
+
+
+def test_expired_lease_is_requeued():
+    clock = FakeClock()
+    queue = JobQueue(visibility_timeout=10, max_attempts=3, clock=clock)
+    queue.put_many([(1.0, 1.0, 0.0)])
+
+    first = queue.next_task()
+    assert queue.next_task() is None
+
+    clock.now = 11
+    retry = queue.next_task()
+    assert retry["task_id"] == first["task_id"]
+    assert retry["attempt"] == 2
+
+
+def test_next_task_can_lease_for_longer():
+    clock = FakeClock()
+    queue = JobQueue(visibility_timeout=10, clock=clock)
+    queue.put_many([(1.0, 1.0, 0.0)])
+
+    queue.next_task(visibility_timeout=30)
+    clock.now = 11
+    assert queue.next_task() is None
+    clock.now = 31
+    assert queue.next_task()["attempt"] == 2
+
+
+def test_task_fails_after_max_attempts():
+    clock = FakeClock()
+    queue = JobQueue(visibility_timeout=10, max_attempts=2, clock=clock)
+    queue.put_many([(1.0, 1.0, 0.0)])
+
+    queue.next_task()
+    clock.now = 11
+    queue.next_task()
+    clock.now = 22
+
+    stats = queue.stats()
+    assert stats["failed"] == 1
+    assert stats["pending"] == 0
+    assert queue.next_task() is None
+    assert queue.is_finished()
+
+
+def test_late_result_after_requeue_completes_task():
+    clock = FakeClock()
+    queue = JobQueue(visibility_timeout=10, clock=clock)
+    queue.put_many([(1.0, 1.0, 0.0)])
+    task = queue.next_task()
+
+    clock.now = 11
+    assert queue.stats()["pending"] == 1
+    assert queue.complete(task["task_id"]) is True
+    assert queue.stats()["pending"] == 0
+    assert queue.next_task() is None
+
+
+def test_release_requeues_leased_task_until_max_attempts():
+    queue = JobQueue(max_attempts=2)
+    queue.put_many([(1.0, 1.0, 0.0)])
+
+    task = queue.next_task()
+    assert queue.release(task["task_id"]) is True
+    assert queue.release(task["task_id"]) is False
+    assert queue.next_task()["attempt"] == 2
+
+    assert queue.release(task["task_id"]) is True
+    assert queue.stats()["failed"] == 1
+    assert queue.is_finished()
+
+
+def test_reopen_leases_completed_task_again():
+    queue = JobQueue()
+    queue.put_many([(1.0, 1.0, 0.0)])
+    task_id = queue.next_task()["task_id"]
+    queue.complete(task_id)
+
+    assert queue.reopen(task_id) is True
+    assert queue.reopen(task_id) is False
+    assert queue.stats()["in_flight"] == 1
+    assert queue.complete(task_id) is True
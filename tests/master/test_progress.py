@@ -0,0 +1,35 @@
+import asyncio
+import pytest
+from master.app.progress import ProgressBroadcaster, format_event
+
+
+def test_format_event():
+    assert format_event("progress", {"received": 1}) == 'event: progress\ndata: {"received": 1}\n\n'
+
+
+@pytest.mark.asyncio
+async def test_publish_reaches_every_subscriber():
+    broadcaster = ProgressBroadcaster()
+    first, second = broadcaster.subscribe(), broadcaster.subscribe()
+
+    broadcaster.publish("progress", {"received": 1})
+    assert await asyncio.wait_for(first.get(), 1) == ("progress", {"received": 1})
+    assert await asyncio.wait_for(second.get(), 1) == ("progress", {"received": 1})
+
+    broadcaster.unsubscribe(first)
+    broadcaster.publish("progress", {"received": 2})
+    await asyncio.sleep(0)
+    assert first.empty()
+    assert broadcaster.subscriber_count() == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_keeps_newest_events():
+    broadcaster = ProgressBroadcaster(max_queued=2)
+    queue = broadcaster.subscribe()
+
+    for received in range(5):
+        broadcaster.publish("progress", {"received": received})
+    await asyncio.sleep(0)
+
+    assert [queue.get_nowait()[1]["received"] for _ in range(queue.qsize())] == [3, 4]
@@ -0,0 +1,139 @@
+import sqlite3
+import pytest
+from master.app.models import SimulationResult
+from master.app.result_cache import ResultCache, SCENARIO_FILES, scenario_fingerprint
+
+
+@pytest.fixture
+def scenario_dir(tmp_path):
+    directory = tmp_path / "scenario"
+    directory.mkdir()
+    for name in SCENARIO_FILES:
+        (directory / name).write_text(f"<{name}/>")
+    return directory
+
+
+def test_fingerprint_depends_on_files_and_version(scenario_dir):
+    base = scenario_fingerprint(scenario_dir, "1.12.0")
+    assert base == scenario_fingerprint(scenario_dir, "1.12.0")
+    assert base != scenario_fingerprint(scenario_dir, "1.19.0")
+
+    (scenario_dir / "scenario.json").write_text("{}")
+    assert base != scenario_fingerprint(scenario_dir, "1.12.0")
+    edited = scenario_fingerprint(scenario_dir, "1.12.0")
+
+    (scenario_dir / "hw_model.sumocfg.xml").write_text('<configuration><time-to-teleport value="-1"/></configuration>')
+    assert edited != scenario_fingerprint(scenario_dir, "1.12.0")
+    edited = scenario_fingerprint(scenario_dir, "1.12.0")
+
+    (scenario_dir / "run_simulation.py").write_text("SIMULATION_DURATION = 3600\n")
+    assert edited != scenario_fingerprint(scenario_dir, "1.12.0")
+
+
+def test_fingerprint_missing_file(scenario_dir):
+    (scenario_dir / "hw_model.net.xml").unlink()
+    assert scenario_fingerprint(scenario_dir, "1.12.0") is None
+
+
+def test_put_and_get_round_trip(tmp_path, scenario_dir):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), scenario_dir=str(scenario_dir), sumo_version="1.12.0")
+    result = SimulationResult(accel=2.0, tau=1.0, startup_delay=0.5, intersection_avg_delays={"I2": 40.0, "I3": 21.5})
+
+    assert cache.get(2.0, 1.0, 0.5) is None
+    cache.put(result)
+
+    cached = cache.get(2.0, 1.0, 0.5)
+    assert cached.intersection_avg_delays == {"I2": 40.0, "I3": 21.5}
+    assert cache.count() == 1
+
+
+def test_cache_survives_reopen_but_not_scenario_change(tmp_path, scenario_dir):
+    path = str(tmp_path / "cache.sqlite3")
+    ResultCache(path=path, scenario_dir=str(scenario_dir), sumo_version="1.12.0").put(
+        SimulationResult(accel=1.0, tau=1.0, startup_delay=0.0, intersection_avg_delays={"I2": 1.0})
+    )
+
+    assert ResultCache(path=path, scenario_dir=str(scenario_dir), sumo_version="1.12.0").get(1.0, 1.0, 0.0) is not None
+    assert ResultCache(path=path, scenario_dir=str(scenario_dir), sumo_version="1.13.0").get(1.0, 1.0, 0.0) is None
+
+
+def test_cache_disabled_without_sumo_version(tmp_path, scenario_dir, monkeypatch):
+    monkeypatch.delenv("SUMO_VERSION", raising=False)
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), scenario_dir=str(scenario_dir))
+    cache.put(SimulationResult(accel=1.0, tau=1.0, startup_delay=0.0, intersection_avg_delays={}))
+
+    assert not cache.enabled
+    assert cache.get(1.0, 1.0, 0.0) is None
+
+
+def test_params_are_part_of_the_key(tmp_path, scenario_dir):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), scenario_dir=str(scenario_dir), sumo_version="1.12.0")
+    cache.put(SimulationResult(
+        accel=2.0, tau=1.0, startup_delay=0.5, params={"truck.decel": 3.5}, intersection_avg_delays={"I2": 40.0}
+    ))
+
+    assert cache.get(2.0, 1.0, 0.5) is None
+    assert cache.get(2.0, 1.0, 0.5, {"truck.decel": 4.0}) is None
+    assert cache.get(2.0, 1.0, 0.5, {"truck.decel": 3.5}).params == {"truck.decel": 3.5}
+
+
+def test_seeds_are_cached_separately(tmp_path, scenario_dir):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), scenario_dir=str(scenario_dir), sumo_version="1.12.0")
+    cache.put(SimulationResult(accel=2.0, tau=1.0, startup_delay=0.5, intersection_avg_delays={"I2": 40.0}))
+    cache.put(SimulationResult(accel=2.0, tau=1.0, startup_delay=0.5, seed=1, intersection_avg_delays={"I2": 42.0}))
+
+    assert cache.get(2.0, 1.0, 0.5).intersection_avg_delays == {"I2": 40.0}
+    assert cache.get(2.0, 1.0, 0.5, seed=0) is None
+    seeded = cache.get(2.0, 1.0, 0.5, seed=1)
+    assert (seeded.seed, seeded.intersection_avg_delays) == (1, {"I2": 42.0})
+
+
+def test_cache_without_params_column_is_migrated(tmp_path, scenario_dir):
+    path = tmp_path / "cache.sqlite3"
+    fingerprint = scenario_fingerprint(scenario_dir, "1.12.0")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE results (fingerprint TEXT NOT NULL, accel REAL NOT NULL, tau REAL NOT NULL, "
+        "startup_delay REAL NOT NULL, intersection_avg_delays TEXT NOT NULL, "
+        "PRIMARY KEY (fingerprint, accel, tau, startup_delay))"
+    )
+    conn.execute("INSERT INTO results VALUES (?, 1.0, 1.0, 0.0, '{\"I2\": 3.0}')", (fingerprint,))
+    conn.commit()
+    conn.close()
+
+    cache = ResultCache(path=str(path), scenario_dir=str(scenario_dir), sumo_version="1.12.0")
+    assert cache.get(1.0, 1.0, 0.0).intersection_avg_delays == {"I2": 3.0}
+
+
+def test_percentiles_are_cached(tmp_path, scenario_dir):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), scenario_dir=str(scenario_dir), sumo_version="1.12.0")
+    percentiles = {"I2": {"p50": 12.0, "p90": 41.0, "p95": 55.0}}
+    cache.put(SimulationResult(
+        accel=2.0, tau=1.0, startup_delay=0.5, intersection_avg_delays={"I2": 40.0},
+        intersection_delay_percentiles=percentiles
+    ))
+
+    assert cache.get(2.0, 1.0, 0.5).intersection_delay_percentiles == percentiles
+
+
+def test_cache_without_percentiles_column_is_migrated(tmp_path, scenario_dir):
+    path = tmp_path / "cache.sqlite3"
+    fingerprint = scenario_fingerprint(scenario_dir, "1.12.0")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE results (fingerprint TEXT NOT NULL, accel REAL NOT NULL, tau REAL NOT NULL, "
+        "startup_delay REAL NOT NULL, params TEXT NOT NULL, seed INTEGER NOT NULL, intersection_avg_delays TEXT NOT NULL, "
+        "PRIMARY KEY (fingerprint, accel, tau, startup_delay, params, seed))"
+    )
+    conn.execute("INSERT INTO results VALUES (?, 1.0, 1.0, 0.0, '{}', -1, '{\"I2\": 3.0}')", (fingerprint,))
+    conn.commit()
+    conn.close()
+
+    cache = ResultCache(path=str(path), scenario_dir=str(scenario_dir), sumo_version="1.12.0")
+    old = cache.get(1.0, 1.0, 0.0)
+    assert (old.intersection_avg_delays, old.intersection_delay_percentiles) == ({"I2": 3.0}, None)
+    cache.put(SimulationResult(
+        accel=2.0, tau=1.0, startup_delay=0.0, intersection_avg_delays={"I2": 4.0},
+        intersection_delay_percentiles={"I2": {"p50": 4.0}}
+    ))
+    assert cache.get(2.0, 1.0, 0.0).intersection_delay_percentiles == {"I2": {"p50": 4.0}}
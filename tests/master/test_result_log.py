@@ -0,0 +1,54 @@
+import pytest
+from master.app.result_log import ResultLog
+from master.app.store import InMemoryStore
+
+
+@pytest.fixture
+def store():
+    store = InMemoryStore()
+    store.clear()
+    yield store
+    store.clear()
+
+
+def test_store_is_rebuilt_from_log(store, tmp_path, make_input, make_result):
+    path = tmp_path / "results.jsonl"
+    store.attach_log(ResultLog(path))
+    job = store.create_job(make_input(accel_values=[1.0, 2.0, 3.0]))
+    job.set_worker_count(3)
+    job.save_result(make_result(1.0, 55.0))
+    job.save_result(make_result(2.0, 51.0))
+
+    # A restart loses everything held in memory
+    store.clear()
+    assert store.get_job(job.job_id) is None
+
+    store.attach_log(ResultLog(path))
+    restored = store.get_job(job.job_id)
+    assert restored.get_input_data() == make_input(accel_values=[1.0, 2.0, 3.0])
+    assert restored.get_worker_count() == 3
+    assert restored.get_results() == [make_result(1.0, 55.0), make_result(2.0, 51.0)]
+    assert restored.get_best() == (make_result(2.0, 51.0), 1.0)
+
+    restored.save_result(make_result(3.0, 50.0))
+    store.clear()
+    store.attach_log(ResultLog(path))
+    assert store.get_job(job.job_id).get_result_count() == 3
+
+
+def test_replay_skips_torn_line_and_evicted_jobs(store, tmp_path, make_result):
+    path = tmp_path / "results.jsonl"
+    log = ResultLog(path)
+    log.job_created("kept")
+    log.result_saved("kept", make_result(1.0, 50.0))
+    log.job_created("gone")
+    log.job_removed("gone")
+    with open(path, "a") as log_file:
+        log_file.write('{"event": "result", "job_id": "kept", "res')
+
+    store.attach_log(ResultLog(path))
+    assert [job.job_id for job in store.get_jobs()] == ["kept"]
+    assert store.get_job("kept").get_result_count() == 1
+
+    # Replaying compacts the log to the current state
+    assert len(path.read_text().splitlines()) == 3
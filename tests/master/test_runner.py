@@ -1,6 +1,13 @@
+import json
+import time
 import pytest
-from master.app.models import SimulationInput
-from master.app.runner import SimulationRunner
+from concurrent.futures import ThreadPoolExecutor
+from master.app.job_queue import VISIBILITY_TIMEOUT
+from master.app.models import ParameterRange, SearchInput, SimulationInput, SimulationResult, VTypeParameter
+from master.app.scoring import Scoring
+from master.app.runner import LocalProcessExecutor, SimulationRunner
+from master.app.sqlite_store import SqliteStore
+from master.app.store import InMemoryStore
 
 
 @pytest.mark.runner
@@ -8,7 +15,10 @@ def test_launch_starts_expected_workers(mocker):
     """Test that SimulationRunner.launch calls Docker run the correct number of times."""
     mock_client = mocker.Mock()
     mock_run = mock_client.containers.run
+    # Finished workers acknowledge their task, freeing a launch slot
+    mock_run.side_effect = lambda *args, **kwargs: InMemoryStore().complete_task(kwargs["environment"]["TASK_ID"])
     mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+    InMemoryStore().clear()
 
     input_data = SimulationInput(
         accel_values=[1.0],
@@ -17,7 +27,7 @@ def test_launch_starts_expected_workers(mocker):
         expected_delays={"I2": 50.0, "I3": 20.0}
     )
 
-    runner = SimulationRunner()
+    runner = SimulationRunner(poll_interval=0)
     runner.launch(input_data)
 
     assert mock_run.call_count == 2  # 1 accel * 2 tau * 1 delay = 2 combinations
@@ -27,3 +37,480 @@ def test_launch_starts_expected_workers(mocker):
     assert kwargs["environment"]["ACCEL"] in [1.0]
     assert kwargs["environment"]["TAU"] in [1.0, 2.0]
     assert kwargs["environment"]["STARTUP_DELAY"] == 0.0
+
+
+@pytest.mark.runner
+def test_launch_sweeps_per_vtype_parameters(mocker):
+    """Extra vType parameters multiply the grid and reach the worker as PARAMS."""
+    mock_client = mocker.Mock()
+    mock_run = mock_client.containers.run
+    mock_run.side_effect = lambda *args, **kwargs: InMemoryStore().complete_task(kwargs["environment"]["TASK_ID"])
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+    InMemoryStore().clear()
+
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        parameters=[
+            VTypeParameter(attribute="decel", vtype="truck", range=ParameterRange(min=3.0, max=4.0, step=0.5)),
+            VTypeParameter(attribute="sigma", values=[0.5])
+        ],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+    assert input_data.combination_count() == 6
+
+    SimulationRunner(poll_interval=0).launch(input_data)
+
+    params = [json.loads(call.kwargs["environment"]["PARAMS"]) for call in mock_run.call_args_list]
+    assert len(params) == 6
+    assert sorted(p["truck.decel"] for p in params) == [3.0, 3.0, 3.5, 3.5, 4.0, 4.0]
+    assert all(p["sigma"] == 0.5 for p in params)
+
+
+@pytest.mark.runner
+def test_launch_adds_replicates_until_confidence_interval_is_tight(mocker):
+    """Each parameter set starts with two seeds; only noisy ones get more, up to max_replicates."""
+    mock_client = mocker.Mock()
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+    store = InMemoryStore()
+    store.clear()
+
+    def simulate(*args, **kwargs):
+        env = kwargs["environment"]
+        noise = 5.0 * (-1) ** env["SEED"] if env["ACCEL"] == 1.0 else 0.0
+        store.save_result(SimulationResult(
+            accel=env["ACCEL"], tau=env["TAU"], startup_delay=env["STARTUP_DELAY"], seed=env["SEED"],
+            intersection_avg_delays={"I2": 50.0 + noise, "I3": 20.0}
+        ))
+        store.complete_task(env["TASK_ID"])
+
+    mock_client.containers.run.side_effect = simulate
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0},
+        target_ci=1.0,
+        max_replicates=5
+    )
+    job = store.create_job(input_data)
+
+    SimulationRunner(store=store, poll_interval=0).launch(input_data, job)
+
+    seeds = {}
+    for call in mock_client.containers.run.call_args_list:
+        env = call.kwargs["environment"]
+        seeds.setdefault(env["ACCEL"], []).append(env["SEED"])
+    assert seeds == {1.0: [0, 1, 2, 3, 4], 2.0: [0, 1]}
+    assert job.get_worker_count() == 7
+    assert job.is_finished()
+    best, _ = job.get_best()
+    assert (best.accel, best.replicates) == (2.0, 2)
+
+
+def serve_pool_tasks(store, count):
+    """Stand-in for pool workers pulling and finishing tasks."""
+    for _ in range(count):
+        task = store.next_task()
+        if task is not None:
+            store.get_job(task["job_id"]).complete_task(task["task_id"])
+
+
+@pytest.mark.runner
+def test_launch_pool_queues_tasks_and_starts_pool(mocker):
+    """In pool mode the grid is queued and only pool_size containers are started."""
+    mock_client = mocker.Mock()
+    alive = []
+    mock_client.containers.run.side_effect = lambda *args, **kwargs: alive.append(kwargs["name"])
+    mock_client.containers.list.side_effect = lambda **kwargs: list(alive)
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+
+    store = InMemoryStore()
+    store.clear()
+    # Each poll of the launch loop lets the pool finish one task
+    mocker.patch("master.app.runner.time.sleep", side_effect=lambda _: serve_pool_tasks(store, 1))
+
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0, 2.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+
+    runner = SimulationRunner(store=store, pool_size=2)
+    runner.launch(input_data)
+
+    assert mock_client.containers.run.call_count == 2
+    assert store.get_queue_stats()["done"] == 4
+    args, kwargs = mock_client.containers.run.call_args
+    assert kwargs["environment"]["WORKER_MODE"] == "pool"
+
+
+@pytest.mark.runner
+def test_launch_pool_replaces_dead_pool_workers(mocker):
+    """Pool workers that die while tasks are outstanding are replaced until the job is done."""
+    mock_client = mocker.Mock()
+    alive = []
+    mock_client.containers.run.side_effect = lambda *args, **kwargs: alive.append(kwargs["name"])
+    mock_client.containers.list.side_effect = lambda **kwargs: list(alive)
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+
+    store = InMemoryStore()
+    store.clear()
+    polls = iter([
+        lambda: alive.clear(),  # the first workers die before taking a task
+        lambda: serve_pool_tasks(store, 4),
+    ])
+    mocker.patch("master.app.runner.time.sleep", side_effect=lambda _: next(polls)())
+
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+
+    runner = SimulationRunner(store=store, pool_size=2)
+    runner.launch(input_data)
+
+    assert mock_client.containers.run.call_count == 4
+    assert store.get_queue_stats()["done"] == 2
+
+
+@pytest.mark.runner
+def test_launch_respects_max_in_flight(mocker):
+    """No more than max_in_flight workers run at once; new ones start as others finish."""
+    mock_client = mocker.Mock()
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+    store = InMemoryStore()
+    store.clear()
+
+    running = []
+    peak = []
+
+    def start(*args, **kwargs):
+        running.append(kwargs["environment"]["TASK_ID"])
+        peak.append(store.get_queue_stats()["in_flight"])
+
+    def finish_oldest(_):
+        if running:
+            store.complete_task(running.pop(0))
+
+    mock_client.containers.run.side_effect = start
+    mocker.patch("master.app.runner.time.sleep", side_effect=finish_oldest)
+
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0, 3.0],
+        tau_values=[1.0, 2.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+
+    runner = SimulationRunner(store=store, max_in_flight=2, poll_interval=0)
+    mocker.patch.object(runner, "_has_cpu_headroom", return_value=True)
+    runner.launch(input_data)
+
+    assert mock_client.containers.run.call_count == 6
+    assert max(peak) == 2
+    assert store.is_queue_finished()
+
+
+@pytest.mark.runner
+def test_launch_batches_permutations_per_container(mocker):
+    """With a batch size, each container receives several permutations as a JSON list."""
+    mock_client = mocker.Mock()
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+    store = InMemoryStore()
+    store.clear()
+
+    def complete_batch(*args, **kwargs):
+        for task in json.loads(kwargs["environment"]["BATCH"]):
+            store.complete_task(task["task_id"])
+
+    mock_client.containers.run.side_effect = complete_batch
+
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0, 2.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+
+    runner = SimulationRunner(store=store, batch_size=2, poll_interval=0)
+    runner.launch(input_data)
+
+    assert mock_client.containers.run.call_count == 2
+    args, kwargs = mock_client.containers.run.call_args
+    assert len(json.loads(kwargs["environment"]["BATCH"])) == 2
+
+
+@pytest.mark.runner
+def test_batch_leases_cover_the_tasks_run_before_them(mocker):
+    """A batch container runs its tasks in turn, so each lease lasts until the ones before it could have finished."""
+    mocker.patch("master.app.runner.docker.from_env")
+    job = mocker.Mock()
+    job.next_task.side_effect = [{"task_id": "a"}, {"task_id": "b"}, {"task_id": "c"}]
+
+    runner = SimulationRunner(store=InMemoryStore(), batch_size=3, poll_interval=0)
+    assert len(runner._lease_tasks(job)) == 3
+    assert [call.args[0] for call in job.next_task.call_args_list] == [
+        VISIBILITY_TIMEOUT, 2 * VISIBILITY_TIMEOUT, 3 * VISIBILITY_TIMEOUT
+    ]
+
+
+@pytest.mark.runner
+def test_launch_skips_cached_combinations(mocker):
+    """Combinations found in the result cache are stored directly and never launched."""
+    mock_client = mocker.Mock()
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+    store = InMemoryStore()
+    store.clear()
+
+    cached = SimulationResult(accel=1.0, tau=1.0, startup_delay=0.0, intersection_avg_delays={"I2": 5.0, "I3": 6.0})
+    cache = mocker.Mock()
+    cache.get.side_effect = lambda accel, tau, startup_delay, params=None, seed=None: cached if (accel, tau) == (1.0, 1.0) else None
+    mock_client.containers.run.side_effect = lambda *args, **kwargs: store.complete_task(kwargs["environment"]["TASK_ID"])
+
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+
+    runner = SimulationRunner(store=store, cache=cache, poll_interval=0)
+    runner.launch(input_data)
+
+    assert mock_client.containers.run.call_count == 1
+    assert mock_client.containers.run.call_args.kwargs["environment"]["ACCEL"] == 2.0
+    assert store.get_results() == [cached.model_copy(update={"job_id": store.get_job().job_id})]
+
+
+@pytest.mark.runner
+def test_run_search_converges_with_few_simulations(mocker):
+    """The adaptive search finds the optimum of a smooth response with far fewer runs than a fine grid."""
+    mock_client = mocker.Mock()
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+    store = InMemoryStore()
+    store.clear()
+
+    def simulate(*args, **kwargs):
+        env = kwargs["environment"]
+        accel, tau = env["ACCEL"], env["TAU"]
+        store.save_result(SimulationResult(
+            accel=accel,
+            tau=tau,
+            startup_delay=env["STARTUP_DELAY"],
+            intersection_avg_delays={"I2": 50.0 + 10 * (accel - 2.3) ** 2, "I3": 20.0 + 10 * (tau - 1.2) ** 2}
+        ))
+        store.complete_task(env["TASK_ID"])
+
+    mock_client.containers.run.side_effect = simulate
+
+    search_input = SearchInput(
+        expected_delays={"I2": 50.0, "I3": 20.0},
+        accel_range=ParameterRange(min=1.0, max=4.0),
+        tau_range=ParameterRange(min=0.5, max=2.0),
+        startup_delay_range=ParameterRange(min=0.0, max=0.0),
+        budget=40
+    )
+    store.save_input_data(search_input)
+
+    runner = SimulationRunner(store=store, poll_interval=0)
+    runner.run_search(search_input)
+
+    best, score = Scoring(search_input).best_result(store.get_results())
+    assert mock_client.containers.run.call_count <= 40
+    assert abs(best.accel - 2.3) < 0.1
+    assert abs(best.tau - 1.2) < 0.1
+    assert store.get_worker_count() == len(store.get_results())
+
+
+@pytest.mark.runner
+def test_resume_launches_only_missing_combinations(mocker):
+    """A job restored after a restart only simulates combinations without a result."""
+    mock_client = mocker.Mock()
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+    store = InMemoryStore()
+    store.clear()
+    mock_client.containers.run.side_effect = lambda *args, **kwargs: store.complete_task(kwargs["environment"]["TASK_ID"])
+
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0, 3.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+    job = store.create_job(input_data)
+    job.set_worker_count(3)
+    job.save_result(SimulationResult(accel=2.0, tau=1.0, startup_delay=0.0, intersection_avg_delays={"I2": 50.0, "I3": 20.0}))
+    job.enqueue_tasks([(1.0, 1.0, 0.0)])  # orphaned by the restart
+
+    runner = SimulationRunner(store=store, poll_interval=0)
+    runner.resume(job)
+
+    launched = sorted(call.kwargs["environment"]["ACCEL"] for call in mock_client.containers.run.call_args_list)
+    assert launched == [1.0, 3.0]
+    assert job.get_queue_stats()["total"] == 2
+
+
+@pytest.mark.runner
+def test_resume_waits_for_tasks_leased_before_the_restart(tmp_path, mocker):
+    """A container launched by the previous master still reports; its task is neither dropped nor relaunched."""
+    mock_client = mocker.Mock()
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+    store = SqliteStore(str(tmp_path / "store.sqlite3"))
+    mock_client.containers.run.side_effect = lambda *args, **kwargs: store.get_job(kwargs["environment"]["JOB_ID"]).complete_task(kwargs["environment"]["TASK_ID"])
+
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+    job = store.create_job(input_data)
+    job.set_worker_count(2)
+    job.enqueue_tasks([(1.0, 1.0, 0.0)])
+    leased = job.next_task()  # by the master that was restarted
+    result = SimulationResult(
+        accel=1.0, tau=1.0, startup_delay=0.0, intersection_avg_delays={"I2": 50.0, "I3": 20.0}, task_id=leased["task_id"]
+    )
+    # The old container reports while the new master waits for the queue
+    mocker.patch("master.app.runner.time.sleep", side_effect=lambda seconds: job.save_task_result(result))
+
+    SimulationRunner(store=store, poll_interval=0).resume(job)
+
+    launched = [call.kwargs["environment"]["ACCEL"] for call in mock_client.containers.run.call_args_list]
+    assert launched == [2.0]
+    assert job.get_result_count() == 1
+    assert job.get_queue_stats() == {"total": 2, "pending": 0, "in_flight": 0, "done": 2, "failed": 0}
+
+
+@pytest.mark.runner
+def test_running_job_is_owned_until_it_finishes(tmp_path, mocker):
+    """The claim is renewed while the job runs, so another process cannot take it over, and released after."""
+    mocker.patch("master.app.runner.OWNER_TIMEOUT", 0.2)
+    mocker.patch("master.app.sqlite_store.OWNER_TIMEOUT", 0.2)
+    mock_client = mocker.Mock()
+    mocker.patch("master.app.runner.docker.from_env", return_value=mock_client)
+    path = str(tmp_path / "store.sqlite3")
+    store, other_process = SqliteStore(path), SqliteStore(path)
+    claims = []
+
+    def run_container(*args, **kwargs):
+        time.sleep(0.5)  # longer than the owner timeout
+        claims.append(other_process.claim_job(kwargs["environment"]["JOB_ID"]))
+        store.get_job(kwargs["environment"]["JOB_ID"]).complete_task(kwargs["environment"]["TASK_ID"])
+
+    mock_client.containers.run.side_effect = run_container
+    input_data = SimulationInput(
+        accel_values=[1.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+    job = store.create_job(input_data)
+    runner = SimulationRunner(store=store, poll_interval=0)
+    runner.launch(input_data, job)
+
+    assert claims == [False]
+    assert not runner.is_running(job.job_id)
+    assert other_process.claim_job(job.job_id) is True
+
+
+@pytest.mark.runner
+def test_docker_client_is_created_on_first_launch(mocker):
+    """Building a runner does not need Docker; only starting a container does."""
+    from_env = mocker.patch("master.app.runner.docker.from_env")
+    runner = SimulationRunner(store=InMemoryStore(), poll_interval=0)
+    from_env.assert_not_called()
+
+    runner.executor.start([{"task_id": "t1", "accel": 1.0, "tau": 1.0, "startup_delay": 0.0}])
+    from_env.assert_called_once()
+
+
+@pytest.mark.runner
+def test_local_executor_stores_results_in_process(mocker):
+    """The local executor runs tasks in its pool and hands results to the runner without HTTP or Docker."""
+    from_env = mocker.patch("master.app.runner.docker.from_env")
+    store = InMemoryStore()
+    store.clear()
+
+    def simulate(task):
+        return {
+            "accel": task["accel"], "tau": task["tau"], "startup_delay": task["startup_delay"],
+            "intersection_avg_delays": {"I2": 50.0 + task["accel"], "I3": 20.0},
+            "task_id": task["task_id"], "job_id": task["job_id"]
+        }
+
+    mocker.patch("master.app.runner._run_local_task", side_effect=simulate)
+    input_data = SimulationInput(
+        accel_values=[1.0, 2.0, 3.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    )
+    job = store.create_job(input_data)
+
+    runner = SimulationRunner(store=store, executor="local", max_in_flight=2, pool_size=4, poll_interval=0.01)
+    runner.executor._pool = ThreadPoolExecutor(max_workers=2)
+    runner.launch(input_data, job)
+
+    assert runner.pool_size == 0
+    assert job.get_result_count() == 3
+    assert job.get_queue_stats()["done"] == 3
+    assert job.get_best()[0].accel == 1.0
+    from_env.assert_not_called()
+
+
+CRASHING_WORKER = """
+import os
+
+
+class SimulationWorker:
+    def __init__(self, *args, **kwargs):
+        self.task = None
+
+    def apply_job(self, task):
+        self.task = task
+
+    def simulate(self):
+        if self.task["attempt"] == 1:
+            os._exit(1)  # the process dies, as when SUMO crashes inside libsumo
+        return {
+            "accel": self.task["accel"], "tau": self.task["tau"], "startup_delay": self.task["startup_delay"],
+            "intersection_avg_delays": {"I2": 1.0}, "task_id": self.task["task_id"], "job_id": self.task["job_id"]
+        }
+"""
+
+
+@pytest.mark.runner
+def test_local_executor_replaces_broken_pool_and_requeues_task(tmp_path):
+    """A dead worker process re-queues its task at once and the next task runs on a fresh pool."""
+    (tmp_path / "simulation_worker.py").write_text(CRASHING_WORKER)
+    store = InMemoryStore()
+    store.clear()
+    job = store.create_job()
+    job.enqueue_tasks([(1.0, 1.0, 0.0)])
+    results = []
+    executor = LocalProcessExecutor(1, results.append, lambda task: job.release_task(task["task_id"]), worker_dir=str(tmp_path))
+
+    def wait_for(condition):
+        deadline = time.monotonic() + 60
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert condition()
+
+    try:
+        executor.start([job.next_task()])
+        wait_for(lambda: job.get_pending_count() == 1)
+
+        retry = job.next_task()
+        assert retry["attempt"] == 2
+        executor.start([retry])
+        wait_for(lambda: results)
+    finally:
+        executor.shutdown()
+
+    assert results[0].task_id == retry["task_id"]
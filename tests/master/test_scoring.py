@@ -86,3 +86,62 @@ def test_score_exact_match_returns_zero():
     score = scorer._calculate_score(result)
 
     assert score == 0.0
+
+
+@pytest.mark.scoring
+def test_score_uses_any_intersections_and_weights(make_input, make_result):
+    """Should score every expected intersection, not just I2 and I3."""
+    scorer = Scoring(make_input(expected_delays={"A": 10.0, "B": 20.0, "C": 30.0}, weights={"C": 0.5}))
+    result = make_result(delays={"A": 11.0, "B": 22.0, "C": 34.0, "D": 99.0})
+    assert scorer.score(result) == 1.0 + 4.0 + 0.5 * 16.0
+
+
+@pytest.mark.scoring
+@pytest.mark.parametrize("metric, expected", [("squared", 29.0), ("absolute", 7.0), ("relative", 0.2)])
+def test_score_metrics(metric, expected, make_input, make_result):
+    scorer = Scoring(make_input(expected_delays={"I2": 50.0, "I3": 20.0}, metric=metric))
+    assert scorer.score(make_result(delays={"I2": 55.0, "I3": 18.0})) == pytest.approx(expected)
+
+
+@pytest.mark.scoring
+def test_vectorized_scores_match_single_scores(make_input, make_result):
+    scorer = Scoring(make_input(expected_delays={"I2": 50.0, "I3": 20.0}))
+    results = [make_result(delays={"I2": 50.0 + i, "I3": 20.0 - i / 2}) for i in range(-5, 6)]
+    scores = scorer.scores(results)
+    assert list(scores) == [scorer.score(result) for result in results]
+
+
+@pytest.mark.scoring
+def test_rank_and_top_k(make_input, make_result):
+    scorer = Scoring(make_input(expected_delays={"I2": 50.0, "I3": 20.0}))
+    results = [make_result(delays={"I2": 50.0 + d, "I3": 20.0}) for d in (3.0, -1.0, 5.0, 1.0, 0.0)]
+
+    ranked = scorer.rank(results)
+    assert [score for _, score in ranked] == [0.0, 1.0, 1.0, 9.0, 25.0]
+    assert ranked[1][0] is results[1]  # ties keep input order
+
+    top = scorer.top_k(results, 3)
+    assert [(result, score) for result, score in top] == ranked[:3]
+    assert scorer.top_k(results, 0) == []
+    assert scorer.top_k(results, 10) == ranked
+
+
+@pytest.mark.scoring
+def test_pareto_front(make_input, make_result):
+    scorer = Scoring(make_input(expected_delays={"I2": 0.0, "I3": 0.0}, metric="absolute"))
+    results = [
+        make_result(delays={"I2": 1.0, "I3": 5.0}),
+        make_result(delays={"I2": 5.0, "I3": 1.0}),
+        make_result(delays={"I2": 2.0, "I3": 2.0}),
+        make_result(delays={"I2": 3.0, "I3": 3.0}),  # dominated by (2, 2)
+        make_result(delays={"I2": 1.0, "I3": 6.0}),  # dominated by (1, 5)
+    ]
+    front = scorer.pareto_front(results)
+    assert front == [results[2], results[0], results[1]]
+
+
+@pytest.mark.scoring
+def test_best_result_requires_results(make_input):
+    scorer = Scoring(make_input(expected_delays={"I2": 50.0, "I3": 20.0}))
+    with pytest.raises(ValueError):
+        scorer.best_result([])
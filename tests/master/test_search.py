@@ -0,0 +1,66 @@
+import pytest
+from master.app.models import ParameterRange, SearchInput, SimulationResult, VTypeParameter
+from master.app.search import GridRefinementSearch
+
+
+def make_search_input(budget=30, points_per_axis=3):
+    return SearchInput(
+        expected_delays={"I2": 50.0, "I3": 20.0},
+        accel_range=ParameterRange(min=1.0, max=3.0),
+        tau_range=ParameterRange(min=1.0, max=2.0),
+        startup_delay_range=ParameterRange(min=0.0, max=0.0),
+        budget=budget,
+        points_per_axis=points_per_axis
+    )
+
+
+@pytest.mark.search
+def test_first_round_is_coarse_grid():
+    search = GridRefinementSearch(make_search_input())
+    points = search.propose()
+
+    assert len(points) == 9  # 3 accel x 3 tau x 1 fixed startup delay
+    assert {p[0] for p in points} == {1.0, 2.0, 3.0}
+    assert {p[2] for p in points} == {0.0}
+
+
+@pytest.mark.search
+def test_refinement_shrinks_around_best_and_skips_seen_points():
+    search = GridRefinementSearch(make_search_input())
+    first = set(search.propose())
+    search.observe(SimulationResult(accel=3.0, tau=1.5, startup_delay=0.0, intersection_avg_delays={}))
+
+    second = search.propose()
+    assert second
+    assert not first & set(second)
+    assert all(2.5 <= p[0] <= 3.0 and 1.25 <= p[1] <= 1.75 for p in second)
+
+
+@pytest.mark.search
+def test_budget_limits_total_points():
+    search = GridRefinementSearch(make_search_input(budget=12))
+    total = 0
+    points = search.propose()
+    while points:
+        total += len(points)
+        best = points[0]
+        search.observe(SimulationResult(accel=best[0], tau=best[1], startup_delay=best[2], intersection_avg_delays={}))
+        points = search.propose()
+
+    assert total == 12
+
+
+@pytest.mark.search
+def test_extra_parameters_add_search_dimensions():
+    search_input = make_search_input()
+    search_input.parameters = [VTypeParameter(attribute="decel", vtype="truck", range=ParameterRange(min=3.0, max=5.0))]
+    search = GridRefinementSearch(search_input)
+
+    points = search.propose()
+    assert len(points) == 27  # 3 accel x 3 tau x 1 startup delay x 3 truck decel
+    assert {p[3]["truck.decel"] for p in points} == {3.0, 4.0, 5.0}
+
+    search.observe(SimulationResult(
+        accel=2.0, tau=1.5, startup_delay=0.0, params={"truck.decel": 5.0}, intersection_avg_delays={}
+    ))
+    assert all(4.5 <= p[3]["truck.decel"] <= 5.0 for p in search.propose())
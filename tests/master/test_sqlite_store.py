@@ -0,0 +1,217 @@
+import sqlite3
+import pytest
+from master.app.models import ParameterRange, SearchInput
+from master.app.sqlite_store import SqliteStore
+from master.app.store import OWNER_TIMEOUT
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "store.sqlite3")
+
+
+def test_results_are_shared_between_store_instances(db_path, make_input, make_result):
+    """Two stores on one file stand in for two server processes."""
+    first_process = SqliteStore(db_path)
+    second_process = SqliteStore(db_path)
+
+    job = first_process.create_job(make_input())
+    job.set_worker_count(2)
+    second_process.get_job(job.job_id).save_result(make_result(1.0, 53.0))
+    assert second_process.get_job(job.job_id).save_result(make_result(2.0, 51.0)) == 1.0
+
+    seen = first_process.get_job(job.job_id)
+    assert seen.get_result_count() == 2
+    assert seen.get_worker_count() == 2
+    assert seen.get_input_data() == make_input()
+    best, score = seen.get_best()
+    assert best.accel == 2.0
+    assert score == 1.0
+
+
+def test_best_result_ignores_pruned_and_rescores_on_new_input(db_path, make_input, make_result):
+    store = SqliteStore(db_path)
+    job = store.create_job(make_input())
+    job.save_result(make_result(1.0, 50.0, pruned=True))
+    job.save_result(make_result(2.0, 55.0))
+    job.save_result(make_result(3.0, 60.0))
+
+    assert [result.accel for result, _ in job.get_top_results()] == [2.0, 3.0]
+
+    job.save_input_data(make_input(expected_delays={"I2": 60.0, "I3": 20.0}))
+    best, score = job.get_best()
+    assert best.accel == 3.0
+    assert score == 0.0
+
+
+def test_search_input_round_trips(db_path):
+    store = SqliteStore(db_path)
+    search_input = SearchInput(
+        expected_delays={"I2": 50.0, "I3": 20.0},
+        accel_range=ParameterRange(min=1.0, max=3.0),
+        tau_range=ParameterRange(min=1.0, max=2.0),
+        startup_delay_range=ParameterRange(min=0.0, max=1.0),
+        budget=12
+    )
+    job = store.create_job(search_input)
+    assert SqliteStore(db_path).get_job(job.job_id).get_input_data() == search_input
+
+
+def test_task_leases_are_shared_and_expire(db_path):
+    clock = FakeClock()
+    first_process = SqliteStore(db_path, clock=clock)
+    second_process = SqliteStore(db_path, clock=clock)
+
+    job = first_process.create_job()
+    job.enqueue_tasks([(1.0, 1.0, 0.0), (2.0, 1.0, 0.0)])
+
+    task = second_process.next_task()
+    assert task["accel"] == 1.0
+    assert task["job_id"] == job.job_id
+    assert first_process.next_task()["accel"] == 2.0
+    assert first_process.next_task() is None
+
+    assert job.complete_task(task["task_id"]) is True
+    assert second_process.get_job(job.job_id).complete_task(task["task_id"]) is False
+
+    clock.now += 10_000
+    assert job.get_queue_stats() == {"total": 2, "pending": 1, "in_flight": 0, "done": 1, "failed": 0}
+    assert first_process.next_task()["attempt"] == 2
+
+
+def test_queue_stats_do_not_wait_for_the_write_lock(db_path):
+    job = SqliteStore(db_path).create_job()
+    job.enqueue_tasks([(1.0, 1.0, 0.0)])
+    job.next_task()
+
+    writer = sqlite3.connect(db_path, timeout=0, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        assert job.get_queue_stats()["in_flight"] == 1
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+
+
+def test_released_task_is_requeued_at_once(db_path):
+    job = SqliteStore(db_path).create_job()
+    job.enqueue_tasks([(1.0, 1.0, 0.0)])
+
+    task = job.next_task()
+    assert job.release_task(task["task_id"]) is True
+    assert job.release_task(task["task_id"]) is False
+    assert job.next_task()["attempt"] == 2
+
+
+def test_tasks_keep_extra_params(db_path):
+    job = SqliteStore(db_path).create_job()
+    job.enqueue_tasks([(1.0, 1.0, 0.0, {"sigma": 0.5, "truck.decel": 3.5}), (2.0, 1.0, 0.0)])
+
+    assert job.next_task()["params"] == {"sigma": 0.5, "truck.decel": 3.5}
+    assert "params" not in job.next_task()
+
+
+def test_replicates_are_separate_tasks_ranked_by_their_mean(db_path, make_input, make_result):
+    job = SqliteStore(db_path).create_job(make_input().model_copy(update={"replicates": 2}))
+    job.enqueue_tasks([(1.0, 1.0, 0.0, {}, 0), (1.0, 1.0, 0.0, {}, 1)])
+    assert [job.next_task()["seed"], job.next_task()["seed"]] == [0, 1]
+
+    for accel, seed, i2 in [(1.0, 0, 50.0), (1.0, 1, 60.0), (2.0, 0, 54.0), (2.0, 1, 54.0)]:
+        job.save_result(make_result(accel, i2).model_copy(update={"seed": seed}))
+
+    (best, score), (other, _) = job.get_top_results()
+    assert (best.accel, best.replicates, score) == (2.0, 2, pytest.approx(16.0))
+    assert other.intersection_avg_delays["I2"] == 55.0
+    assert job.get_best()[0].accel == 2.0
+
+    job.save_result(make_result(2.0, 99.0, pruned=True).model_copy(update={"seed": 2}))
+    assert [result.accel for result, _ in job.get_top_results()] == [1.0]
+
+
+def test_ensemble_ranking_reads_stored_aggregates(db_path, make_input, make_result, mocker):
+    job = SqliteStore(db_path).create_job(make_input(replicates=2))
+    for accel, seed, i2 in [(1.0, 0, 50.0), (1.0, 1, 60.0), (2.0, 0, 54.0), (2.0, 1, 54.0)]:
+        job.save_result(make_result(accel, i2, seed=seed))
+
+    # Ranking must not re-aggregate the seeds on every call
+    mocker.patch("master.app.sqlite_store.aggregate_group", side_effect=AssertionError)
+    best, score = SqliteStore(db_path).get_job(job.job_id).get_best()
+    assert (best.accel, best.replicates, score) == (2.0, 2, pytest.approx(16.0))
+
+
+def test_results_without_parameter_key_are_aggregated_on_open(db_path, make_input, make_result):
+    job = SqliteStore(db_path).create_job(make_input(replicates=2))
+    for accel, seed, i2 in [(1.0, 0, 50.0), (1.0, 1, 60.0), (2.0, 0, 54.0), (2.0, 1, 54.0)]:
+        job.save_result(make_result(accel, i2, seed=seed))
+    # Schema of databases written before results carried their parameter set
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP INDEX results_by_parameter_set")
+    conn.execute("ALTER TABLE results DROP COLUMN parameter_key")
+    conn.execute("DELETE FROM aggregates")
+    conn.commit()
+    conn.close()
+
+    reopened = SqliteStore(db_path).get_job(job.job_id)
+    assert [(result.accel, score) for result, score in reopened.get_top_results()] == [
+        (2.0, pytest.approx(16.0)), (1.0, pytest.approx(25.0))
+    ]
+
+
+def test_jobs_are_partitioned_and_cleared(db_path, make_input, make_result):
+    store = SqliteStore(db_path)
+    first = store.create_job(make_input())
+    second = store.create_job(make_input())
+    first.save_result(make_result(1.0, 50.0))
+
+    assert second.get_results() == []
+    assert store.get_job().job_id == second.job_id
+    assert [job.job_id for job in store.get_jobs()] == [first.job_id, second.job_id]
+
+    store.clear()
+    assert store.get_job() is None
+    assert store.get_job(first.job_id) is None
+
+
+def test_a_job_is_resumed_only_once_its_owner_stops_renewing(db_path, make_input):
+    clock = FakeClock()
+    first_process = SqliteStore(db_path, clock=clock)
+    second_process = SqliteStore(db_path, clock=clock)
+    job = first_process.create_job(make_input())
+    assert second_process.claim_job(job.job_id) is False  # the creating process owns it
+
+    clock.now += OWNER_TIMEOUT - 1
+    assert first_process.renew_claim(job.job_id) is True
+    clock.now += OWNER_TIMEOUT - 1
+    assert second_process.claim_job(job.job_id) is False
+
+    clock.now += OWNER_TIMEOUT  # the first process stopped renewing
+    assert second_process.claim_job(job.job_id) is True
+    assert first_process.renew_claim(job.job_id) is False
+    assert first_process.claim_job(job.job_id) is False
+
+    second_process.release_job(job.job_id)
+    assert first_process.claim_job(job.job_id) is True
+
+
+def test_task_is_not_completed_when_its_result_cannot_be_saved(db_path, make_result, mocker):
+    job = SqliteStore(db_path).create_job()
+    job.enqueue_tasks([(1.0, 1.0, 0.0)])
+    result = make_result(1.0, 40.0, task_id=job.next_task()["task_id"])
+
+    mocker.patch.object(job, "_insert_result", side_effect=sqlite3.OperationalError("database is locked"))
+    with pytest.raises(sqlite3.OperationalError):
+        job.save_task_result(result)
+    mocker.stopall()
+    assert job.get_queue_stats()["in_flight"] == 1
+
+    assert job.save_task_result(result)[0] is True
+    assert job.save_task_result(result) == (False, None)
+    assert job.get_result_count() == 1
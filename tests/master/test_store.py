@@ -91,3 +91,183 @@ def test_clear_store():
     assert store.get_input_data() is None
     assert store.get_results() == []
 
+
+def test_best_result_tracked_on_save(make_result):
+    store = InMemoryStore()
+    store.clear()
+    store.save_input_data(SimulationInput(
+        accel_values=[1.0, 2.0, 3.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 40.0, "I3": 10.0}
+    ))
+
+    assert store.get_best() is None
+    store.save_result(make_result(1.0, 50.0, 10.0))
+    store.save_result(make_result(2.0, 41.0, 10.0))
+    store.save_result(make_result(3.0, 45.0, 10.0))
+    store.save_result(make_result(4.0, 40.0, 10.0, pruned=True))
+
+    best, score = store.get_best()
+    assert best.accel == 2.0
+    assert score == pytest.approx(1.0)
+    assert [result.accel for result, _ in store.get_top_results(2)] == [2.0, 3.0]
+    assert store.get_result_count() == 4
+
+
+def test_best_result_rescored_with_new_input(make_result):
+    store = InMemoryStore()
+    store.clear()
+    store.save_result(make_result(1.0, 40.0, 10.0))
+    store.save_result(make_result(2.0, 50.0, 20.0))
+    assert store.get_best() is None
+
+    store.save_input_data(SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 50.0, "I3": 20.0}
+    ))
+    best, score = store.get_best()
+    assert best.accel == 2.0
+    assert score == 0.0
+
+
+def test_ensemble_jobs_rank_parameter_sets_by_their_mean(make_result):
+    store = InMemoryStore()
+    store.clear()
+    store.save_input_data(SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 40.0, "I3": 10.0},
+        replicates=2
+    ))
+
+    # accel 1.0 has the single closest run, but accel 2.0 is closer on average
+    store.save_result(make_result(1.0, 40.0, 10.0).model_copy(update={"seed": 0}))
+    store.save_result(make_result(1.0, 50.0, 10.0).model_copy(update={"seed": 1}))
+    store.save_result(make_result(2.0, 42.0, 10.0).model_copy(update={"seed": 0}))
+    store.save_result(make_result(2.0, 42.0, 10.0).model_copy(update={"seed": 1}))
+
+    best, score = store.get_best()
+    assert (best.accel, best.replicates) == (2.0, 2)
+    assert score == pytest.approx(4.0)
+    top = store.get_top_results()
+    assert [(result.accel, score) for result, score in top] == [(2.0, pytest.approx(4.0)), (1.0, pytest.approx(25.0))]
+    assert top[1][0].delay_std["I2"] == pytest.approx(50 ** 0.5)
+
+
+def test_ensemble_sets_with_a_pruned_seed_are_not_ranked(make_result):
+    store = InMemoryStore()
+    store.clear()
+    store.save_input_data(SimulationInput(
+        accel_values=[1.0, 2.0],
+        tau_values=[1.0],
+        startup_delay_values=[0.0],
+        expected_delays={"I2": 40.0, "I3": 10.0},
+        replicates=2
+    ))
+
+    # accel 1.0 would win on its one complete seed, but its other seed was pruned
+    store.save_result(make_result(1.0, 40.0, 10.0).model_copy(update={"seed": 0}))
+    store.save_result(make_result(1.0, 90.0, 10.0, pruned=True).model_copy(update={"seed": 1}))
+    store.save_result(make_result(2.0, 42.0, 10.0).model_copy(update={"seed": 0}))
+    store.save_result(make_result(2.0, 42.0, 10.0).model_copy(update={"seed": 1}))
+
+    assert [result.accel for result, _ in store.get_top_results()] == [2.0]
+    store.save_input_data(store.get_input_data().model_copy(update={"expected_delays": {"I2": 41.0, "I3": 10.0}}))
+    assert [result.accel for result, _ in store.get_top_results()] == [2.0]
+
+
+def test_jobs_are_partitioned(make_result):
+    store = InMemoryStore()
+    store.clear()
+    first = store.create_job()
+    second = store.create_job()
+
+    first.save_result(make_result(1.0, 40.0, 10.0))
+    first.set_worker_count(1)
+    second.set_worker_count(2)
+
+    assert first.get_result_count() == 1
+    assert second.get_results() == []
+    assert store.get_job() is second
+    assert store.get_job(first.job_id) is first
+    assert store.get_worker_count() == 2
+
+
+def test_next_task_shares_workers_between_jobs():
+    store = InMemoryStore()
+    store.clear()
+    first = store.create_job()
+    second = store.create_job()
+    first.enqueue_tasks([(1.0, 1.0, 0.0), (2.0, 1.0, 0.0)])
+    second.enqueue_tasks([(3.0, 1.0, 0.0)])
+
+    leased = [store.next_task()["job_id"] for _ in range(3)]
+    assert sorted(leased[:2]) == sorted([first.job_id, second.job_id])
+    assert store.next_task() is None
+    assert store.get_in_flight_count() == 3
+
+
+def test_finished_jobs_are_evicted(monkeypatch, make_result):
+    monkeypatch.setattr("master.app.store.MAX_JOBS", 2)
+    store = InMemoryStore()
+    store.clear()
+    finished = store.create_job()
+    finished.set_worker_count(1)
+    finished.save_result(make_result(1.0, 40.0, 10.0))
+    running = store.create_job()
+    running.set_worker_count(1)
+    store.create_job()
+
+    assert store.get_job(finished.job_id) is None
+    assert store.get_job(running.job_id) is running
+
+
+def test_new_job_is_never_evicted(monkeypatch):
+    monkeypatch.setattr("master.app.store.MAX_JOBS", 2)
+    store = InMemoryStore()
+    store.clear()
+    for _ in range(2):
+        store.create_job().set_worker_count(4)
+
+    new = store.create_job()
+    assert store.get_job(new.job_id) is new
+    assert len(store.get_jobs()) == 3
+
+
+def test_task_stays_open_when_its_result_cannot_be_saved(make_result, mocker):
+    store = InMemoryStore()
+    store.clear()
+    job = store.create_job()
+    job.enqueue_tasks([(1.0, 1.0, 0.0)])
+    result = make_result(1.0, 40.0, 10.0, task_id=job.next_task()["task_id"])
+
+    mocker.patch.object(job, "save_result", side_effect=OSError("disk full"))
+    with pytest.raises(OSError):
+        job.save_task_result(result)
+    mocker.stopall()
+    assert job.get_queue_stats()["in_flight"] == 1
+
+    # The worker's retry is stored, a second delivery is not
+    assert job.save_task_result(result)[0] is True
+    assert job.save_task_result(result) == (False, None)
+    assert job.get_result_count() == 1
+
+
+def test_result_of_a_task_from_before_a_restart_is_taken_once(make_result):
+    """In-memory tasks do not survive a restart, so a late result's task ID is unknown to the new queue."""
+    store = InMemoryStore()
+    store.clear()
+    job = store.create_job()
+    job.enqueue_tasks([(1.0, 1.0, 0.0), (2.0, 1.0, 0.0)])  # queued again by the resumed job
+    result = make_result(1.0, 40.0, 10.0, task_id="from-before-the-restart")
+
+    assert job.save_task_result(result)[0] is True
+    assert job.save_task_result(result) == (False, None)
+    assert job.get_result_count() == 1
+    # The task queued since for the same combination is done, so it is not simulated twice
+    stats = job.get_queue_stats()
+    assert (stats["done"], stats["pending"]) == (1, 1)
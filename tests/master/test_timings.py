@@ -0,0 +1,28 @@
+import pytest
+from master.app.models import RunTimings, SimulationResult
+from master.app.timings import summarize_timings
+
+
+def test_summarize_timings_per_phase(make_result):
+    results = [
+        make_result(1.0, timings=RunTimings(spans={"sumo_step": 2.0, "vtypes": 0.01}, counts={"traci_calls": 6000})),
+        make_result(2.0, timings=RunTimings(
+            spans={"sumo_step": 4.0}, counts={"traci_calls": 6200}, samples=[{"step": 100, "seconds": 0.002, "traci_calls": 4}]
+        )),
+        SimulationResult(accel=3.0, tau=1.0, startup_delay=0.0, intersection_avg_delays={"I2": 40.0}),
+    ]
+
+    summary = summarize_timings(results)
+
+    assert summary["runs"] == 2
+    assert summary["spans"]["sumo_step"]["mean"] == 3.0
+    assert summary["spans"]["sumo_step"]["max"] == 4.0
+    assert summary["spans"]["sumo_step"]["p95"] == pytest.approx(3.9)
+    assert summary["spans"]["vtypes"]["count"] == 1
+    assert summary["counts"]["traci_calls"] == {"total": 12200, "mean": 6100.0}
+    assert summary["step_samples"]["traci_calls"]["mean"] == 4.0
+    assert "step" not in summary["step_samples"]
+
+
+def test_summarize_timings_without_timings():
+    assert summarize_timings([]) == {"runs": 0, "spans": {}, "counts": {}, "step_samples": {}}
@@ -0,0 +1,35 @@
+import pytest
+from worker.delay_stats import DelayAccumulator, percentile
+
+
+def test_accumulator_counts_steps_and_vehicles_per_intersection():
+    accumulator = DelayAccumulator(("I2", "I3"))
+    assert not accumulator
+
+    for _ in range(3):
+        accumulator.add(0, "v1")
+    accumulator.add(0, "v2")
+    accumulator.add(1, "v2")
+
+    assert accumulator
+    assert accumulator.totals() == {"I2": 4, "I3": 1}
+    assert accumulator.stopped_counts() == {"I2": 2, "I3": 1}
+    assert accumulator.averages() == {"I2": 2.0, "I3": 1.0}
+    assert accumulator.stopped_times("I2") == [1, 3]
+
+
+def test_percentiles_of_per_vehicle_stopped_time():
+    accumulator = DelayAccumulator(("I2", "I3"))
+    for vehicle, steps in enumerate([10, 20, 30, 40, 50]):
+        for _ in range(steps):
+            accumulator.add(0, f"v{vehicle}")
+
+    percentiles = accumulator.percentiles((50, 90))
+    assert percentiles["I2"] == {"p50": 30.0, "p90": pytest.approx(46.0)}
+    assert percentiles["I3"] == {"p50": 0.0, "p90": 0.0}
+
+
+def test_percentile_interpolates_between_values():
+    assert percentile([], 50) == 0.0
+    assert percentile([4], 95) == 4.0
+    assert percentile([1, 2], 25) == 1.25
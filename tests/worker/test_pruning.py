@@ -0,0 +1,55 @@
+from unittest.mock import patch
+from worker.pruning import PruningRule, partial_error
+
+
+def make_rule():
+    return PruningRule("http://localhost:8000/prune_bound", factor=2.0, min_step=500)
+
+
+@patch("worker.pruning.requests.get")
+def test_no_pruning_before_min_step(mock_get):
+    rule = make_rule()
+    assert rule(400, {"I2": 500.0, "I3": 500.0}) is False
+    mock_get.assert_not_called()
+
+
+@patch("worker.pruning.requests.get")
+def test_prunes_dominated_candidate(mock_get):
+    mock_get.return_value.json.return_value = {"expected_delays": {"I2": 50.0, "I3": 20.0}, "best_score": 10.0}
+    rule = make_rule()
+
+    assert rule(600, {"I2": 53.0, "I3": 21.0}) is False  # 9 + 1 = 10 <= 2 x 10
+    assert rule.pruned_at is None
+    assert rule(700, {"I2": 60.0, "I3": 20.0}) is True  # 100 > 2 x 10
+    assert rule.pruned_at == 700
+
+    rule.reset()
+    assert rule.pruned_at is None
+
+
+@patch("worker.pruning.requests.get")
+def test_no_pruning_without_finished_results(mock_get):
+    mock_get.return_value.json.return_value = {"expected_delays": {"I2": 50.0}, "best_score": None}
+    assert make_rule()(1500, {"I2": 1000.0}) is False
+
+
+@patch("worker.pruning.requests.get", side_effect=Exception("down"))
+def test_no_pruning_when_master_unreachable(mock_get):
+    assert make_rule()(1500, {"I2": 1000.0}) is False
+
+
+def test_partial_error_matches_metric_and_weights():
+    expected = {"I2": 50.0, "I3": 20.0}
+    delays = {"I2": 55.0, "I3": 18.0}
+    assert partial_error(delays, expected) == 29.0
+    assert partial_error(delays, expected, {"I3": 2.0}, "absolute") == 9.0
+    assert partial_error(delays, expected, None, "relative") == 0.2
+
+
+@patch("worker.pruning.requests.get")
+def test_bound_is_fetched_for_the_current_job(mock_get):
+    mock_get.return_value.json.return_value = {"expected_delays": {"I2": 50.0}, "best_score": None}
+    rule = make_rule()
+    rule.reset(job_id="j1")
+    rule(600, {"I2": 50.0})
+    assert mock_get.call_args.kwargs["params"] == {"job_id": "j1"}
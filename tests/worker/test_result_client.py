@@ -0,0 +1,43 @@
+import gzip
+import json
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+from worker.result_client import ResultClient, encode_results
+
+
+@pytest.fixture
+def client():
+    return ResultClient("http://localhost:8000/report_result", batch_size=2, max_retries=2, backoff=0)
+
+
+def test_submit_buffers_until_batch_is_full(client):
+    with patch.object(client.session, "post", return_value=MagicMock(status_code=200)) as mock_post:
+        client.submit({"accel": 1.0})
+        mock_post.assert_not_called()
+        client.submit({"accel": 2.0})
+
+    assert mock_post.call_args.args[0] == "http://localhost:8000/report_results"
+    assert client.pending_count() == 0
+
+
+def test_flush_retries_transient_failures(client):
+    responses = [requests.ConnectionError("refused"), MagicMock(status_code=503), MagicMock(status_code=200)]
+    with patch.object(client.session, "post", side_effect=responses) as mock_post:
+        assert client.send([{"accel": 1.0}, {"accel": 2.0}]) is True
+    assert mock_post.call_count == 3
+
+
+def test_failed_batch_stays_buffered(client):
+    with patch.object(client.session, "post", side_effect=requests.ConnectionError("refused")) as mock_post:
+        assert client.send([{"accel": 1.0}, {"accel": 2.0}]) is False
+    assert mock_post.call_count == 3
+    assert client.pending_count() == 2
+
+
+def test_large_batches_are_gzipped():
+    results = [{"accel": float(i), "intersection_avg_delays": {"I2": 40.0}} for i in range(100)]
+    body, headers = encode_results(results)
+    assert headers["Content-Encoding"] == "gzip"
+    lines = gzip.decompress(body).decode().splitlines()
+    assert [json.loads(line) for line in lines] == results
@@ -0,0 +1,151 @@
+import sys
+import pytest
+from unittest.mock import patch
+import traci.constants as tc
+import xml.etree.ElementTree as ET
+from worker.delay_stats import DelayAccumulator
+from worker.timing import RunTimer
+from worker.run_simulation import (
+    INTERSECTIONS_OF_INTEREST, SumoSession, compile_scenario, load_backend, load_edge_intersections,
+    load_lane_intersections, parse_fcd_delays, run_simulation, write_trips
+)
+
+
+@patch("worker.run_simulation.SUMO_BACKEND", "traci")
+@patch("worker.run_simulation.traci")
+def test_session_starts_once_then_reloads(mock_traci):
+    session = SumoSession()
+    session.load(["-c", "config.xml"])
+    session.load(["-c", "config.xml"])
+
+    mock_traci.start.assert_called_once()
+    mock_traci.load.assert_called_once_with(["-c", "config.xml"])
+
+    session.close()
+    session.close()
+    mock_traci.close.assert_called_once()
+
+
+@patch("worker.run_simulation.SIMULATION_DURATION", 2)
+@patch("worker.run_simulation.compile_scenario", return_value="scenario.trips.xml")
+@patch("worker.run_simulation.SUMO_BACKEND", "traci")
+@patch("worker.run_simulation.traci")
+def test_run_simulation_reads_subscription_results(mock_traci, mock_compile):
+    mock_traci.simulation.getSubscriptionResults.return_value = {tc.VAR_DEPARTED_VEHICLES_IDS: ("v1",)}
+    mock_traci.vehicle.getAllSubscriptionResults.return_value = {
+        "v1": {tc.VAR_SPEED: 0.0, tc.VAR_ROAD_ID: "I2_N_zip_in"},
+        "v2": {tc.VAR_SPEED: 0.1, tc.VAR_ROAD_ID: ":I3_0"},
+        "v3": {tc.VAR_SPEED: 10.0, tc.VAR_ROAD_ID: "I3_E_out"},
+    }
+
+    accumulator = DelayAccumulator(INTERSECTIONS_OF_INTEREST)
+    timer = RunTimer(sample_interval=2)
+    delays = run_simulation(accumulator=accumulator, timer=timer)
+
+    assert delays == {"I2": 2.0, "I3": 2.0}
+    assert accumulator.percentiles()["I3"]["p90"] == 2.0
+    assert mock_traci.vehicle.subscribe.call_count == 2
+    assert timer.counts == {"steps": 2, "traci_calls": 5, "vehicles_departed": 2}
+    assert {"sumo_start", "sumo_step", "subscribe", "collect"} <= set(timer.spans)
+    assert [(sample["step"], sample["traci_calls"], sample["vehicles"]) for sample in timer.samples] == [(2, 2, 3)]
+    mock_traci.vehicle.getSpeed.assert_not_called()
+
+
+def test_parse_fcd_delays_maps_lanes_to_intersections(tmp_path):
+    fcd = tmp_path / "fcd.xml"
+    fcd.write_text("""<fcd-export>
+    <timestep time="0.00">
+        <vehicle id="v1" speed="0.0" lane="lane_a"/>
+        <vehicle id="v2" speed="0.29" lane="lane_b"/>
+    </timestep>
+    <timestep time="1.00">
+        <vehicle id="v1" speed="0.1" lane="lane_a"/>
+        <vehicle id="v2" speed="5.0" lane="lane_b"/>
+        <vehicle id="v3" speed="0.0" lane="lane_c"/>
+    </timestep>
+</fcd-export>
+""")
+    lane_edges = {"lane_a": "I2_E_in", "lane_b": ":I3_4", "lane_c": "I1_out"}
+
+    load_lane_intersections.cache_clear()
+    try:
+        with patch("worker.run_simulation.load_lane_edges", return_value=lane_edges):
+            accumulator = parse_fcd_delays(str(fcd))
+    finally:
+        load_lane_intersections.cache_clear()
+
+    assert accumulator.totals() == {"I2": 2, "I3": 1}
+    assert accumulator.stopped_counts() == {"I2": 1, "I3": 1}
+
+
+def test_edge_table_covers_intersection_edges_of_the_network():
+    edges = load_edge_intersections()
+    assert edges["I2_N_zip_in"] == 0
+    assert edges[":I3_0"] == 1
+    assert "I1_out" not in edges
+
+
+def test_write_trips_orders_vehicles_by_step(tmp_path):
+    schedule = {"10": [["S2.N2", 5, "bus"]], "2": [["N3.E3", 5, "passenger"], ["N3.E3", 5, "truck"]]}
+    endpoints = {"S2.N2": ("I2_S_zip_in", "I2_N_out"), "N3.E3": ("I3_N_zip_in", "I3_E_out")}
+    trips_path = tmp_path / "trips.xml"
+
+    with patch("worker.run_simulation.load_schedule", return_value=schedule), \
+         patch("worker.run_simulation.load_route_endpoints", return_value=endpoints):
+        write_trips(str(trips_path))
+
+    trips = ET.parse(trips_path).getroot().findall("trip")
+    assert [t.get("id") for t in trips] == ["N3.E3_0", "N3.E3_1", "S2.N2_2"]
+    assert [t.get("depart") for t in trips] == ["2", "2", "10"]
+    assert trips[2].get("from") == "I2_S_zip_in"
+    assert trips[2].get("to") == "I2_N_out"
+
+
+def test_compile_scenario_reuses_cached_file(tmp_path):
+    compile_scenario.cache_clear()
+    try:
+        with patch("worker.run_simulation.SCENARIO_CACHE_DIR", str(tmp_path)), \
+             patch("worker.run_simulation.write_trips", side_effect=lambda path: open(path, "w").close()) as mock_write:
+            first = compile_scenario()
+            compile_scenario.cache_clear()
+            second = compile_scenario()
+
+        assert first == second
+        assert first.startswith(str(tmp_path))
+        mock_write.assert_called_once()
+    finally:
+        compile_scenario.cache_clear()
+
+
+@patch("worker.run_simulation.CHECKPOINT_INTERVAL", 2)
+@patch("worker.run_simulation.SIMULATION_DURATION", 10)
+@patch("worker.run_simulation.compile_scenario", return_value="scenario.trips.xml")
+@patch("worker.run_simulation.SUMO_BACKEND", "traci")
+@patch("worker.run_simulation.traci")
+def test_run_simulation_stops_when_checkpoint_says_so(mock_traci, mock_compile):
+    mock_traci.simulation.getSubscriptionResults.return_value = {tc.VAR_DEPARTED_VEHICLES_IDS: ()}
+    mock_traci.vehicle.getAllSubscriptionResults.return_value = {
+        "v1": {tc.VAR_SPEED: 0.0, tc.VAR_ROAD_ID: "I2_N_zip_in"},
+    }
+    checkpoints = []
+
+    def should_stop(step, partial_delays):
+        checkpoints.append((step, partial_delays["I2"]))
+        return step >= 4
+
+    delays = run_simulation(should_stop=should_stop)
+
+    assert checkpoints == [(2, 2.0), (4, 4.0)]
+    assert mock_traci.simulationStep.call_count == 4
+    assert delays["I2"] == 4.0
+
+
+@patch("worker.run_simulation.traci")
+def test_load_backend_falls_back_to_traci(mock_traci):
+    with patch.dict(sys.modules, {"libsumo": None}):
+        assert load_backend("auto") is mock_traci
+        with pytest.raises(ImportError):
+            load_backend("libsumo")
+    assert load_backend("traci") is mock_traci
+    with pytest.raises(ValueError):
+        load_backend("gui")
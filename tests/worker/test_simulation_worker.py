@@ -1,3 +1,5 @@
+import os
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 from worker.simulation_worker import SimulationWorker
@@ -31,13 +33,61 @@ def test_ping_master_exception(mock_get, worker):
     assert worker.ping_master() is False
 
 
-@patch("worker.simulation_worker.VTypesConfigUpdater")
-def test_update_vtypes(mock_updater_class, worker):
-    mock_updater = MagicMock()
-    mock_updater_class.return_value = mock_updater
+@patch("worker.simulation_worker.load_vtypes_template")
+def test_update_vtypes(mock_load_template, worker):
+    mock_template = MagicMock()
+    mock_template.write.return_value = "/tmp/vtypes.run.xml"
+    mock_load_template.return_value = mock_template
 
-    worker.update_vtypes()
-    mock_updater.update.assert_called_once_with(2.0, 1.0, 0.5)
+    assert worker.update_vtypes() == "/tmp/vtypes.run.xml"
+    mock_load_template.assert_called_once_with("dummy.xml")
+    mock_template.write.assert_called_once_with(2.0, 1.0, 0.5, {})
+
+
+def test_simulate_uses_and_removes_private_vtypes_file(worker, tmp_path):
+    template = tmp_path / "vtypes.xml"
+    template.write_text('<routes><vType id="car" accel="1.0" tau="1.0" startupDelay="0"/></routes>')
+    worker.vtypes_path = str(template)
+    seen = []
+
+    def run(session, should_stop=None, vtypes_path=None, seed=None, accumulator=None, timer=None):
+        seen.append(vtypes_path)
+        assert 'accel="2.0"' in open(vtypes_path).read()
+        return {"I2": 1.0}
+
+    with patch("worker.simulation_worker.run_simulation", side_effect=run):
+        worker.simulate()
+
+    assert seen[0] != str(template)
+    assert not os.path.exists(seen[0])
+    assert 'accel="1.0"' in template.read_text()
+
+
+def test_simulate_passes_task_seed_to_sumo(worker, tmp_path):
+    template = tmp_path / "vtypes.xml"
+    template.write_text('<routes><vType id="car" accel="1.0" tau="1.0" startupDelay="0"/></routes>')
+    worker.vtypes_path = str(template)
+    worker.apply_job({"task_id": "t1", "accel": 2.0, "tau": 1.0, "startup_delay": 0.0, "seed": 3})
+
+    with patch("worker.simulation_worker.run_simulation", return_value={"I2": 1.0}) as mock_run:
+        result = worker.simulate()
+
+    assert mock_run.call_args.kwargs["seed"] == 3
+    assert result["seed"] == 3
+
+
+def test_results_carry_phase_timings(tmp_path):
+    template = tmp_path / "vtypes.xml"
+    template.write_text('<routes><vType id="car" accel="1.0" tau="1.0" startupDelay="0"/></routes>')
+    worker = SimulationWorker(2.0, 1.0, 0.0, vtypes_path=str(template), launched_at=1.0)
+
+    with patch("worker.simulation_worker.run_simulation", return_value={"I2": 1.0}):
+        first = worker.simulate()
+        second = worker.simulate()
+
+    assert {"container_start", "vtypes", "simulation"} <= set(first["timings"]["spans"])
+    # Only the first task paid for starting the container
+    assert "container_start" not in second["timings"]["spans"]
 
 
 @patch("worker.simulation_worker.run_simulation", return_value={"I1": 12.3})
@@ -46,23 +96,128 @@ def test_run_simulation(mock_run, worker):
     assert result == {"I1": 12.3}
 
 
-@patch("worker.simulation_worker.requests.post")
-def test_post_results(mock_post, worker):
-    mock_post.return_value.status_code = 200
-    worker.post_results({"data": 123})
-    mock_post.assert_called_once()
+def test_post_results(worker):
+    with patch.object(worker.results.session, "post") as mock_post:
+        mock_post.return_value.status_code = 200
+        worker.post_results({"data": 123})
+        mock_post.assert_called_once()
+        assert mock_post.call_args.args[0] == "http://localhost:8000/report_result"
 
 
 @patch("worker.simulation_worker.run_simulation", return_value={"I2": 33.3})
-@patch("worker.simulation_worker.VTypesConfigUpdater")
-@patch("worker.simulation_worker.requests.post")
+@patch("worker.simulation_worker.load_vtypes_template")
 @patch("worker.simulation_worker.requests.get", return_value=MagicMock(status_code=200))
-def test_execute(mock_get, mock_post, mock_updater_class, mock_run, worker):
-    mock_updater = MagicMock()
-    mock_updater_class.return_value = mock_updater
+def test_execute(mock_get, mock_load_template, mock_run, worker):
+    mock_load_template.return_value.write.return_value = "/tmp/vtypes.run.xml"
 
-    result = worker.execute()
+    with patch.object(worker.results.session, "post", return_value=MagicMock(status_code=200)) as mock_post:
+        result = worker.execute()
+    mock_post.assert_called_once()
     assert result["accel"] == 2.0
     assert result["tau"] == 1.0
     assert result["startup_delay"] == 0.5
     assert result["intersection_avg_delays"] == {"I2": 33.3}
+
+
+@patch("worker.simulation_worker.requests.get")
+def test_fetch_job_returns_task(mock_get, worker):
+    mock_get.return_value.json.return_value = {"task_id": "abc", "accel": 1.0, "tau": 1.0, "startup_delay": 0.0}
+    job = worker.fetch_job()
+    assert job["task_id"] == "abc"
+    mock_get.assert_called_once_with("http://localhost:8000/next_job", timeout=5)
+
+
+@patch("worker.simulation_worker.requests.get")
+def test_fetch_job_no_jobs(mock_get, worker):
+    mock_get.return_value.json.return_value = {"status": "no_jobs"}
+    assert worker.fetch_job() is None
+
+
+def test_simulate_reports_task_params(worker):
+    worker.apply_job({"task_id": "t1", "accel": 1.0, "tau": 1.0, "startup_delay": 0.0, "params": {"truck.decel": 3.5}})
+    with patch.object(worker, "update_vtypes"), \
+         patch.object(worker, "run_simulation", return_value={"I2": 1.0}):
+        result = worker.simulate()
+    assert result["params"] == {"truck.decel": 3.5}
+
+    worker.apply_job({"task_id": "t2", "accel": 1.0, "tau": 1.0, "startup_delay": 0.0})
+    with patch.object(worker, "update_vtypes"), \
+         patch.object(worker, "run_simulation", return_value={"I2": 1.0}):
+        assert "params" not in worker.simulate()
+
+
+def test_serve_runs_jobs_until_idle(worker):
+    jobs = [
+        {"task_id": "t1", "job_id": "j1", "accel": 1.0, "tau": 1.0, "startup_delay": 0.0},
+        {"task_id": "t2", "accel": 3.0, "tau": 2.0, "startup_delay": 1.0},
+    ]
+    with patch.object(worker, "ping_master") as mock_ping, \
+         patch.object(worker, "fetch_job", side_effect=jobs + [None]), \
+         patch.object(worker, "update_vtypes"), \
+         patch.object(worker, "run_simulation", return_value={"I2": 1.0, "I3": 2.0}), \
+         patch.object(worker, "post_results") as mock_post:
+
+        completed = worker.serve(idle_timeout=0, poll_interval=0)
+
+        assert completed == 2
+        mock_ping.assert_called_once()
+        posted = mock_post.call_args[0][0]
+        assert posted["task_id"] == "t2"
+        assert posted["accel"] == 3.0
+
+
+def test_serve_times_only_the_fetch_that_returned_a_task(worker):
+    job = {"task_id": "t1", "accel": 1.0, "tau": 1.0, "startup_delay": 0.0}
+    fetches = iter([None, None, job])
+
+    def fetch_job():
+        time.sleep(0.05)
+        return next(fetches, None)
+
+    with patch.object(worker, "ping_master"), \
+         patch.object(worker, "fetch_job", side_effect=fetch_job), \
+         patch.object(worker, "update_vtypes"), \
+         patch.object(worker, "run_simulation", return_value={"I2": 1.0, "I3": 2.0}), \
+         patch.object(worker, "post_results") as mock_post:
+
+        assert worker.serve(idle_timeout=0.3, poll_interval=0) == 1
+
+    spans = mock_post.call_args[0][0]["timings"]["spans"]
+    assert 0.05 <= spans["fetch_job"] < 0.15
+
+
+def test_post_batch_results(worker):
+    with patch.object(worker.results.session, "post", return_value=MagicMock(status_code=200)) as mock_post:
+        worker.post_batch_results([{"data": 1}, {"data": 2}])
+    args, kwargs = mock_post.call_args
+    assert args[0] == "http://localhost:8000/report_results"
+    assert kwargs["headers"]["Content-Type"] == "application/x-ndjson"
+    assert kwargs["data"] == b'{"data":1}\n{"data":2}'
+
+
+def test_execute_batch_runs_each_job_and_posts_once(worker):
+    jobs = [
+        {"task_id": "t1", "job_id": "j1", "accel": 1.0, "tau": 1.0, "startup_delay": 0.0},
+        {"accel": 2.0, "tau": 1.5, "startup_delay": 0.5},
+    ]
+    with patch.object(worker, "ping_master"), \
+         patch.object(worker, "update_vtypes"), \
+         patch.object(worker, "run_simulation", return_value={"I2": 1.0, "I3": 2.0}) as mock_run, \
+         patch.object(worker, "post_batch_results") as mock_post:
+
+        results = worker.execute_batch(jobs)
+
+        assert mock_run.call_count == 2
+        mock_post.assert_called_once_with(results)
+        assert results[0]["task_id"] == "t1"
+        assert results[0]["job_id"] == "j1"
+        assert "task_id" not in results[1]
+        assert results[1]["tau"] == 1.5
+
+
+@patch("worker.simulation_worker.run_native_simulation", return_value={"I2": 4.0})
+@patch("worker.simulation_worker.run_simulation")
+def test_run_simulation_native_engine(mock_traci_run, mock_native_run):
+    worker = SimulationWorker(accel=2.0, tau=1.0, startup_delay=0.5, engine="native")
+    assert worker.run_simulation() == {"I2": 4.0}
+    mock_traci_run.assert_not_called()
@@ -65,6 +65,7 @@ def test_execute_calls_all(worker):
         mock_run.assert_called_once()
         mock_post.assert_called_once()
 
+        assert "simulation" in result.pop("timings")["spans"]
         assert result == {
             "accel": 1.0,
             "tau": 1.5,
@@ -0,0 +1,30 @@
+from unittest.mock import patch
+from worker.timing import RunTimer
+
+
+def test_spans_and_counts_accumulate():
+    timer = RunTimer(sample_interval=0)
+    with patch("worker.timing.time.perf_counter", side_effect=[1.0, 1.5, 2.0, 2.25]):
+        with timer.span("sumo_step"):
+            pass
+        with timer.span("sumo_step"):
+            pass
+    timer.count("traci_calls", 3)
+    timer.count("traci_calls", 4)
+
+    timings = timer.as_dict()
+    assert timings["spans"] == {"sumo_step": 0.75}
+    assert timings["counts"] == {"traci_calls": 7}
+    assert timings["finished_at"] > 0
+    assert "samples" not in timings
+    assert not timer.should_sample(100)
+
+
+def test_sampling_keeps_every_nth_step(monkeypatch):
+    monkeypatch.setenv("PROFILE_SAMPLE_INTERVAL", "100")
+    timer = RunTimer()
+    for step in range(1, 301):
+        if timer.should_sample(step):
+            timer.sample(step, 0.001, traci_calls=3, vehicles=10)
+
+    assert [sample["step"] for sample in timer.as_dict()["samples"]] == [100, 200, 300]
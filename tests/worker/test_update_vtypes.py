@@ -1,8 +1,9 @@
+import os
 import tempfile
 import xml.etree.ElementTree as ET
 import pytest
 
-from worker.update_vtypes import VTypesConfigUpdater
+from worker.update_vtypes import VTypesTemplate, load_vtypes_template
 
 @pytest.fixture
 def sample_vtypes_xml():
@@ -19,38 +20,35 @@ def sample_vtypes_xml():
         return tmp_file.name
 
 
-def test_update_vtypes_xml_correctly(sample_vtypes_xml):
-    """Test that VTypesConfigUpdater updates accel, tau, and startupDelay correctly."""
-    updater = VTypesConfigUpdater(sample_vtypes_xml)
-    accel, tau, startup_delay = 2.5, 1.8, 0.4
+def test_template_writes_private_files_without_touching_template(sample_vtypes_xml):
+    """Test that VTypesTemplate renders each run into its own file and leaves the template alone."""
+    template = VTypesTemplate(sample_vtypes_xml)
+    first = template.write(2.5, 1.8, 0.4, directory=tempfile.gettempdir())
+    second = template.write(3.0, 1.0, 0.0, directory=tempfile.gettempdir())
 
-    updater.update(accel, tau, startup_delay)
+    assert first != second
+    for path, accel in ((first, "2.5"), (second, "3.0")):
+        vtypes = ET.parse(path).getroot().findall("vType")
+        assert [vtype.attrib["id"] for vtype in vtypes] == ["car", "bus"]
+        assert all(vtype.attrib["accel"] == accel for vtype in vtypes)
+        os.remove(path)
 
-    tree = ET.parse(sample_vtypes_xml)
-    root = tree.getroot()
-    vtypes = root.findall("vType")
+    original = ET.parse(sample_vtypes_xml).getroot().findall("vType")
+    assert all(vtype.attrib["accel"] == "1.0" for vtype in original)
 
-    assert len(vtypes) == 2
-    for vtype in vtypes:
-        assert vtype.attrib["accel"] == str(accel)
-        assert vtype.attrib["tau"] == str(tau)
-        assert vtype.attrib["startupDelay"] == str(startup_delay)
 
+def test_load_vtypes_template_is_cached(sample_vtypes_xml):
+    assert load_vtypes_template(sample_vtypes_xml) is load_vtypes_template(sample_vtypes_xml)
 
-def test_update_vtypes_warns_if_no_vtype():
-    """Test updater doesn't crash when <vType> elements are missing."""
-    content = """<?xml version="1.0"?>
-<root>
-    <vehicle id="not-vtype" />
-</root>
-"""
-    with tempfile.NamedTemporaryFile(mode="w+", suffix=".xml", delete=False) as tmp_file:
-        tmp_file.write(content)
-        tmp_file.flush()
 
-        updater = VTypesConfigUpdater(tmp_file.name)
-        updater.update(1.0, 1.0, 1.0)
+def test_template_applies_params_per_vtype(sample_vtypes_xml):
+    """Test that attributes for every vType are set and per-vType values override them."""
+    template = VTypesTemplate(sample_vtypes_xml)
+    rendered = template.render(2.0, 1.0, 0.0, {"sigma": 0.5, "decel": 4.5, "bus.decel": 3.0, "bus.accel": 1.2})
 
-        tree = ET.parse(tmp_file.name)
-        root = tree.getroot()
-        assert len(root.findall("vType")) == 0
+    vtypes = {vtype.attrib["id"]: vtype.attrib for vtype in ET.fromstring(rendered).findall("vType")}
+    assert vtypes["car"]["accel"] == "2.0"
+    assert vtypes["car"]["decel"] == "4.5"
+    assert vtypes["bus"]["accel"] == "1.2"
+    assert vtypes["bus"]["decel"] == "3.0"
+    assert vtypes["bus"]["sigma"] == vtypes["car"]["sigma"] == "0.5"
@@ -0,0 +1,87 @@
+import logging
+from logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+import argparse
+import contextlib
+import io
+import os
+import time
+from run_simulation import SumoSession, run_native_simulation, run_simulation
+from update_vtypes import load_vtypes_template
+
+ENGINES = ("libsumo", "traci", "native")
+
+
+def run_engine(engine: str, vtypes_path: str, runs: int) -> tuple:
+    """
+    Time `runs` simulations with one engine. Returns (seconds per run, delays of the last run).
+    Session-based engines keep one SUMO instance and reload it between runs, as workers do.
+    """
+    session = None if engine == "native" else SumoSession(engine)
+    timings = []
+    delays = None
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            # run_simulation prints its summary; keep the benchmark output readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                if session is None:
+                    delays = run_native_simulation(vtypes_path=vtypes_path)
+                else:
+                    delays = run_simulation(session, vtypes_path=vtypes_path)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if session is not None:
+            session.close()
+    return timings, delays
+
+
+def reload_mean(timings: list) -> float:
+    """
+    Mean time of the runs after the first, which also pays for starting SUMO.
+    """
+    reloads = timings[1:] or timings
+    return sum(reloads) / len(reloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SUMO backends on the bundled hw_model scenario.")
+    parser.add_argument("--runs", type=int, default=3, help="simulations per engine")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--accel", type=float, default=2.0)
+    parser.add_argument("--tau", type=float, default=1.2)
+    parser.add_argument("--startup-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    template = load_vtypes_template(os.path.join(os.path.dirname(os.path.abspath(__file__)), "hw_model.vtypes.xml"))
+    vtypes_path = template.write(args.accel, args.tau, args.startup_delay)
+    rows = []
+    try:
+        for engine in args.engines:
+            try:
+                timings, delays = run_engine(engine, vtypes_path, args.runs)
+            except ImportError as e:
+                logger.warning(f"Skipping {engine}: {e}")
+                continue
+            rows.append((engine, timings, delays))
+    finally:
+        os.remove(vtypes_path)
+
+    if not rows:
+        return
+    # Speedups are relative to the socket-based TraCI loop when it was measured
+    baseline = next((row for row in rows if row[0] == "traci"), rows[0])
+    print(f"\n{'engine':<8} {'first run':>10} {'mean run':>10} {'speedup':>8}  delays")
+    for engine, timings, delays in rows:
+        formatted = ", ".join(f"{name}={delay:.3f}" for name, delay in delays.items())
+        speedup = reload_mean(baseline[1]) / reload_mean(timings)
+        print(f"{engine:<8} {timings[0]:>9.2f}s {reload_mean(timings):>9.2f}s {speedup:>7.2f}x  {formatted}")
+
+    if any(delays != baseline[2] for _, _, delays in rows):
+        logger.warning("Engines returned different delays")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ setup_logger()
 logger = logging.getLogger(__name__)
 
 import os
+import json
 from simulation_worker import SimulationWorker
 
 def main():
@@ -12,8 +13,30 @@ def main():
         tau = float(os.getenv("TAU", "1.2"))
         startup_delay = float(os.getenv("STARTUP_DELAY", "0"))
         master_url = os.getenv("MASTER_URL")
+        task_id = os.getenv("TASK_ID")
+        job_id = os.getenv("JOB_ID")
+        params = json.loads(os.getenv("PARAMS", "{}"))
+        seed = int(os.environ["SEED"]) if os.getenv("SEED") else None
+        # Set by the master when it starts the container
+        launched_at = float(os.environ["LAUNCHED_AT"]) if os.getenv("LAUNCHED_AT") else None
+
+        worker = SimulationWorker(
+            accel, tau, startup_delay, master_url=master_url, task_id=task_id, job_id=job_id, params=params, seed=seed,
+            launched_at=launched_at
+        )
+        if os.getenv("WORKER_MODE", "single") == "pool":
+            idle_timeout = float(os.getenv("IDLE_TIMEOUT", "300"))
+            poll_interval = float(os.getenv("POLL_INTERVAL", "2"))
+            completed = worker.serve(idle_timeout=idle_timeout, poll_interval=poll_interval)
+            logger.info(f"Pool worker finished after {completed} simulations")
+            return
+
+        batch = os.getenv("BATCH")
+        if batch:
+            results = worker.execute_batch(json.loads(batch))
+            logger.info(f"Batch worker finished {len(results)} simulations")
+            return
 
-        worker = SimulationWorker(accel, tau, startup_delay, master_url=master_url)
         result = worker.execute()
         logger.info("[RESULT]", result)
     except Exception as e:
@@ -0,0 +1,77 @@
+import logging
+from logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+import requests
+
+
+def partial_error(delays: dict, expected: dict, weights: dict = None, metric: str = "squared") -> float:
+    """
+    Weighted error of partial delays, computed the same way as the master's Scoring.
+    """
+    weights = weights or {}
+    total = 0.0
+    for key, value in expected.items():
+        diff = abs(delays.get(key, 0.0) - value)
+        if metric == "absolute":
+            error = diff
+        elif metric == "relative":
+            error = diff / abs(value) if value else diff
+        else:
+            error = diff ** 2
+        total += weights.get(key, 1.0) * error
+    return total
+
+
+class PruningRule:
+    """
+    Decides at simulation checkpoints whether a run can be abandoned.
+
+    The master's /prune_bound endpoint returns the expected delays and the best
+    score among finished results. A run is stopped once it has simulated at
+    least min_step steps and the error of its partial averages is more
+    than factor times that best score.
+    """
+    def __init__(self, bound_url: str, factor: float, min_step: int):
+        self.bound_url = bound_url
+        self.factor = factor
+        self.min_step = min_step
+        self.pruned_at = None
+        self.job_id = None
+
+    def reset(self, job_id: str = None):
+        self.pruned_at = None
+        self.job_id = job_id
+
+    def fetch_bound(self):
+        try:
+            params = {"job_id": self.job_id} if self.job_id else None
+            response = requests.get(self.bound_url, params=params, timeout=2)
+            return response.json()
+        except Exception as e:
+            logger.warning(f"Could not fetch pruning bound: {e}")
+            return None
+
+    def __call__(self, step: int, partial_delays: dict) -> bool:
+        if step < self.min_step:
+            return False
+
+        bound = self.fetch_bound()
+        if not bound or bound.get("best_score") is None:
+            return False
+
+        partial_score = partial_error(
+            partial_delays,
+            bound["expected_delays"],
+            bound.get("weights"),
+            bound.get("metric", "squared")
+        )
+        if partial_score > self.factor * bound["best_score"]:
+            logger.info(
+                f"Pruning at step {step}: partial score {partial_score:.4f} > "
+                f"{self.factor} x best {bound['best_score']:.4f}"
+            )
+            self.pruned_at = step
+            return True
+        return False
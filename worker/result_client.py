@@ -0,0 +1,125 @@
+import logging
+from logging_config import setup_logger
+setup_logger()
+logger = logging.getLogger(__name__)
+
+import gzip
+import json
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Batch bodies smaller than this are sent uncompressed
+GZIP_MIN_BYTES = 1024
+
+
+def encode_results(results: list, encoding: str = "ndjson") -> tuple:
+    """
+    Encode a batch for /report_results. Returns (body, headers).
+
+    "ndjson" writes one compact JSON result per line, "msgpack" a msgpack list
+    (falling back to NDJSON when msgpack is not installed) and "json" a plain
+    JSON list. Larger bodies are gzip-compressed.
+    """
+    if encoding == "msgpack" and msgpack is not None:
+        body, content_type = msgpack.packb(results), "application/msgpack"
+    elif encoding == "json":
+        body, content_type = json.dumps(results, separators=(",", ":")).encode(), "application/json"
+    else:
+        lines = (json.dumps(result, separators=(",", ":")) for result in results)
+        body, content_type = "\n".join(lines).encode(), "application/x-ndjson"
+
+    headers = {"Content-Type": content_type}
+    if len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+class ResultClient:
+    """
+    Sends results to the master over one pooled keep-alive connection.
+
+    Results are buffered until batch_size of them are waiting (1 sends each
+    result as soon as it is submitted) and posted to /report_results.
+    Connection errors and 5xx responses are retried with exponential backoff;
+    this is safe because the master ignores a second copy of a task's result.
+    Batches that still fail stay buffered and are retried on the next flush.
+    """
+    def __init__(self, master_url: str, batch_size: int = None, max_retries: int = None, backoff: float = None, encoding: str = None):
+        self.result_url = master_url
+        self.batch_url = master_url.replace("/report_result", "/report_results")
+        self.batch_size = max(1, batch_size or int(os.getenv("RESULT_BATCH_SIZE", "1")))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("RESULT_MAX_RETRIES", "5"))
+        self.backoff = backoff if backoff is not None else float(os.getenv("RESULT_RETRY_BACKOFF", "0.5"))
+        self.encoding = encoding or os.getenv("RESULT_ENCODING", "ndjson")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pending = []
+
+    def submit(self, result: dict) -> bool:
+        """
+        Buffer a result and flush once the batch is full. Returns False if a flush failed.
+        """
+        self._pending.append(result)
+        if len(self._pending) >= self.batch_size:
+            return self.flush()
+        return True
+
+    def send(self, results: list) -> bool:
+        """
+        Post results right away, together with anything still buffered.
+        """
+        self._pending.extend(results)
+        return self.flush()
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> bool:
+        if not self._pending:
+            return True
+        batch = self._pending
+        if len(batch) == 1:
+            response = self._post(self.result_url, json=batch[0], timeout=10)
+        else:
+            body, headers = encode_results(batch, self.encoding)
+            response = self._post(self.batch_url, data=body, headers=headers, timeout=30)
+
+        if response is None:
+            logger.error(f"Keeping {len(batch)} results buffered after {self.max_retries + 1} failed attempts")
+            return False
+        self._pending = []
+        if response.status_code != 200:
+            logger.error(f"Master rejected {len(batch)} results with status {response.status_code}: {response.text}")
+            return False
+        logger.info(f"Posted {len(batch)} results to master")
+        return True
+
+    def _post(self, url: str, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(url, **kwargs)
+                if response.status_code < 500:
+                    return response
+                logger.warning(f"Master responded with status {response.status_code} (attempt {attempt + 1})")
+            except requests.RequestException as e:
+                logger.warning(f"Failed to reach master (attempt {attempt + 1}): {e}")
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        return None
+
+    def close(self):
+        self.flush()
+        if self._pending:
+            logger.error(f"Dropping {len(self._pending)} results that could not be delivered")
+            self._pending = []
+        self.session.close()
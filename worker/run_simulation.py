@@ -1,66 +1,193 @@
 import os
 import json
+import hashlib
+import subprocess
+import tempfile
+import time
+import xml.etree.ElementTree as ET
 import traci
-from collections import defaultdict
+import traci.constants as tc
+from functools import lru_cache
+from delay_stats import DelayAccumulator
+from timing import RunTimer
 
 DIR_PATH = os.path.dirname(os.path.abspath(__file__))
 
 SPEED_THRESHOLD = 0.3  # m/s
 INTERSECTIONS_OF_INTEREST = ("I2", "I3")
 SIMULATION_DURATION = 2000
+CHECKPOINT_INTERVAL = 100  # steps between early-termination checks
 SUMO_BINARY = "sumo"
+# "libsumo" runs SUMO inside this process, "traci" drives a sumo process over a socket; "auto" prefers libsumo
+SUMO_BACKEND = os.getenv("SUMO_BACKEND", "auto")
 
 CONFIG_PATH = os.path.join(DIR_PATH, "hw_model.sumocfg.xml")
+NET_PATH = os.path.join(DIR_PATH, "hw_model.net.xml")
+ROUTES_PATH = os.path.join(DIR_PATH, "hw_model.routes.xml")
 SCENARIO_PATH = os.path.join(DIR_PATH, "scenario.json")
+SCENARIO_CACHE_DIR = os.getenv("SCENARIO_CACHE_DIR", os.path.join(DIR_PATH, ".scenario_cache"))
+# Bump when the compiled trips format changes so stale cache entries are ignored
+SCENARIO_COMPILE_VERSION = "1"
 
+# Per-vehicle values delivered with every simulationStep response
+VEHICLE_VARIABLES = (tc.VAR_SPEED, tc.VAR_ROAD_ID)
 
-def add_vehicles(vehicles_batch, start_index):
-    index = start_index
-    for route_id, _, vehicle_type in vehicles_batch:
-        vehicle_id = f"{route_id}_{index}"
-        traci.vehicle.add(vehicle_id, route_id, vehicle_type)
-        index += 1
-    return index
 
+def load_backend(name=None):
+    """
+    The module that drives SUMO. libsumo has the same API as traci but calls
+    SUMO in-process, without a socket round trip per command.
+    """
+    name = name or SUMO_BACKEND
+    if name not in ("auto", "libsumo", "traci"):
+        raise ValueError(f"Unknown SUMO backend '{name}'")
+    if name != "traci":
+        try:
+            import libsumo
+            return libsumo
+        except ImportError:
+            if name == "libsumo":
+                raise
+    return traci
 
-def run_simulation():
+
+class SumoSession:
+    """
+    A long-lived SUMO simulation. The first run starts it; later runs reload
+    the scenario (with the run's own vtypes file) with load() instead of
+    starting SUMO again.
+    """
+    def __init__(self, backend=None):
+        self.sumo = load_backend(backend)
+        self.active = False
+
+    @property
+    def backend(self) -> str:
+        return self.sumo.__name__
+
+    def load(self, args):
+        if self.active:
+            self.sumo.load(args)
+        else:
+            self.sumo.start([SUMO_BINARY] + args)
+            self.active = True
+
+    def close(self):
+        if self.active:
+            self.active = False
+            self.sumo.close()
+
+
+@lru_cache(maxsize=1)
+def load_schedule():
+    """
+    Parse scenario.json once per process; only needed when compiling the trips file.
+    """
     with open(SCENARIO_PATH, 'r') as file:
-        vehicle_schedule = json.load(file)
+        return json.load(file)
+
+
+@lru_cache(maxsize=1)
+def load_lane_edges():
+    """
+    Map every lane ID in the network to its edge ID. Lane IDs in hw_model.net.xml
+    do not embed the edge name, so FCD output has to be translated back to edges.
+    """
+    lane_edges = {}
+    for edge in ET.parse(NET_PATH).getroot().iter("edge"):
+        for lane in edge.iter("lane"):
+            lane_edges[lane.get("id")] = edge.get("id")
+    return lane_edges
+
+
+def intersection_index(edge_id):
+    """
+    Index into INTERSECTIONS_OF_INTEREST of the intersection an edge belongs to, or None.
+    Internal edges (":I2_3") and approaches ("I2_N_in") carry the intersection name.
+    """
+    return next((i for i, name in enumerate(INTERSECTIONS_OF_INTEREST) if name in edge_id), None)
 
-    traci.start([
-        SUMO_BINARY,
-        "-c", CONFIG_PATH,
-        "--start",
-        "--quit-on-end"
-    ])
 
-    delays = defaultdict(int)
-    stopped_vehicles = defaultdict(set)
+@lru_cache(maxsize=1)
+def load_edge_intersections():
+    """
+    Map every edge of the network that belongs to an intersection of interest to
+    its index, so the stepping loop does one dict lookup instead of scanning names.
+    """
+    edges = {}
+    for edge in ET.parse(NET_PATH).getroot().iter("edge"):
+        index = intersection_index(edge.get("id"))
+        if index is not None:
+            edges[edge.get("id")] = index
+    return edges
+
+
+@lru_cache(maxsize=1)
+def load_lane_intersections():
+    """
+    The same table keyed by lane ID, for FCD output.
+    """
+    lanes = {}
+    for lane, edge in load_lane_edges().items():
+        index = intersection_index(edge)
+        if index is not None:
+            lanes[lane] = index
+    return lanes
+
+
+@lru_cache(maxsize=1)
+def load_route_endpoints():
+    endpoints = {}
+    for route in ET.parse(ROUTES_PATH).getroot().iter("route"):
+        edges = route.get("edges").split()
+        endpoints[route.get("id")] = (edges[0], edges[-1])
+    return endpoints
+
+
+def write_trips(path):
+    """
+    Write the scenario schedule as SUMO trips. Trips are routed on insertion,
+    which reproduces how SUMO repairs the disconnected routes passed to
+    traci.vehicle.add; depart attributes match traci.vehicle.add defaults.
+    """
+    vehicle_schedule = load_schedule()
+    endpoints = load_route_endpoints()
     index = 0
 
-    try:
-        for step in range(SIMULATION_DURATION):
-            if str(step) in vehicle_schedule:
-                index = add_vehicles(vehicle_schedule[str(step)], index)
+    with open(path, "w") as file:
+        file.write("<routes>\n")
+        for step in sorted(vehicle_schedule, key=int):
+            for route_id, _, vehicle_type in vehicle_schedule[step]:
+                from_edge, to_edge = endpoints[route_id]
+                file.write(
+                    f'    <trip id="{route_id}_{index}" type="{vehicle_type}" from="{from_edge}" to="{to_edge}" '
+                    f'depart="{step}" departLane="first" departPos="base" departSpeed="0"/>\n'
+                )
+                index += 1
+        file.write("</routes>\n")
 
-            traci.simulationStep()
 
-            for veh_id in traci.vehicle.getIDList():
-                speed = traci.vehicle.getSpeed(veh_id)
-                edge = traci.vehicle.getRoadID(veh_id)
+def parse_fcd_delays(fcd_path, accumulator=None):
+    """
+    Stream an FCD output file and count stopped vehicle-steps per intersection.
+    """
+    lane_intersections = load_lane_intersections()
+    accumulator = accumulator if accumulator is not None else DelayAccumulator(INTERSECTIONS_OF_INTEREST)
 
-                if speed < SPEED_THRESHOLD:
-                    intersection = next((i for i in INTERSECTIONS_OF_INTEREST if i in edge), None)
-                    if intersection:
-                        delays[intersection] += 1
-                        stopped_vehicles[intersection].add(veh_id)
-    finally:
-        traci.close()
+    for _, element in ET.iterparse(fcd_path):
+        if element.tag == "vehicle":
+            if float(element.get("speed")) < SPEED_THRESHOLD:
+                intersection = lane_intersections.get(element.get("lane"))
+                if intersection is not None:
+                    accumulator.add(intersection, element.get("id"))
+        elif element.tag == "timestep":
+            element.clear()
+
+    return accumulator
 
-    avg_delays = {
-        k: (delays[k] / len(stopped_vehicles[k]) if stopped_vehicles[k] else 0)
-        for k in INTERSECTIONS_OF_INTEREST
-    }
+
+def average_delays(accumulator):
+    avg_delays = accumulator.averages()
 
     print("\nFinal intersection average delays (seconds):")
     for intersection, avg in avg_delays.items():
@@ -69,5 +196,158 @@ def run_simulation():
     return avg_delays
 
 
+@lru_cache(maxsize=1)
+def compile_scenario():
+    """
+    Compile scenario.json into a sorted SUMO trips file so SUMO loads the vehicles
+    itself. The file is cached on disk under a hash of its inputs, so it is built
+    once per scenario rather than once per run.
+    """
+    digest = hashlib.sha256(SCENARIO_COMPILE_VERSION.encode())
+    for path in (SCENARIO_PATH, ROUTES_PATH):
+        with open(path, "rb") as file:
+            digest.update(file.read())
+
+    trips_path = os.path.join(SCENARIO_CACHE_DIR, f"scenario.{digest.hexdigest()[:16]}.trips.xml")
+    if not os.path.exists(trips_path):
+        os.makedirs(SCENARIO_CACHE_DIR, exist_ok=True)
+        # Write then rename so concurrent workers never read a partial file
+        tmp_path = f"{trips_path}.{os.getpid()}.tmp"
+        write_trips(tmp_path)
+        os.replace(tmp_path, trips_path)
+
+    return trips_path
+
+
+def sumo_args(vtypes_path=None, seed=None):
+    """
+    Command-line options for a run. vtypes_path replaces the vtypes file named in
+    the config, so concurrent runs never share a parameter file. seed overrides
+    SUMO's fixed default random seed for replicate runs.
+    """
+    args = [
+        "-c", CONFIG_PATH,
+        "--route-files", f"{ROUTES_PATH},{compile_scenario()}",
+        "--start",
+        "--quit-on-end"
+    ]
+    if vtypes_path:
+        args += ["--additional-files", vtypes_path]
+    if seed is not None:
+        args += ["--seed", str(seed)]
+    return args
+
+
+def run_native_simulation(vtypes_path=None, seed=None, accumulator=None, timer=None):
+    """
+    Run SUMO headless without TraCI and derive the same averages from its FCD output.
+    FCD time t holds the state TraCI reports after step t, so --end SIMULATION_DURATION
+    covers exactly the steps of the TraCI loop. Pass an accumulator to keep the
+    per-vehicle stopped times and a timer to record where the time went.
+    """
+    timer = timer if timer is not None else RunTimer(sample_interval=0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fcd_path = os.path.join(tmp_dir, "fcd.xml")
+
+        args = [
+            SUMO_BINARY,
+            "-c", CONFIG_PATH,
+            "--route-files", f"{ROUTES_PATH},{compile_scenario()}",
+            "--end", str(SIMULATION_DURATION),
+            "--fcd-output", fcd_path,
+            "--fcd-output.attributes", "speed,lane",
+            # The default two decimals would round speeds just below SPEED_THRESHOLD up to it
+            "--precision", "6"
+        ]
+        if vtypes_path:
+            args += ["--additional-files", vtypes_path]
+        if seed is not None:
+            args += ["--seed", str(seed)]
+        with timer.span("sumo_run"):
+            subprocess.run(args, check=True)
+
+        with timer.span("parse_fcd"):
+            accumulator = parse_fcd_delays(fcd_path, accumulator)
+
+    return average_delays(accumulator)
+
+
+def run_simulation(session=None, should_stop=None, vtypes_path=None, seed=None, accumulator=None, timer=None):
+    """
+    Step the scenario through TraCI. should_stop(step, partial_avg_delays) is
+    called every CHECKPOINT_INTERVAL steps; returning True ends the run early
+    with the averages accumulated so far. Pass an accumulator to keep the
+    per-vehicle stopped times and a timer to record where the time went.
+    """
+    timer = timer if timer is not None else RunTimer(sample_interval=0)
+    owns_session = session is None
+    session = session or SumoSession()
+    # Starting SUMO is far slower than reloading it, so the two are reported apart
+    with timer.span("sumo_load" if session.active else "sumo_start"):
+        session.load(sumo_args(vtypes_path, seed))
+    sumo = session.sumo
+    clock = time.perf_counter
+    step_seconds = subscribe_seconds = collect_seconds = 0.0
+    traci_calls = departed_count = steps = 0
+
+    edge_intersections = load_edge_intersections()
+    accumulator = accumulator if accumulator is not None else DelayAccumulator(INTERSECTIONS_OF_INTEREST)
+
+    try:
+        # Subscriptions are reset by load(), so they are set up for every run
+        sumo.simulation.subscribe((tc.VAR_DEPARTED_VEHICLES_IDS,))
+        traci_calls += 1
+
+        for step in range(1, SIMULATION_DURATION + 1):
+            started = clock()
+            sumo.simulationStep()
+            stepped = clock()
+
+            # Subscribing answers with the current values, so new vehicles are seen this step
+            departed = sumo.simulation.getSubscriptionResults()[tc.VAR_DEPARTED_VEHICLES_IDS]
+            for veh_id in departed:
+                sumo.vehicle.subscribe(veh_id, VEHICLE_VARIABLES)
+            subscribed = clock()
+
+            vehicles = sumo.vehicle.getAllSubscriptionResults()
+            for veh_id, values in vehicles.items():
+                if values[tc.VAR_SPEED] < SPEED_THRESHOLD:
+                    intersection = edge_intersections.get(values[tc.VAR_ROAD_ID])
+                    if intersection is not None:
+                        accumulator.add(intersection, veh_id)
+            collected = clock()
+
+            step_seconds += stepped - started
+            subscribe_seconds += subscribed - stepped
+            collect_seconds += collected - subscribed
+            # simulationStep and one subscribe per new vehicle; subscription results arrive with the
+            # simulationStep response and are read from the local cache
+            calls = 1 + len(departed)
+            traci_calls += calls
+            departed_count += len(departed)
+            steps = step
+            if timer.should_sample(step):
+                timer.sample(step, collected - started, traci_calls=calls, vehicles=len(vehicles))
+
+            if should_stop and step % CHECKPOINT_INTERVAL == 0 and step < SIMULATION_DURATION:
+                if should_stop(step, accumulator.averages()):
+                    break
+    except Exception:
+        # A connection that failed mid-run cannot be reloaded safely
+        session.close()
+        raise
+    finally:
+        timer.add("sumo_step", step_seconds)
+        timer.add("subscribe", subscribe_seconds)
+        timer.add("collect", collect_seconds)
+        timer.count("steps", steps)
+        timer.count("traci_calls", traci_calls)
+        timer.count("vehicles_departed", departed_count)
+        if owns_session:
+            session.close()
+
+    return average_delays(accumulator)
+
+
 if __name__ == "__main__":
     run_simulation()
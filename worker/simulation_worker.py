@@ -4,19 +4,67 @@ setup_logger()
 logger = logging.getLogger(__name__)
 
 import os
+import time
 import requests
-from run_simulation import run_simulation
-from update_vtypes import VTypesConfigUpdater
+from run_simulation import INTERSECTIONS_OF_INTEREST, run_simulation, run_native_simulation, SumoSession
+from update_vtypes import load_vtypes_template
+from delay_stats import DelayAccumulator
+from timing import RunTimer
+from pruning import PruningRule
+from result_client import ResultClient
 
 class SimulationWorker:
-    def __init__(self, accel: float, tau: float, startup_delay: float, vtypes_path: str = "hw_model.vtypes.xml", master_url: str = None):
+    def __init__(self, accel: float, tau: float, startup_delay: float, vtypes_path: str = "hw_model.vtypes.xml", master_url: str = None, task_id: str = None, engine: str = None, job_id: str = None, params: dict = None, seed: int = None, launched_at: float = None):
         self.accel = accel
         self.tau = tau
         self.startup_delay = startup_delay
         self.vtypes_path = vtypes_path
+        self.run_vtypes_path = None
         self.master_url = master_url or os.getenv("MASTER_URL")
+        self.task_id = task_id
+        self.job_id = job_id
+        # Extra vType attributes, "attribute" for every vType or "vtypeId.attribute" for one
+        self.params = params or {}
+        # SUMO random seed of this replicate; None keeps SUMO's default
+        self.seed = seed
+        # Per-vehicle stopped times of the last run
+        self.delay_stats = None
+        # Phase timings of the current task; the first task also reports how long the worker took to start
+        self.timer = None
+        self.launched_at = launched_at
+        self.session = SumoSession()
+        # "traci" steps SUMO from Python, "native" lets SUMO run alone and parses its output
+        self.engine = engine or os.getenv("SIMULATION_ENGINE", "traci")
+        self.pruning = self._create_pruning_rule()
+        self.results = ResultClient(self.master_url) if self.master_url else None
+
+    def _create_pruning_rule(self):
+        # Early termination is opt-in: PRUNE_FACTOR=0 (the default) runs every simulation to the end
+        factor = float(os.getenv("PRUNE_FACTOR", "0"))
+        if factor <= 0 or not self.master_url:
+            return None
+        return PruningRule(
+            self.master_url.replace("/report_result", "/prune_bound"),
+            factor=factor,
+            min_step=int(os.getenv("PRUNE_MIN_STEP", "1000"))
+        )
+
+    def start_timer(self) -> RunTimer:
+        """
+        The timer of the current task, started on first use.
+        """
+        if self.timer is None:
+            self.timer = RunTimer()
+            if self.launched_at:
+                self.timer.add("container_start", max(time.time() - self.launched_at, 0.0))
+                self.launched_at = None
+        return self.timer
 
     def ping_master(self):
+        with self.start_timer().span("ping_master"):
+            return self._ping_master()
+
+    def _ping_master(self):
         if not self.master_url:
             logger.warning("MASTER_URL is not set. Skipping ping.")
             return False
@@ -33,38 +81,189 @@ class SimulationWorker:
             logger.error(f"Could not reach master: {e}")
             return False
 
+    def fetch_job(self):
+        if not self.master_url:
+            logger.warning("MASTER_URL is not set. No job to fetch.")
+            return None
+        try:
+            job_url = self.master_url.replace("/report_result", "/next_job")
+            response = requests.get(job_url, timeout=5)
+            job = response.json()
+            if "task_id" not in job:
+                return None
+            return job
+        except Exception as e:
+            logger.error(f"Could not fetch job from master: {e}")
+            return None
+
     def update_vtypes(self):
-        updater = VTypesConfigUpdater(self.vtypes_path)
-        updater.update(self.accel, self.tau, self.startup_delay)
+        """
+        Render the current parameters into this run's own vtypes file; vtypes_path is only read as a template.
+        """
+        self.remove_run_vtypes()
+        template = load_vtypes_template(self.vtypes_path)
+        self.run_vtypes_path = template.write(self.accel, self.tau, self.startup_delay, self.params)
+        return self.run_vtypes_path
+
+    def remove_run_vtypes(self):
+        if self.run_vtypes_path:
+            try:
+                os.remove(self.run_vtypes_path)
+            except OSError as e:
+                logger.warning(f"Could not remove '{self.run_vtypes_path}': {e}")
+            self.run_vtypes_path = None
 
     def run_simulation(self):
-        logger.info("Starting simulation...")
-        return run_simulation()
+        logger.info(f"Starting simulation ({self.engine} engine)...")
+        self.delay_stats = DelayAccumulator(INTERSECTIONS_OF_INTEREST)
+        timer = self.start_timer()
+        if self.engine == "native":
+            return run_native_simulation(
+                vtypes_path=self.run_vtypes_path, seed=self.seed, accumulator=self.delay_stats, timer=timer
+            )
+        return run_simulation(
+            self.session, should_stop=self.pruning, vtypes_path=self.run_vtypes_path, seed=self.seed,
+            accumulator=self.delay_stats, timer=timer
+        )
 
     def post_results(self, result: dict):
-        if not self.master_url:
+        if not self.results:
             logger.warning("MASTER_URL not set. Result not sent.")
             return
         try:
-            logger.info(f"Posting results to Master at {self.master_url} ...")
-            response = requests.post(self.master_url, json=result, timeout=10, headers={"Connection": "close"})
-            logger.info(f"Master responded with status {response.status_code}")
+            self.results.submit(result)
         except Exception as e:
             logger.error(f"Failed to send result to master: {e}")
 
+    def post_batch_results(self, results: list):
+        if not self.results:
+            logger.warning("MASTER_URL not set. Results not sent.")
+            return
+        try:
+            logger.info(f"Posting {len(results)} results to Master at {self.results.batch_url} ...")
+            self.results.send(results)
+        except Exception as e:
+            logger.error(f"Failed to send results to master: {e}")
+
+    def flush_results(self):
+        if self.results:
+            self.results.flush()
+
+    def close(self):
+        self.session.close()
+        if self.results:
+            self.results.close()
+
     def execute(self):
-        logger.info(f" Received parameters: ACCEL={self.accel}, TAU={self.tau}, STARTUP_DELAY={self.startup_delay}")
+        self.start_timer()
+        self.ping_master()
+        try:
+            return self.run_job()
+        finally:
+            self.close()
 
+    def serve(self, idle_timeout: float = 300.0, poll_interval: float = 2.0) -> int:
+        """
+        Pull parameter sets from the master until no job arrives for idle_timeout seconds.
+        Returns the number of simulations run.
+        """
         self.ping_master()
-        self.update_vtypes()
-        delays = self.run_simulation()
+        completed = 0
+        idle_since = time.monotonic()
+
+        try:
+            while True:
+                fetch_started = time.perf_counter()
+                job = self.fetch_job()
+                if job is None:
+                    self.flush_results()
+                    if time.monotonic() - idle_since >= idle_timeout:
+                        logger.info(f"No jobs for {idle_timeout}s, shutting down after {completed} simulations")
+                        return completed
+                    time.sleep(poll_interval)
+                    continue
+
+                # Only the fetch that returned the task counts, not the idle polls before it
+                self.start_timer().add("fetch_job", time.perf_counter() - fetch_started)
+                self.apply_job(job)
+                try:
+                    self.run_job()
+                    completed += 1
+                except Exception as e:
+                    logger.error(f"Task {self.task_id} failed: {e}")
+                idle_since = time.monotonic()
+        finally:
+            self.close()
+
+    def execute_batch(self, jobs: list) -> list:
+        """
+        Run several parameter sets in this process and report them in one request.
+        """
+        self.start_timer()
+        self.ping_master()
+        results = []
+
+        try:
+            for job in jobs:
+                self.apply_job(job)
+                try:
+                    results.append(self.simulate())
+                except Exception as e:
+                    logger.error(f"Simulation for {job} failed: {e}")
+            self.post_batch_results(results)
+        finally:
+            self.close()
+
+        return results
+
+    def apply_job(self, job: dict):
+        self.task_id = job.get("task_id")
+        self.job_id = job.get("job_id")
+        self.accel = job["accel"]
+        self.tau = job["tau"]
+        self.startup_delay = job["startup_delay"]
+        self.params = job.get("params") or {}
+        self.seed = job.get("seed")
+
+    def run_job(self):
+        result = self.simulate()
+        self.post_results(result)
+        return result
+
+    def simulate(self) -> dict:
+        logger.info(f" Received parameters: ACCEL={self.accel}, TAU={self.tau}, STARTUP_DELAY={self.startup_delay}, PARAMS={self.params}, SEED={self.seed}")
+
+        timer = self.start_timer()
+        with timer.span("vtypes"):
+            self.update_vtypes()
+        if self.pruning:
+            self.pruning.reset(job_id=self.job_id)
+        try:
+            with timer.span("simulation"):
+                delays = self.run_simulation()
+        finally:
+            self.remove_run_vtypes()
+            # The next task starts a fresh timer
+            self.timer = None
 
         result = {
             "accel": self.accel,
             "tau": self.tau,
             "startup_delay": self.startup_delay,
-            "intersection_avg_delays": delays
+            "intersection_avg_delays": delays,
+            "timings": timer.as_dict()
         }
-
-        self.post_results(result)
+        if self.delay_stats:
+            result["intersection_delay_percentiles"] = self.delay_stats.percentiles()
+        if self.params:
+            result["params"] = self.params
+        if self.seed is not None:
+            result["seed"] = self.seed
+        if self.task_id:
+            result["task_id"] = self.task_id
+        if self.job_id:
+            result["job_id"] = self.job_id
+        if self.pruning and self.pruning.pruned_at:
+            result["pruned"] = True
+            result["pruned_at_step"] = self.pruning.pruned_at
         return result
@@ -0,0 +1,52 @@
+import os
+import time
+from contextlib import contextmanager
+
+
+class RunTimer:
+    """
+    Wall-clock spans and counters of one simulation task, reported with its result.
+
+    Spans add up the seconds spent in each phase (ping_master, vtypes,
+    sumo_load, sumo_step, ...). With a sample_interval (PROFILE_SAMPLE_INTERVAL,
+    0 disables it) every n-th step of the TraCI loop is also kept as a sample
+    with its duration, TraCI call count and vehicle count.
+    """
+    def __init__(self, sample_interval: int = None):
+        self.spans = {}
+        self.counts = {}
+        self.samples = []
+        self.sample_interval = sample_interval if sample_interval is not None else int(os.getenv("PROFILE_SAMPLE_INTERVAL", "0"))
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def should_sample(self, step: int) -> bool:
+        return self.sample_interval > 0 and step % self.sample_interval == 0
+
+    def sample(self, step: int, seconds: float, **values):
+        self.samples.append({"step": step, "seconds": round(seconds, 6), **values})
+
+    def as_dict(self) -> dict:
+        """
+        The timings field of a result. finished_at lets the master measure how long the result took to arrive.
+        """
+        timings = {
+            "spans": {name: round(seconds, 6) for name, seconds in self.spans.items()},
+            "counts": dict(self.counts),
+            "finished_at": time.time()
+        }
+        if self.samples:
+            timings["samples"] = self.samples
+        return timings
@@ -3,29 +3,86 @@ from logging_config import setup_logger
 setup_logger()
 logger = logging.getLogger(__name__)
 
+import os
+import tempfile
 import xml.etree.ElementTree as ET
+from functools import lru_cache
+from xml.sax.saxutils import quoteattr
 
-class VTypesConfigUpdater:
+# Per-run files go to tmpfs when available so writing them never touches the disk
+VTYPES_DIR = os.getenv("VTYPES_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+
+class VTypesTemplate:
     """
-    Updates a SUMO vtypes.xml file with the specified parameters.
+    A vtypes file parsed once, ready to be rendered with new attribute values.
+
+    Rendering only joins pre-quoted strings, so a run costs no XML parsing and
+    writes its own file. The template file itself is never modified, so any
+    number of runs can share it.
     """
     def __init__(self, filepath: str):
         self.filepath = filepath
+        root = ET.parse(filepath).getroot()
+        self.root_tag = root.tag
+        # Each item is (vType id, {attribute: quoted value}) or (None, serialized non-vType element)
+        self.elements = []
+        for element in root:
+            if element.tag == "vType":
+                self.elements.append((element.get("id"), {key: quoteattr(value) for key, value in element.attrib.items()}))
+            else:
+                self.elements.append((None, ET.tostring(element, encoding="unicode").strip()))
+        self.vtype_ids = {vtype_id for vtype_id, _ in self.elements if vtype_id is not None}
+        if not self.vtype_ids:
+            logger.warning(f"No <vType> tags found in '{filepath}'")
+
+    def render(self, accel: float, tau: float, startup_delay: float, params: dict = None) -> str:
+        """
+        params holds extra attributes, keyed "attribute" for every vType or "vtypeId.attribute" for one.
+        Per-vType values win over values for every vType.
+        """
+        shared = {"accel": accel, "tau": tau, "startupDelay": startup_delay}
+        per_vtype = {}
+        for name, value in (params or {}).items():
+            vtype_id, _, attribute = name.rpartition(".")
+            if not vtype_id:
+                shared[attribute] = value
+            elif vtype_id in self.vtype_ids:
+                per_vtype.setdefault(vtype_id, {})[attribute] = value
+            else:
+                logger.warning(f"Parameter '{name}' names no vType in '{self.filepath}'")
+
+        parts = [f"<{self.root_tag}>"]
+        for vtype_id, content in self.elements:
+            if vtype_id is None:
+                parts.append(f"    {content}")
+                continue
+            attributes = dict(content)
+            for attribute, value in {**shared, **per_vtype.get(vtype_id, {})}.items():
+                attributes[attribute] = quoteattr(str(value))
+            parts.append("    <vType " + " ".join(f"{key}={value}" for key, value in attributes.items()) + "/>")
+        parts.append(f"</{self.root_tag}>\n")
+        return "\n".join(parts)
+
+    def write(self, accel: float, tau: float, startup_delay: float, params: dict = None, directory: str = None) -> str:
+        """
+        Write the rendered vtypes to a new file and return its path. The caller removes it.
+        """
+        fd, path = tempfile.mkstemp(prefix="vtypes.", suffix=".xml", dir=directory or VTYPES_DIR)
+        with os.fdopen(fd, "w") as file:
+            file.write(self.render(accel, tau, startup_delay, params))
+        return path
+
+
+def load_vtypes_template(filepath: str) -> VTypesTemplate:
+    """
+    The parsed template for filepath, re-parsed only when the file changes.
+    """
+    path = os.path.abspath(filepath)
+    return _load_template(path, os.path.getmtime(path))
+
 
-    def update(self, accel: float, tau: float, startup_delay: float) -> None:
-        logger.info(f"Updating '{self.filepath}' with accel={accel}, tau={tau}, startupDelay={startup_delay}")
-        tree = ET.parse(self.filepath)
-        root = tree.getroot()
-
-        updated = False
-        for vtype in root.findall("vType"):
-            vtype.set("accel", str(accel))
-            vtype.set("tau", str(tau))
-            vtype.set("startupDelay", str(startup_delay))
-            updated = True
-
-        if updated:
-            tree.write(self.filepath)
-            logger.info(f"Successfully wrote updated values to '{self.filepath}'")
-        else:
-            logger.warning(f"No <vType> tags found in '{self.filepath}'")
+@lru_cache(maxsize=8)
+def _load_template(path: str, mtime: float) -> VTypesTemplate:
+    logger.info(f"Parsing vtypes template '{path}'")
+    return VTypesTemplate(path)